@@ -0,0 +1,158 @@
+# api/export_routes.py
+
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta, timezone
+from xml.sax.saxutils import escape, quoteattr
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+
+from core.database import connection
+from api.log_routes import _entry_filters, _metric_filter
+
+export_bp = Blueprint('export', __name__)
+
+# Filas por lote: la memoria se mantiene plana sea cual sea el tamaño del cuaderno
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_COLUMNS = [
+    "id", "timestamp_utc", "latitude", "longitude", "navigation_state",
+    "text", "media_path", "source", "entry_type", "signalK_resource_id", "metadata"
+]
+
+def _iter_rows(where_clauses, params):
+    """Recorre log_entries en orden cronológico con fetchmany, sin cargar todo en memoria."""
+    where = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM log_entries {where} ORDER BY timestamp_utc, id"
+    with connection() as conn:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield rows
+
+def _metadata(row):
+    try:
+        return json.loads(row["metadata"]) if row["metadata"] else {}
+    except ValueError:
+        return {}
+
+def _ndjson(chunks):
+    for rows in chunks:
+        lines = []
+        for row in rows:
+            item = dict(row)
+            item["metadata"] = _metadata(row)
+            lines.append(json.dumps(item, ensure_ascii=False))
+        yield "\n".join(lines) + "\n"
+
+def _csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows(tuple(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _geojson(chunks):
+    yield '{"type": "FeatureCollection", "features": ['
+    first = True
+    for rows in chunks:
+        features = []
+        for row in rows:
+            props = {k: row[k] for k in EXPORT_COLUMNS if k not in ("latitude", "longitude", "metadata")}
+            props["metadata"] = _metadata(row)
+            geometry = None
+            if row["latitude"] is not None and row["longitude"] is not None:
+                geometry = {"type": "Point", "coordinates": [row["longitude"], row["latitude"]]}
+            features.append(json.dumps(
+                {"type": "Feature", "id": row["id"], "geometry": geometry, "properties": props},
+                ensure_ascii=False
+            ))
+        if features:
+            yield ("" if first else ",") + ",".join(features)
+            first = False
+    yield "]}\n"
+
+def _gpx(chunks):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx version="1.1" creator="Cuaderno de Bitácora" xmlns="http://www.topografix.com/GPX/1/1">\n'
+    )
+    for rows in chunks:
+        parts = []
+        for row in rows:
+            # Solo las entradas con posición se convierten en waypoints
+            if row["latitude"] is None or row["longitude"] is None:
+                continue
+            text = row["text"] or ""
+            name = text.strip().splitlines()[0][:60] if text.strip() else f"#{row['id']}"
+            parts.append(
+                f'  <wpt lat={quoteattr(repr(row["latitude"]))} lon={quoteattr(repr(row["longitude"]))}>\n'
+                f'    <time>{escape(row["timestamp_utc"])}</time>\n'
+                f'    <name>{escape(name)}</name>\n'
+                f'    <desc>{escape(text)}</desc>\n'
+                f'    <type>{escape(row["entry_type"] or "")}</type>\n'
+                f'  </wpt>\n'
+            )
+        if parts:
+            yield "".join(parts)
+    yield "</gpx>\n"
+
+EXPORT_FORMATS = {
+    "ndjson": (_ndjson, "application/x-ndjson"),
+    "csv": (_csv, "text/csv; charset=utf-8"),
+    "geojson": (_geojson, "application/geo+json"),
+    "gpx": (_gpx, "application/gpx+xml"),
+}
+
+def _upper_bound(value):
+    """Condición para "to": (operador, límite). Lanza ValueError si la fecha no es válida."""
+    value = value.strip()
+    if len(value) == 10:
+        # Fecha sin hora: el día completo, con límite exclusivo en las 00:00 del
+        # día siguiente (un "…T23:59:59.999Z" dejaba fuera "…T23:59:59Z", '.' < 'Z')
+        next_day = date.fromisoformat(value) + timedelta(days=1)
+        return "<", next_day.isoformat() + "T00:00:00Z"
+    return "<=", value
+
+@export_bp.route("/export")
+def export_entries():
+    """Exporta el cuaderno en streaming: ?format=gpx|geojson|csv|ndjson&from=&to=&type=&source=&metric="""
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Formato no soportado. Usa: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    where_clauses, params = _entry_filters(request.args)
+    try:
+        metric_clauses, metric_params = _metric_filter(request.args)
+    except ValueError:
+        return jsonify({"error": "gt/gte/lt/lte deben ser números"}), 400
+    where_clauses += metric_clauses
+    params += metric_params
+    if request.args.get("from"):
+        where_clauses.append("timestamp_utc >= ?")
+        params.append(request.args["from"].strip())
+    if request.args.get("to"):
+        try:
+            op, bound = _upper_bound(request.args["to"])
+        except ValueError:
+            return jsonify({"error": "to debe ser una fecha YYYY-MM-DD o una hora ISO 8601"}), 400
+        where_clauses.append(f"timestamp_utc {op} ?")
+        params.append(bound)
+    if fmt == "gpx":
+        where_clauses.append("latitude IS NOT NULL AND longitude IS NOT NULL")
+
+    render, mimetype = EXPORT_FORMATS[fmt]
+    filename = f"bitacora_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M')}.{fmt}"
+    return Response(
+        stream_with_context(render(_iter_rows(where_clauses, params))),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,24 +1,34 @@
 # api/log_routes.py
 
 from flask import Blueprint, request, jsonify, render_template
+from markupsafe import escape
 from datetime import datetime, timezone
+import codecs
+import io
 import json
-import sqlite3
-import requests
+import logging
+import math
+import re
 
 import shutil
 from pathlib import Path
-import zipfile
 
 import os
 import secrets
 from werkzeug.utils import secure_filename
 
-from core.database import DB_PATH, init_db
+from core.database import connection, transaction
 from core.config_manager import load_config, DATA_DIR
 from core.config_manager import get_signalk_config
-from core.signalk_client import is_signalk_enabled, get_signalk_data, publish_note_to_resources
-from core.utils import render_markdown_safe
+from core.signalk_client import is_signalk_enabled
+from core.signalk_outbox import enqueue_sync, enqueue_delete, wake_worker, outbox_status
+from core.signalk_stream import get_latest_data
+from core.utils import encode_cursor, decode_cursor, haversine_nm, VALID_ENTRY_TYPES
+from core.rendering import rendered_columns, attach_text_html
+from core.backup import start_backup, get_backup_job
+from core.media import generate_derivatives, attach_media, move_to_deleted
+from core.bulk_import import DEFAULT_SOURCE, import_entries, iter_ndjson, iter_csv
+from core.metrics import record_upload
 
 from core.i18n import get_translation
 
@@ -26,6 +36,52 @@ from core.i18n import get_translation
 UPLOADS_DIR = DATA_DIR / "uploads"
 
 log_bp = Blueprint('log', __name__)
+logger = logging.getLogger(__name__)
+
+def _entry_filters(args):
+    """Filtros ?type= y ?source= comunes a los listados. Devuelve (cláusulas, parámetros)."""
+    entry_type = args.get("type", "").strip()
+    source_filter = args.get("source", "").strip()
+
+    where_clauses = []
+    params = []
+
+    if entry_type in VALID_ENTRY_TYPES:
+        where_clauses.append("entry_type = ?")
+        params.append(entry_type)
+
+    if source_filter == "manual":
+        where_clauses.append("is_manual = 1")
+    elif source_filter == "auto":
+        where_clauses.append("is_manual = 0")
+
+    return where_clauses, params
+
+_METRIC_OPERATORS = (("gt", ">"), ("gte", ">="), ("lt", "<"), ("lte", "<="))
+
+def _metric_filter(args):
+    """Filtro ?metric=<path>&gt=&gte=&lt=&lte= sobre entry_metrics (valores numéricos de metadata).
+
+    Devuelve (cláusulas, parámetros). Lanza ValueError si algún límite no es un número.
+    """
+    metric = args.get("metric", "").strip()
+    if not metric:
+        return [], []
+    conditions, params = ["path = ?"], [metric]
+    for arg, operator in _METRIC_OPERATORS:
+        if args.get(arg):
+            conditions.append(f"value_real {operator} ?")
+            params.append(float(args[arg]))
+    return [f"id IN (SELECT entry_id FROM entry_metrics WHERE {' AND '.join(conditions)})"], params
+
+def _should_publish(entry_type, latitude, longitude):
+    """¿Hay que publicar esta entrada como nota en Signal K según la configuración?"""
+    if not is_signalk_enabled() or latitude is None or longitude is None:
+        return False
+    sk_cfg = load_config().get("signalk", {})
+    sync_enabled = sk_cfg.get("sync_resources", True)
+    sync_types = sk_cfg.get("sync_entry_types", ["log", "navigation", "weather"])
+    return bool(isinstance(sync_types, list) and sync_enabled and entry_type in sync_types)
 
 @log_bp.route("/quick-note", methods=["POST"])
 def quick_note():
@@ -34,8 +90,6 @@ def quick_note():
     if not text:
         return jsonify({"error": "El texto es obligatorio"}), 400
 
-    init_db()
-
     # Timestamp UTC en formato ISO 8601 + "Z"
     timestamp_utc = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
@@ -48,9 +102,7 @@ def quick_note():
     # Intentar obtener datos de Signal K
     if is_signalk_enabled():
         try:
-            sk_config = get_signalk_config()
-            paths = sk_config.get("selected_paths", ["navigation.position", "navigation.state"])
-            sk_data = get_signalk_data(paths)
+            sk_data = get_latest_data(get_signalk_config()["selected_paths"])
             metadata.update(sk_data)
 
             # Procesar navigation.position (ahora siempre será [lat, lon] o None)
@@ -68,7 +120,7 @@ def quick_note():
             # Si no es str, lo ignoramos (queda None)
 
         except Exception as e:
-            print(f"⚠️  Error al consultar Signal K: {e}")
+            logger.warning("⚠️  Error al consultar Signal K: %s", e)
 
     # --- Asegurar tipos compatibles con SQLite ---
     # (esto evita el "Error binding parameter 3")
@@ -77,122 +129,76 @@ def quick_note():
     navigation_state_db = navigation_state if navigation_state is not None else None
     text_db = str(text)
     metadata_db = json.dumps(metadata, ensure_ascii=False) if metadata else None
+    text_html, text_html_version = rendered_columns(text_db)
+    should_publish = _should_publish("log", latitude, longitude)
 
     # Guardar en base de datos
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO log_entries (
-            timestamp_utc, latitude, longitude, navigation_state, text,
-            media_path, source, entry_type, signalK_resource_id, metadata
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        timestamp_utc,
-        latitude_db,
-        longitude_db,
-        navigation_state_db,
-        text_db,
-        None,  # media_path
-        "quick-note",
-        "log",
-        None,  # signalK_resource_id (se actualiza luego si aplica)
-        metadata_db
-    ))
-    entry_id = c.lastrowid
-    conn.commit()
-    conn.close()
-
-    # Intentar publicar en Signal K (solo si hay posición)
-    signalK_resource_id = None
-    
-    #__debug__
-    print(f"🔍 Signal K habilitado: {is_signalk_enabled()}")
-    print(f"🔍 Lat: {latitude}, Lon: {longitude}")
-    print(f"🔍 ¿Debería publicar? {is_signalk_enabled() and latitude is not None and longitude is not None}")
-    # Nueva lógica: ¿debo publicar?
-    should_publish = False
-    if is_signalk_enabled() and latitude is not None and longitude is not None:
-        config = load_config()
-        sk_cfg = config.get("signalk", {})
-        sync_enabled = sk_cfg.get("sync_resources", True)
-        sync_types = sk_cfg.get("sync_entry_types", ["log", "navigation", "weather"])
-        if isinstance(sync_types, list) and sync_enabled and "log" in sync_types:
-            should_publish = True
-    
+    with transaction() as conn:
+        c = conn.execute("""
+            INSERT INTO log_entries (
+                timestamp_utc, latitude, longitude, navigation_state, text,
+                media_path, source, entry_type, signalK_resource_id, metadata,
+                text_html, text_html_version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            timestamp_utc,
+            latitude_db,
+            longitude_db,
+            navigation_state_db,
+            text_db,
+            None,  # media_path
+            "quick-note",
+            "log",
+            None,  # signalK_resource_id (se actualiza luego si aplica)
+            metadata_db,
+            text_html,
+            text_html_version
+        ))
+        entry_id = c.lastrowid
+        if should_publish:
+            enqueue_sync(conn, entry_id)
+
+    # Publicar en Signal K (solo si hay posición): la fila del outbox se encoló junto al INSERT
+    logger.debug("🔍 Nota rápida #%s: lat=%s lon=%s, publicar en Signal K: %s",
+                 entry_id, latitude, longitude, should_publish)
     if should_publish:
-        try:
-            note_data = {
-                "timestamp_utc": timestamp_utc,
-                "text": text,
-                "latitude": latitude,
-                "longitude": longitude,
-                "navigation_state": navigation_state
-            }
-            signalK_resource_id = publish_note_to_resources(note_data)
-
-            if signalK_resource_id:
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                c.execute("UPDATE log_entries SET signalK_resource_id = ? WHERE id = ?", (signalK_resource_id, entry_id))
-                conn.commit()
-                conn.close()
-        except Exception as e:
-            print(f"⚠️  Error al publicar en Signal K: {e}")
+        wake_worker()
 
     return jsonify({"status": "ok", "id": entry_id})
 
 @log_bp.route("/entry/<int:entry_id>", methods=["DELETE"])
 def delete_entry(entry_id):
-    # 1. Obtener la entrada completa (incluyendo media_path y signalK_resource_id)
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("""
-        SELECT signalK_resource_id, media_path 
-        FROM log_entries 
-        WHERE id = ?
-    """, (entry_id,))
-    row = c.fetchone()
-    if not row:
-        conn.close()
-        return jsonify({"error": "Entrada no encontrada"}), 404
-
-    signalK_resource_id = row["signalK_resource_id"]
-    media_path = row["media_path"]  # ✅ ¡ahora sí está definido!
-    conn.close()
-
-    # 2. Si hay media_path, mover la imagen a uploads/deleted/
+    signalk_enabled = is_signalk_enabled()
+    # 1. Leer y borrar en la misma transacción: si el outbox publica la nota justo
+    #    antes, el BEGIN IMMEDIATE espera a que guarde su id y aquí lo vemos
+    with transaction() as conn:
+        row = conn.execute("""
+            SELECT signalK_resource_id, media_path
+            FROM log_entries
+            WHERE id = ?
+        """, (entry_id,)).fetchone()
+        if not row:
+            return jsonify({"error": "Entrada no encontrada"}), 404
+        signalK_resource_id = row["signalK_resource_id"]
+        media_path = row["media_path"]
+        c = conn.execute("DELETE FROM log_entries WHERE id = ?", (entry_id,))
+        deleted = c.rowcount > 0
+        if deleted:
+            # 2. Encolar el borrado en Signal K (si aplica)
+            enqueue_delete(conn, entry_id, signalK_resource_id if signalk_enabled else None)
+    if not deleted:
+        return jsonify({"error": "No se pudo eliminar"}), 500
+    if signalK_resource_id:
+        wake_worker()
+
+    # 3. Con el borrado ya confirmado, mover la imagen a uploads/deleted/
     if media_path:
         try:
-            src_path = DATA_DIR / media_path  # media_path es relativo: "uploads/imagen.jpg"
-            if src_path.exists():
-                deleted_dir = UPLOADS_DIR / "deleted"
-                deleted_dir.mkdir(exist_ok=True)
-                dst_path = deleted_dir / src_path.name
-                src_path.rename(dst_path)
-                print(f"🖼️  Imagen movida a {dst_path}")
-        except Exception as e:
-            print(f"⚠️  Error al mover imagen: {e}")
+            move_to_deleted(media_path)
+        except Exception:
+            logger.exception("⚠️  Error al mover imagen de la entrada #%s", entry_id)
 
-    # 3. Borrar en Signal K (si aplica)
-    if signalK_resource_id and is_signalk_enabled():
-        try:
-            sk = get_signalk_config()
-            url = f"{sk['url'].rstrip('/')}/signalk/v2/api/resources/notes/{signalK_resource_id}"
-            headers = {"Authorization": f"Bearer {sk['token']}"}
-            requests.delete(url, headers=headers, timeout=10)
-        except Exception as e:
-            print(f"⚠️  Error al borrar en Signal K: {e}")
-
-    # 4. Borrar de la base de datos
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM log_entries WHERE id = ?", (entry_id,))
-    conn.commit()
-    deleted = c.rowcount > 0
-    conn.close()
-
-    return (jsonify({"status": "ok"}), 200) if deleted else (jsonify({"error": "No se pudo eliminar"}), 500)
+    return jsonify({"status": "ok"}), 200
 
 @log_bp.route("/entry/new")
 def new_entry_form():
@@ -240,16 +246,16 @@ def create_entry():
                 new_filename = f"{now_str}_{random_suffix}.{ext}"
                 file_path = UPLOADS_DIR / new_filename
                 file.save(file_path)
+                record_upload("image", file_path.stat().st_size)
                 media_path = f"uploads/{new_filename}"
+                generate_derivatives(media_path)
 
     # Obtener posición de Signal K (si está activo)
     latitude = longitude = None
     metadata_from_sk = {}
     if is_signalk_enabled():
         try:
-            full_config = load_config()
-            selected_paths = full_config.get("signalk", {}).get("selected_paths", ["navigation.position", "navigation.state"])
-            sk_data = get_signalk_data(selected_paths)
+            sk_data = get_latest_data(get_signalk_config()["selected_paths"])
 
             # Extraer posición
             pos = sk_data.get("navigation.position")
@@ -259,81 +265,86 @@ def create_entry():
             # Guardar todo en metadata
             metadata_from_sk.update(sk_data)
         except Exception as e:
-            print(f"⚠️  Error al obtener datos de Signal K: {e}")
+            logger.warning("⚠️  Error al obtener datos de Signal K: %s", e)
     
     # Fusionar metadata del formulario + Signal K
     final_metadata = metadata.copy()
     final_metadata.update(metadata_from_sk)
     
+    text_html, text_html_version = rendered_columns(text)
+    should_publish = _should_publish(entry_type, latitude, longitude)
+
     # Guardar en BD
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO log_entries (
-            timestamp_utc, latitude, longitude, navigation_state, text,
-            media_path, source, entry_type, signalK_resource_id, metadata
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        timestamp_utc,
-        latitude,
-        longitude,
-        navigation_state,
-        text,
-        media_path,
-        "manual",
-        entry_type,
-        None,
-        json.dumps(final_metadata, ensure_ascii=False) if final_metadata else None
-    ))
-    entry_id = c.lastrowid
-    conn.commit()
-    conn.close()
-
-    # Publicar en Signal K si hay posición
-    signalK_resource_id = None
-    # Nueva lógica: ¿debo publicar?
-    should_publish = False
-    if is_signalk_enabled() and latitude is not None and longitude is not None:
-        config = load_config()
-        sk_cfg = config.get("signalk", {})
-        sync_enabled = sk_cfg.get("sync_resources", True)
-        sync_types = sk_cfg.get("sync_entry_types", ["log", "navigation", "weather"])
-        if isinstance(sync_types, list) and sync_enabled and entry_type in sync_types:
-            should_publish = True
-    
+    with transaction() as conn:
+        c = conn.execute("""
+            INSERT INTO log_entries (
+                timestamp_utc, latitude, longitude, navigation_state, text,
+                media_path, source, entry_type, signalK_resource_id, metadata,
+                text_html, text_html_version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            timestamp_utc,
+            latitude,
+            longitude,
+            navigation_state,
+            text,
+            media_path,
+            "manual",
+            entry_type,
+            None,
+            json.dumps(final_metadata, ensure_ascii=False) if final_metadata else None,
+            text_html,
+            text_html_version
+        ))
+        entry_id = c.lastrowid
+        if should_publish:
+            enqueue_sync(conn, entry_id)
+
+    # Publicar en Signal K si hay posición (lo hace el outbox en segundo plano)
     if should_publish:
-        try:
-            note_data = {
-                "timestamp_utc": timestamp_utc,
-                "text": text,
-                "latitude": latitude,
-                "longitude": longitude,
-                "navigation_state": navigation_state
-            }
-            signalK_resource_id = publish_note_to_resources(note_data)
-            if signalK_resource_id:
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                c.execute("UPDATE log_entries SET signalK_resource_id = ? WHERE id = ?", (signalK_resource_id, entry_id))
-                conn.commit()
-                conn.close()
-        except Exception as e:
-            print(f"⚠️  Error al publicar en Signal K: {e}")
+        wake_worker()
 
     return jsonify({"status": "ok", "id": entry_id})
 
+@log_bp.route("/entries/bulk", methods=["POST"])
+def bulk_import_entries():
+    """Importación masiva en NDJSON o CSV (?format=ndjson|csv, ?dry_run=1 para solo validar).
+
+    El cuerpo puede ir tal cual o como fichero "file" en multipart/form-data.
+    ?source= fija el origen de las filas que no lo traen (por defecto "import").
+    Las entradas importadas no se publican en Signal K.
+    """
+    upload = request.files.get("file")
+    fmt = request.args.get("format", "").lower()
+    if not fmt:
+        name = (upload.filename if upload else "") or ""
+        mimetype = upload.mimetype if upload else request.mimetype
+        fmt = "csv" if name.lower().endswith(".csv") or mimetype in ("text/csv", "application/csv") else "ndjson"
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "Formato no soportado. Usa: ndjson, csv"}), 400
+    dry_run = request.args.get("dry_run", "").lower() in ("1", "true", "yes")
+    source = request.args.get("source", "").strip() or DEFAULT_SOURCE
+    if len(source) > 32:
+        return jsonify({"error": "source no válido"}), 400
+
+    # Se lee línea a línea del stream, sin cargar el fichero entero en memoria
+    # (request.stream es un stream "raw": sin buffer, readline() leería byte a byte)
+    stream = upload.stream if upload else io.BufferedReader(request.stream, buffer_size=64 * 1024)
+    lines = codecs.iterdecode(stream, "utf-8-sig")
+    records = iter_csv(lines) if fmt == "csv" else iter_ndjson(lines)
+    result = import_entries(records, dry_run=dry_run, source=source)
+    record_upload("bulk", request.content_length)
+    result["status"] = "ok" if result["error_count"] == 0 else "partial"
+    return jsonify(result)
+
 @log_bp.route("/entry/<int:entry_id>/edit", methods=["GET"])
 def edit_entry_form(entry_id):
     config = load_config()
     lang = config.get("language", "es")
     t = get_translation(lang)
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM log_entries WHERE id = ?", (entry_id,))
-    row = c.fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM log_entries WHERE id = ?", (entry_id,)).fetchone()
 
     if not row:
         return jsonify({"error": "Entrada no encontrada"}), 404
@@ -368,15 +379,14 @@ def update_entry(entry_id):
     UPLOADS_DIR.mkdir(exist_ok=True)
 
     # Verificar que la entrada existe
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT media_path FROM log_entries WHERE id = ?", (entry_id,))
-    row = c.fetchone()
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT media_path, latitude, longitude, signalK_resource_id
+            FROM log_entries WHERE id = ?
+        """, (entry_id,)).fetchone()
     if not row:
-        conn.close()
         return jsonify({"error": "Entrada no encontrada"}), 404
-    old_media_path = row[0]
-    conn.close()
+    old_media_path = row["media_path"]
 
     # Procesar formulario
     text = request.form.get("text", "").strip()
@@ -404,14 +414,9 @@ def update_entry(entry_id):
         # Mover la actual a deleted/
         if old_media_path:
             try:
-                src = DATA_DIR / old_media_path
-                if src.exists():
-                    deleted_dir = UPLOADS_DIR / "deleted"
-                    deleted_dir.mkdir(exist_ok=True)
-                    dst = deleted_dir / src.name
-                    src.rename(dst)
-            except Exception as e:
-                print(f"⚠️ Error al mover imagen a deleted: {e}")
+                move_to_deleted(old_media_path)
+            except Exception:
+                logger.exception("⚠️  Error al mover imagen a deleted")
         media_path = None
 
     # ¿Subir nueva imagen?
@@ -426,43 +431,50 @@ def update_entry(entry_id):
                 new_filename = f"{now_str}_{random_suffix}.{ext}"
                 file_path = UPLOADS_DIR / new_filename
                 file.save(file_path)
+                record_upload("image", file_path.stat().st_size)
                 media_path = f"uploads/{new_filename}"
+                generate_derivatives(media_path)
 
                 # Si había una imagen anterior y NO se marcó "remove", moverla ahora
                 if old_media_path and not remove_image and old_media_path != media_path:
                     try:
-                        src = DATA_DIR / old_media_path
-                        if src.exists():
-                            deleted_dir = UPLOADS_DIR / "deleted"
-                            deleted_dir.mkdir(exist_ok=True)
-                            dst = deleted_dir / src.name
-                            src.rename(dst)
-                    except Exception as e:
-                        print(f"⚠️ Error al mover imagen antigua: {e}")
+                        move_to_deleted(old_media_path)
+                    except Exception:
+                        logger.exception("⚠️  Error al mover imagen antigua")
+
+    text_html, text_html_version = rendered_columns(text)
+    # Si la nota ya está en Signal K se actualiza; si no, se publica cuando corresponda
+    should_sync = (bool(row["signalK_resource_id"]) and bool(is_signalk_enabled())) or \
+        _should_publish(entry_type, row["latitude"], row["longitude"])
 
     # Actualizar DB
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        UPDATE log_entries SET
-            timestamp_utc = ?,
-            navigation_state = ?,
-            text = ?,
-            media_path = ?,
-            entry_type = ?,
-            metadata = ?
-        WHERE id = ?
-    """, (
-        timestamp_utc,
-        navigation_state,
-        text,
-        media_path,
-        entry_type,
-        json.dumps(metadata, ensure_ascii=False) if metadata else None,
-        entry_id
-    ))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("""
+            UPDATE log_entries SET
+                timestamp_utc = ?,
+                navigation_state = ?,
+                text = ?,
+                media_path = ?,
+                entry_type = ?,
+                metadata = ?,
+                text_html = ?,
+                text_html_version = ?
+            WHERE id = ?
+        """, (
+            timestamp_utc,
+            navigation_state,
+            text,
+            media_path,
+            entry_type,
+            json.dumps(metadata, ensure_ascii=False) if metadata else None,
+            text_html,
+            text_html_version,
+            entry_id
+        ))
+        if should_sync:
+            enqueue_sync(conn, entry_id)
+    if should_sync:
+        wake_worker()
 
     return jsonify({"status": "ok", "id": entry_id})
 
@@ -472,18 +484,15 @@ def view_entry(entry_id):
     lang = config.get("language", "es")
     t = get_translation(lang)
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM log_entries WHERE id = ?", (entry_id,))
-    row = c.fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM log_entries WHERE id = ?", (entry_id,)).fetchone()
 
     if not row:
         return jsonify({"error": "Entrada no encontrada"}), 404
 
     entry = dict(row)
-    entry["text_html"] = render_markdown_safe(entry.get("text"))
+    attach_text_html([entry])
+    attach_media([entry])
     
     metadata = json.loads(entry.get("metadata") or "{}")
 
@@ -509,52 +518,156 @@ def view_entry(entry_id):
         cloud_cover=cloud_cover
     )
 
+def _rtree_clause(min_lat, max_lat, min_lon, max_lon):
+    """Subconsulta sobre log_entries_rtree; si la caja cruza el antimeridiano se parte en dos."""
+    lon_ranges = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180.0), (-180.0, max_lon)]
+    parts, params = [], []
+    for lo, hi in lon_ranges:
+        parts.append("(max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?)")
+        params.extend([min_lat, max_lat, lo, hi])
+    return f"id IN (SELECT id FROM log_entries_rtree WHERE {' OR '.join(parts)})", params
+
+def _parse_floats(value, count):
+    parts = value.split(",")
+    if len(parts) != count:
+        raise ValueError(value)
+    return [float(p) for p in parts]
+
+def _near_bbox(lat, lon, radius_nm):
+    """Caja que contiene el círculo de radius_nm alrededor de (lat, lon)."""
+    dlat = radius_nm / 60.0
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(radius_nm / (60.0 * cos_lat), 180.0)
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if dlon >= 180.0:
+        min_lon, max_lon = -180.0, 180.0
+    else:
+        # Normalizar a [-180, 180]; si cruza el antimeridiano min_lon > max_lon
+        min_lon = (min_lon + 180.0) % 360.0 - 180.0
+        max_lon = (max_lon + 180.0) % 360.0 - 180.0
+    return max(lat - dlat, -90.0), min(lat + dlat, 90.0), min_lon, max_lon
+
+_ENTRY_COLUMNS = """id, timestamp_utc, latitude, longitude, navigation_state,
+               text, media_path, source, entry_type, text_html, text_html_version"""
+
+def _entries_for_api(rows):
+    entries = attach_media(attach_text_html([dict(row) for row in rows]))
+    for entry in entries:
+        entry.pop("text_html_version", None)
+    return entries
+
 @log_bp.route("/entries")
 def api_entries():
-    page = request.args.get("page", 1, type=int)
-    limit = 20
-    offset = (page - 1) * limit
+    # Filtros espaciales: ?bbox=min_lon,min_lat,max_lon,max_lat  o  ?near=lat,lon&radius_nm=2
+    try:
+        bbox = _parse_floats(request.args["bbox"], 4) if request.args.get("bbox") else None
+        near = _parse_floats(request.args["near"], 2) if request.args.get("near") else None
+        radius_nm = float(request.args.get("radius_nm", 1.0))
+    except ValueError:
+        return jsonify({"error": "bbox/near/radius_nm no válidos"}), 400
+    try:
+        metric_clauses, metric_params = _metric_filter(request.args)
+    except ValueError:
+        return jsonify({"error": "gt/gte/lt/lte deben ser números"}), 400
+    if near and radius_nm <= 0:
+        return jsonify({"error": "radius_nm debe ser positivo"}), 400
+    if near and not (-90 <= near[0] <= 90 and -180 <= near[1] <= 180):
+        return jsonify({"error": "near fuera de rango (lat ±90, lon ±180)"}), 400
+
+    # Modo cursor: ?before=<timestamp_utc,id> (vacío = desde la más reciente).
+    # Coste constante por página, sin importar lo lejos que se haya bajado.
+    cursor_mode = "before" in request.args
+    if cursor_mode or near:
+        limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+        before = decode_cursor(request.args.get("before", ""))
+        if request.args.get("before") and before is None:
+            return jsonify({"error": "Cursor no válido"}), 400
+    else:
+        # Modo clásico por número de página (compatibilidad)
+        page = max(request.args.get("page", 1, type=int), 1)
+        limit = 20
+        offset = (page - 1) * limit
 
     # Aplicar los mismos filtros que en la vista principal
-    entry_type = request.args.get("type", "").strip()
-    source_filter = request.args.get("source", "").strip()
-
-    valid_types = {"log", "maintenance", "weather", "navigation", "fuel", "radio", "provision", "other", "experience"}
-    valid_sources = {"manual", "auto"}
-
-    where_clauses = []
-    params = []
+    where_clauses, params = _entry_filters(request.args)
+    where_clauses += metric_clauses
+    params += metric_params
+
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        clause, clause_params = _rtree_clause(min_lat, max_lat, min_lon, max_lon)
+        where_clauses.append(clause)
+        params.extend(clause_params)
+
+    if near:
+        # En near el cursor es "<distancia>,<id>" (el next_cursor de la página anterior)
+        try:
+            after = (float(before[0]), before[1]) if before else None
+        except ValueError:
+            return jsonify({"error": "Cursor no válido"}), 400
+        return _entries_near(near[0], near[1], radius_nm, limit, where_clauses, params, after)
 
-    if entry_type in valid_types:
-        where_clauses.append("entry_type = ?")
-        params.append(entry_type)
-
-    if source_filter == "manual":
-        where_clauses.append("source IN ('manual', 'quick-note')")
-    elif source_filter == "auto":
-        where_clauses.append("source NOT IN ('manual', 'quick-note')")
+    if cursor_mode and before:
+        where_clauses.append("(timestamp_utc, id) < (?, ?)")
+        params.extend(before)
 
     where = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
 
     query = f"""
-        SELECT id, timestamp_utc, latitude, longitude, navigation_state,
-               text, media_path, source, entry_type
+        SELECT {_ENTRY_COLUMNS}
         FROM log_entries
         {where}
-        ORDER BY timestamp_utc DESC
+        ORDER BY timestamp_utc DESC, id DESC
         LIMIT ? OFFSET ?
     """
-    params.extend([limit, offset])
+    if cursor_mode:
+        # Pedimos una fila de más para saber si queda otra página
+        params.extend([limit + 1, 0])
+    else:
+        params.extend([limit, offset])
+
+    with connection() as conn:
+        rows = conn.execute(query, params).fetchall()
 
-    conn = sqlite3.connect(DATA_DIR / "logbook.db")
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    conn.close()
+    entries = _entries_for_api(rows[:limit])
+    if not cursor_mode:
+        return jsonify(entries)
 
-    entries = [dict(row) for row in rows]
-    return jsonify(entries)
+    next_cursor = encode_cursor(entries[-1]) if len(rows) > limit else None
+    return jsonify({"entries": entries, "next_cursor": next_cursor})
+
+def _entries_near(lat, lon, radius_nm, limit, where_clauses, params, after=None):
+    """Entradas a menos de radius_nm, ordenadas por (distancia exacta (haversine), id).
+
+    after = (distancia, id) de la última entrada de la página anterior.
+    """
+    clause, clause_params = _rtree_clause(*_near_bbox(lat, lon, radius_nm))
+    where = " AND ".join(where_clauses + [clause])
+    with connection() as conn:
+        # Primero solo id y posición de los candidatos de la caja; luego las filas completas de los elegidos
+        candidates = conn.execute(
+            f"SELECT id, latitude, longitude FROM log_entries WHERE {where}",
+            params + clause_params
+        ).fetchall()
+        nearest = sorted(
+            (d, row["id"]) for row in candidates
+            if (d := haversine_nm(lat, lon, row["latitude"], row["longitude"])) <= radius_nm
+            and (after is None or (d, row["id"]) > after)
+        )
+        page = nearest[:limit]
+        distances = {entry_id: d for d, entry_id in page}
+        rows = conn.execute(
+            f"SELECT {_ENTRY_COLUMNS} FROM log_entries WHERE id IN ({','.join('?' * len(distances))})",
+            list(distances)
+        ).fetchall() if distances else []
+
+    entries = _entries_for_api(rows)
+    for entry in entries:
+        entry["distance_nm"] = round(distances[entry["id"]], 3)
+    entries.sort(key=lambda e: (distances[e["id"]], e["id"]))
+    # La distancia va completa (repr) en el cursor: redondeada, se saltaría o repetiría filas
+    next_cursor = f"{page[-1][0]!r},{page[-1][1]}" if len(nearest) > limit else None
+    return jsonify({"entries": entries, "next_cursor": next_cursor})
 
 @log_bp.route("/backup", methods=["POST"])
 def create_backup():
@@ -566,32 +679,88 @@ def create_backup():
     if not backup_path.exists() or not os.access(backup_path, os.W_OK):
         return jsonify({"error": "Ruta de backup no válida o sin permisos"}), 400
 
-    # Crear nombre único
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-    zip_name = f"logbook_backup_{timestamp}.zip"
-    zip_path = backup_path / zip_name
+    job = start_backup(backup_path)
+    return jsonify({"status": job.status, "job_id": job.job_id}), 202
 
-    try:
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # 1. Base de datos
-            db_file = DATA_DIR / "logbook.db"
-            if db_file.exists():
-                zf.write(db_file, "logbook.db")
-            
-            # 2. Configuración
-            config_file = DATA_DIR / "config.json"
-            if config_file.exists():
-                zf.write(config_file, "config.json")
-            
-            # 3. Imágenes (solo uploads/, no deleted/)
-            uploads_dir = DATA_DIR / "uploads"
-            if uploads_dir.exists():
-                for img in uploads_dir.iterdir():
-                    if img.is_file() and img.name != "deleted":
-                        zf.write(img, f"uploads/{img.name}")
-        
-        return jsonify({"status": "ok", "file": str(zip_path)})
-    
-    except Exception as e:
-        print(f"❌ Error al crear backup: {e}")
-        return jsonify({"error": str(e)}), 500
+@log_bp.route("/backup/<job_id>")
+def backup_status(job_id):
+    """Progreso de un backup lanzado con POST /backup."""
+    job = get_backup_job(job_id)
+    if job is None:
+        return jsonify({"error": "Backup no encontrado"}), 404
+    return jsonify(job.to_dict())
+
+@log_bp.route("/signalk/outbox")
+def signalk_outbox_status():
+    """Estado de la cola de sincronización con Signal K."""
+    return jsonify(outbox_status())
+
+# Marcadores internos para snippet(); se sustituyen por <mark> después de escapar el HTML
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+def _fts_query(q):
+    """Convierte lo que escribe el usuario en una consulta FTS5 segura (todas las palabras, por prefijo)."""
+    words = re.findall(r"\w+", q)
+    return " ".join(f'"{w}"*' for w in words)
+
+def _highlight(fragment):
+    if not fragment:
+        return ""
+    return str(escape(fragment)).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+@log_bp.route("/search")
+def api_search():
+    """Búsqueda de texto completo en el texto y los metadatos de las entradas.
+
+    ?q=ancla&type=log&source=manual&limit=20&before=<next_cursor>
+    """
+    match = _fts_query(request.args.get("q", ""))
+    if not match:
+        return jsonify({"error": "Parámetro q obligatorio"}), 400
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+
+    where_clauses, params = _entry_filters(request.args)
+    where_clauses.insert(0, "log_entries_fts MATCH ?")
+    params.insert(0, match)
+
+    # Cursor: "<rank>,<id>" de la última fila devuelta (orden por relevancia, el
+    # id desempata). repr() conserva el float exacto, así que con el cuaderno sin
+    # cambios las páginas ni se saltan ni repiten filas. bm25 depende de toda la
+    # colección: si se añaden, editan o borran entradas entre páginas, el rank de
+    # las demás cambia y el cursor ya no garantiza nada.
+    before = request.args.get("before", "")
+    if before:
+        rank, sep, last_id = before.rpartition(",")
+        try:
+            cursor = (float(rank), int(last_id))
+        except ValueError:
+            return jsonify({"error": "Cursor no válido"}), 400
+        where_clauses.append("(log_entries_fts.rank, e.id) > (?, ?)")
+        params.extend(cursor)
+
+    query = f"""
+        SELECT e.id, e.timestamp_utc, e.latitude, e.longitude, e.navigation_state,
+               e.text, e.media_path, e.source, e.entry_type,
+               snippet(log_entries_fts, 0, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 16) AS text_snippet,
+               snippet(log_entries_fts, 1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 8) AS meta_snippet,
+               log_entries_fts.rank AS rank
+        FROM log_entries_fts
+        JOIN log_entries e ON e.id = log_entries_fts.rowid
+        WHERE {" AND ".join(where_clauses)}
+        ORDER BY log_entries_fts.rank, e.id
+        LIMIT ?
+    """
+    params.append(limit + 1)
+
+    with connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    results = []
+    for row in rows[:limit]:
+        item = dict(row)
+        item["text_snippet"] = _highlight(item["text_snippet"])
+        item["meta_snippet"] = _highlight(item["meta_snippet"])
+        results.append(item)
+
+    next_cursor = f"{rows[limit - 1]['rank']!r},{rows[limit - 1]['id']}" if len(rows) > limit else None
+    return jsonify({"results": results, "next_cursor": next_cursor})
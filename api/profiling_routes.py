@@ -0,0 +1,36 @@
+# api/profiling_routes.py
+
+from flask import Blueprint, request, jsonify, send_from_directory
+
+from core.profiling import (
+    PROFILES_DIR, PROFILE_SUFFIXES, clear_profiles, get_profiling_config, list_profiles, update_profiling_config,
+)
+
+profiling_bp = Blueprint('profiling', __name__)
+
+@profiling_bp.route("/profiling")
+def profiling_status():
+    """Ajustes del perfilador y perfiles guardados (del más reciente al más antiguo)."""
+    return jsonify({"settings": get_profiling_config(), "profiles": list_profiles()})
+
+@profiling_bp.route("/profiling", methods=["PUT"])
+def profiling_update():
+    """Cambia los ajustes en caliente: {"enabled": true, "sample_rate": 0.05, "slow_ms": 1500}"""
+    changes = request.get_json(silent=True)
+    if not isinstance(changes, dict):
+        return jsonify({"error": "Se esperaba un objeto JSON"}), 400
+    try:
+        settings = update_profiling_config(changes)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"settings": settings})
+
+@profiling_bp.route("/profiling", methods=["DELETE"])
+def profiling_clear():
+    return jsonify({"removed": clear_profiles()})
+
+@profiling_bp.route("/profiling/<filename>")
+def profiling_download(filename):
+    if not filename.endswith(PROFILE_SUFFIXES):
+        return jsonify({"error": "Perfil no encontrado"}), 404
+    return send_from_directory(PROFILES_DIR, filename, as_attachment=True)
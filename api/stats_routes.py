@@ -0,0 +1,51 @@
+# api/stats_routes.py
+
+from datetime import date, datetime, timedelta, timezone
+
+from flask import Blueprint, request, jsonify
+
+from core.polar import (
+    DEFAULT_POLAR_PATHS, DEFAULT_TWA_STEP, DEFAULT_TWS_BINS, MIN_SAMPLES, get_polar, numpy_available,
+)
+from core.stats import get_stats
+
+stats_bp = Blueprint('stats', __name__)
+
+STATS_GROUPS = {"day", "week", "month"}
+DEFAULT_STATS_DAYS = 30
+
+@stats_bp.route("/stats")
+def api_stats():
+    """Estadísticas de travesía desde los resúmenes diarios: ?from=YYYY-MM-DD&to=YYYY-MM-DD&group=day|week|month"""
+    group = request.args.get("group", "day")
+    if group not in STATS_GROUPS:
+        return jsonify({"error": "group debe ser day, week o month"}), 400
+    try:
+        date_to = date.fromisoformat(request.args["to"][:10]) if request.args.get("to") \
+            else datetime.now(timezone.utc).date()
+        date_from = date.fromisoformat(request.args["from"][:10]) if request.args.get("from") \
+            else date_to - timedelta(days=DEFAULT_STATS_DAYS - 1)
+    except ValueError:
+        return jsonify({"error": "from/to deben ser fechas YYYY-MM-DD"}), 400
+    if date_from > date_to:
+        return jsonify({"error": "from es posterior a to"}), 400
+    return jsonify(get_stats(date_from.isoformat(), date_to.isoformat(), group))
+
+@stats_bp.route("/polar")
+def api_polar():
+    """Polar de rendimiento: ?twa_step=10&tws_bins=0,4,6,...&min_samples=3&twa=&tws=&stw= (paths de Signal K)"""
+    if not numpy_available():
+        return jsonify({"error": "NumPy no está instalado"}), 503
+    try:
+        twa_step = int(request.args.get("twa_step", DEFAULT_TWA_STEP))
+        min_samples = int(request.args.get("min_samples", MIN_SAMPLES))
+        tws_bins = tuple(float(v) for v in request.args["tws_bins"].split(",")) \
+            if request.args.get("tws_bins") else DEFAULT_TWS_BINS
+    except ValueError:
+        return jsonify({"error": "twa_step, min_samples y tws_bins deben ser números"}), 400
+    if not 1 <= twa_step <= 90 or min_samples < 1:
+        return jsonify({"error": "twa_step debe estar entre 1 y 90 y min_samples ser al menos 1"}), 400
+    if len(tws_bins) < 2 or any(b <= a for a, b in zip(tws_bins, tws_bins[1:])):
+        return jsonify({"error": "tws_bins debe tener al menos dos límites crecientes"}), 400
+    paths = {k: request.args[k] for k in DEFAULT_POLAR_PATHS if request.args.get(k)}
+    return jsonify(get_polar(paths, twa_step, tws_bins, min_samples=min_samples))
@@ -1,8 +1,11 @@
 # app.py (completo, corregido)
 
 import os
-from flask import Flask, redirect, render_template, send_from_directory, request
-import sqlite3
+import sys
+import argparse
+import logging
+import threading
+from flask import Flask, Response, redirect, render_template, send_from_directory, request
 
 from pathlib import Path
 
@@ -11,26 +14,97 @@ import bleach
 
 from core.i18n import get_translation
 from core.config_manager import load_config, DATA_DIR
-from core.database import init_db
+from core.database import init_db, connection, close_all
+from core.signalk_stream import start_subscriber, stop_subscriber
+from core.signalk_outbox import start_outbox_worker, stop_outbox_worker, outbox_status
+from core.track_recorder import start_track_recorder, stop_track_recorder
+from core.server import serve
 from api.setup_routes import setup_bp
-from api.log_routes import log_bp
-from core.utils import render_markdown_safe
+from api.log_routes import log_bp, _entry_filters
+from api.export_routes import export_bp
+from api.stats_routes import stats_bp
+from api.profiling_routes import profiling_bp
+from core.utils import encode_cursor, VALID_ENTRY_TYPES
+from core.rendering import attach_text_html
+from core.media import attach_media
+from core.http_cache import FILE_ENDPOINTS, add_static_version, apply_cache_headers
+from core.metrics import Gauge, render_metrics, start_request_timer, observe_request
+from core.profiling import ProfilingMiddleware
+
+# Mensajes de depuración (nivel DEBUG) solo con BITACORA_LOG_LEVEL=DEBUG
+_log_level = getattr(logging, os.environ.get("BITACORA_LOG_LEVEL", "INFO").upper(), None)
+logging.basicConfig(
+    level=_log_level if isinstance(_log_level, int) else logging.INFO,
+    format="%(levelname)s %(name)s: %(message)s"
+)
 
 # ✅ Crear la BD al inicio (si no existe)
 init_db()
 
+_workers_started = False
+_workers_lock = threading.Lock()
+
+def start_background_workers():
+    """Arranca los hilos de fondo una sola vez por proceso, sea cual sea el punto de entrada."""
+    global _workers_started
+    if _workers_started:
+        return
+    with _workers_lock:
+        if _workers_started:
+            return
+        # Suscripción en segundo plano a Signal K (caché de últimos valores)
+        start_subscriber()
+        # Outbox: sincronización de notas con Signal K en segundo plano
+        start_outbox_worker()
+        # Grabación automática del track (si Signal K está activo)
+        start_track_recorder()
+        _workers_started = True
+
+def stop_background_workers():
+    """Para los hilos de fondo (el grabador vuelca antes sus puntos) y cierra la BD."""
+    stop_track_recorder()
+    stop_outbox_worker()
+    stop_subscriber()
+    close_all()
+
 DATA_DIR = Path.home() / ".bitacora"
 
 app = Flask(__name__)
 app.register_blueprint(setup_bp)
 app.register_blueprint(log_bp, url_prefix='/api')
+app.register_blueprint(export_bp, url_prefix='/api')
+app.register_blueprint(stats_bp, url_prefix='/api')
+app.register_blueprint(profiling_bp, url_prefix='/api')
+
+# Perfilado opcional de peticiones (desactivado salvo que se active en config o con PUT /api/profiling)
+app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
+
+# Métricas: el temporizador va antes que cualquier otro before_request y la
+# medida se toma en el último after_request (se ejecutan en orden inverso)
+app.before_request(start_request_timer)
+app.after_request(observe_request)
+Gauge("bitacora_signalk_outbox_pending", "Notas pendientes de sincronizar con Signal K.",
+      lambda: outbox_status()["pending"])
+
+# Caché HTTP: ?v= en los estáticos y cabeceras "immutable" para subidas y estáticos versionados
+app.url_defaults(add_static_version)
+app.after_request(apply_cache_headers)
+
+@app.before_request
+def ensure_background_workers():
+    # Con un servidor WSGI externo (waitress-serve app:app) no pasamos por __main__
+    start_background_workers()
 
 @app.before_request
 def check_setup():
-    config = load_config()
     from flask import request
+    # Ficheros (estáticos, imágenes): no hace falta leer la configuración
+    if request.endpoint in FILE_ENDPOINTS or request.endpoint == "metrics":
+        return None
+    config = load_config()
     if not config.get("setup_completed"):
-        if request.endpoint != 'setup.setup_page' and not request.endpoint.startswith('setup.'):
+        endpoint = request.endpoint or ""
+        if endpoint != 'setup.setup_page' and not endpoint.startswith('setup.'):
             return redirect("/setup")
 
 @app.route("/")
@@ -42,49 +116,33 @@ def logbook_view():
     lang = config.get("language", "es")
     t = get_translation(lang)
     
-    # Filtro por entry_type (ya lo tienes)
+    # Mismos filtros ?type= y ?source= que /api/entries, para que el scroll infinito no se desvíe
+    where_clauses, params = _entry_filters(request.args)
+
+    # Valores válidos para marcar el filtro activo en la plantilla
     entry_type = request.args.get("type", "").strip()
-    valid_types = {"log", "maintenance", "weather", "navigation", "fuel", "radio", "provision", "other", "experience"}
-    if entry_type not in valid_types:
+    if entry_type not in VALID_ENTRY_TYPES:
         entry_type = None
-
-    # Nuevo: filtro por origen (manual/automática)
     source_filter = request.args.get("source", "").strip()
-    valid_sources = {"manual", "auto"}  # 'auto' = todo lo que no es manual
-    if source_filter not in valid_sources:
+    if source_filter not in ("manual", "auto"):  # 'auto' = todo lo que no es manual
         source_filter = None
 
-    db_path = DATA_DIR / "logbook.db"
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-
-    # Construir query dinámica
-    where_clauses = []
-    params = []
-
-    if entry_type:
-        where_clauses.append("entry_type = ?")
-        params.append(entry_type)
-
-    if source_filter == "manual":
-        where_clauses.append("source IN ('manual', 'quick-note')")
-    elif source_filter == "auto":
-        where_clauses.append("source NOT IN ('manual', 'quick-note')")
-
     where = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
-    query = f"SELECT * FROM log_entries {where} ORDER BY timestamp_utc DESC LIMIT 50"
+    query = f"SELECT * FROM log_entries {where} ORDER BY timestamp_utc DESC, id DESC LIMIT 50"
 
-    c.execute(query, params)
-    entries = [dict(row) for row in c.fetchall()]
-    conn.close()
+    with connection() as conn:
+        entries = [dict(row) for row in conn.execute(query, params).fetchall()]
     
-    for entry in entries:
-        entry["text_html"] = render_markdown_safe(entry["text"])
+    attach_text_html(entries)
+    attach_media(entries)
     
+    # Cursor para que el scroll infinito siga justo después de la última entrada mostrada
+    next_cursor = encode_cursor(entries[-1]) if len(entries) == 50 else None
+
     return render_template(
         "logbook.html",
         entries=entries,
+        next_cursor=next_cursor,
         t=t,
         current_entry_type=entry_type,
         current_source=source_filter,
@@ -95,8 +153,36 @@ def logbook_view():
 def uploaded_file(filename):
     return send_from_directory(DATA_DIR / "uploads", filename)
 
+@app.route('/uploads/derived/<filename>')
+def derived_file(filename):
+    return send_from_directory(DATA_DIR / "uploads" / "derived", filename)
 
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cuaderno de Bitácora")
+    parser.add_argument("--dev", action="store_true",
+                        help="servidor de desarrollo de Flask con depurador y recarga automática (nunca en el barco)")
+    args = parser.parse_args(argv)
+    dev = args.dev or os.environ.get("BITACORA_DEV") == "1"
 
-if __name__ == "__main__":
     config = load_config()
-    app.run(host="0.0.0.0", port=config.get("port", 8384), debug=True)
+    if dev:
+        # Con el recargador, este módulo se ejecuta también en el proceso vigilante:
+        # los hilos de fondo solo en el proceso que sirve
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            start_background_workers()
+        app.run(host="0.0.0.0", port=config.get("port", 8384), debug=True)
+        return 0
+
+    start_background_workers()
+    serve(app, on_shutdown=stop_background_workers)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
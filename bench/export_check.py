@@ -0,0 +1,75 @@
+# bench/export_check.py
+#
+# Comprobación de los límites de fecha de /api/export: con to=YYYY-MM-DD se
+# exporta el día completo, incluida una entrada a las 23:59:59Z en punto, y
+# nada del día siguiente.
+#
+# Usa un HOME temporal, así que no toca la base de datos real.
+#     python -m bench.export_check
+# Sale con código 0 si todo va bien.
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+STAMPS = [
+    "2025-06-29T23:59:59Z",
+    "2025-06-30T00:00:00Z",
+    "2025-06-30T23:59:59Z",
+    "2025-06-30T23:59:59.500Z",
+    "2025-07-01T00:00:00Z",
+]
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def run_checks():
+    """Devuelve [(nombre, ok, detalle), ...]."""
+    # Importar aquí: core.config_manager fija DATA_DIR a partir de HOME al importarse
+    from core.database import init_db, transaction
+    from api.export_routes import export_bp
+    from flask import Flask
+
+    init_db()
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO log_entries (timestamp_utc, text, source, entry_type) VALUES (?, ?, 'manual', 'log')",
+            [(stamp, stamp) for stamp in STAMPS]
+        )
+    app = Flask(__name__)
+    app.register_blueprint(export_bp, url_prefix="/api")
+    client = app.test_client()
+
+    def exported(query):
+        response = client.get(f"/api/export?format=ndjson&{query}")
+        if response.status_code != 200:
+            return response.status_code
+        return [json.loads(line)["timestamp_utc"] for line in response.get_data(as_text=True).splitlines()]
+
+    results = []
+    got = exported("from=2025-06-30&to=2025-06-30")
+    results.append(("to=fecha incluye 23:59:59Z", sorted(got) == sorted(STAMPS[1:4]), f"{got}"))
+    got = exported("to=2025-06-30T23:59:59Z")
+    ok = "2025-06-30T23:59:59Z" in got and "2025-07-01T00:00:00Z" not in got
+    results.append(("to=hora es inclusivo", ok, f"{got}"))
+    got = exported("to=2025-02-30")
+    results.append(("to=fecha inválida → 400", got == 400, f"{got}"))
+    return results
+
+def main(argv=None):
+    home = tempfile.mkdtemp(prefix="bitacora-export-")
+    os.environ["HOME"] = home
+    try:
+        results = run_checks()
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    for name, ok, detail in results:
+        _log(f"{'✅' if ok else '❌'} {name}: {detail}")
+    print(json.dumps([{"check": n, "ok": ok, "detail": d} for n, ok, d in results], ensure_ascii=False, indent=2))
+    return 0 if all(ok for _, ok, _ in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+# bench/load.py
+#
+# Generador de carga de extremo a extremo: varios clientes a la vez creando
+# notas rápidas y entradas y leyendo el cuaderno, con latencias p50/p95/p99 y
+# peticiones por segundo para cada operación.
+#
+# Contra un cuaderno ya en marcha:
+#     python -m bench.load --url http://bitacora.local:8384 --concurrency 8 --duration 30
+# O montándolo todo (cuaderno en un HOME temporal con el servidor de
+# producción, apuntando a bench.signalk_sim con la latencia y fallos pedidos):
+#     python -m bench.load --spawn --sk-latency-ms 150 --sk-error-rate 0.05 --duration 30
+#
+# El informe (JSON) va a --output o a la salida estándar; el resumen, a stderr.
+
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_MIX = "quick_note=2,create_entry=1,list_entries=5,logbook_view=2"
+REQUEST_TIMEOUT = 60
+STARTUP_TIMEOUT = 30
+LOAD_PATHS = [
+    "navigation.position", "navigation.state", "navigation.speedOverGround",
+    "navigation.courseOverGroundTrue", "environment.wind.speedTrue", "environment.wind.angleTrueWater",
+]
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"operación desconocida: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+# --- Operaciones ---------------------------------------------------------------
+
+def _quick_note(session, base, rng, image):
+    return session.post(f"{base}/api/quick-note", json={"text": f"Carga {rng.randrange(10**6)}: sin novedad."},
+                        timeout=REQUEST_TIMEOUT)
+
+def _create_entry(session, base, rng, image):
+    files = {"media_file": ("carga.jpg", image, "image/jpeg")} if image else None
+    return session.post(f"{base}/api/entry", data={
+        "text": f"**Guardia** {rng.randrange(10**6)}\n\n- viento estable\n- mar llana",
+        "entry_type": rng.choice(("navigation", "weather", "log")),
+        "metadata": json.dumps({"sea_state": "slight"}),
+    }, files=files, timeout=REQUEST_TIMEOUT)
+
+def _list_entries(session, base, rng, image):
+    return session.get(f"{base}/api/entries?before=&limit=20", timeout=REQUEST_TIMEOUT)
+
+def _logbook_view(session, base, rng, image):
+    return session.get(f"{base}/", timeout=REQUEST_TIMEOUT)
+
+OPERATIONS = {
+    "quick_note": _quick_note,
+    "create_entry": _create_entry,
+    "list_entries": _list_entries,
+    "logbook_view": _logbook_view,
+}
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def _summary(latencies, errors, elapsed):
+    ms = sorted(v * 1000 for v in latencies)
+    return {
+        "requests": len(ms) + errors,
+        "ok": len(ms),
+        "errors": errors,
+        "throughput_rps": round(len(ms) / elapsed, 2) if elapsed else 0.0,
+        **{f"p{p}_ms": round(_percentile(ms, p), 2) if ms else None for p in (50, 95, 99)},
+        "max_ms": round(ms[-1], 2) if ms else None,
+    }
+
+def run_load(base, mix, concurrency, duration=None, total=None, image_kb=0, seed=None):
+    """Lanza concurrency clientes hasta agotar duration segundos o total peticiones."""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    image = (b"\xff\xd8\xff\xe0" + os.urandom(image_kb * 1024) + b"\xff\xd9") if image_kb else None
+    lock = threading.Lock()
+    latencies = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+    error_samples = []
+    issued = 0
+    deadline = time.monotonic() + duration if duration else None
+
+    def worker(index):
+        nonlocal issued
+        rng = random.Random(None if seed is None else seed + index)
+        session = requests.Session()
+        while True:
+            with lock:
+                if (total is not None and issued >= total) or (deadline and time.monotonic() >= deadline):
+                    return
+                issued += 1
+            name = rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                response = OPERATIONS[name](session, base, rng, image)
+                ok = response.status_code == 200
+                problem = None if ok else f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                ok, problem = False, str(e)
+            elapsed = time.perf_counter() - t0
+            with lock:
+                if ok:
+                    latencies[name].append(elapsed)
+                else:
+                    errors[name] += 1
+                    if len(error_samples) < 20:
+                        error_samples.append({"operation": name, "error": problem})
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    every = [v for values in latencies.values() for v in values]
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "concurrency": concurrency,
+        "mix": mix,
+        "operations": {n: _summary(latencies[n], errors[n], elapsed) for n in names},
+        "total": _summary(every, sum(errors.values()), elapsed),
+        "error_samples": error_samples,
+    }
+
+# --- Entorno completo (--spawn) ------------------------------------------------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _write_config(home, port, sk_url, token, paths):
+    data_dir = home / ".bitacora"
+    (data_dir / "uploads").mkdir(parents=True, exist_ok=True)
+    with open(REPO_DIR / "config" / "default_config.json", encoding="utf-8") as f:
+        config = json.load(f)
+    config.update({"setup_completed": True, "port": port})
+    config.setdefault("server", {})["host"] = "127.0.0.1"
+    config["signalk"].update({"enabled": True, "url": sk_url, "token": token, "selected_paths": paths})
+    config["track"]["enabled"] = False
+    (data_dir / "config.json").write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+def _wait_ready(base, proc):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"el cuaderno terminó al arrancar (código {proc.returncode})")
+        try:
+            if requests.get(f"{base}/api/signalk/outbox", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("el cuaderno no respondió a tiempo")
+
+def spawn_and_run(args, mix):
+    from bench.signalk_sim import Vessel, start_simulator
+
+    token = "bench-token"
+    faults = {
+        "latency_ms": args.sk_latency_ms, "jitter_ms": args.sk_jitter_ms,
+        "error_rate": args.sk_error_rate, "timeout_rate": args.sk_timeout_rate, "timeout_s": args.sk_timeout_s,
+        "stream": not args.sk_no_stream,
+    }
+    sim, sk_url = start_simulator(vessel=Vessel(36.1, -5.35, 6.0, args.seed), faults=faults, token=token)
+    home = Path(tempfile.mkdtemp(prefix="bitacora-load-"))
+    port = _free_port()
+    _write_config(home, port, sk_url, token, LOAD_PATHS)
+    base = f"http://127.0.0.1:{port}"
+    log_file = open(home / "app.log", "w", encoding="utf-8")
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=REPO_DIR, stdout=log_file, stderr=subprocess.STDOUT,
+                            env=dict(os.environ, HOME=str(home), PYTHONUNBUFFERED="1"))
+    try:
+        _wait_ready(base, proc)
+        _log(f"🚀 Cuaderno en {base}, Signal K simulado en {sk_url}")
+        report = run_load(base, mix, args.concurrency, args.duration, args.requests, args.image_kb, args.seed)
+        # Dar tiempo al outbox para vaciar la cola antes de medirla
+        time.sleep(args.drain_s)
+        report["outbox"] = requests.get(f"{base}/api/signalk/outbox", timeout=5).json()
+        report["signalk_sim"] = requests.get(f"{sk_url}/sim/stats", timeout=5).json()
+        if args.metrics:
+            Path(args.metrics).write_text(requests.get(f"{base}/metrics", timeout=5).text, encoding="utf-8")
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log_file.close()
+        sim.shutdown()
+        if args.keep:
+            _log(f"📁 Datos y log del cuaderno en {home}")
+        else:
+            shutil.rmtree(home, ignore_errors=True)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del cuaderno (latencias p50/p95/p99).")
+    parser.add_argument("--url", default="http://127.0.0.1:8384", help="cuaderno ya en marcha")
+    parser.add_argument("--spawn", action="store_true",
+                        help="arrancar un cuaderno temporal con Signal K simulado (ignora --url)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="segundos de carga")
+    parser.add_argument("--requests", type=int, help="parar tras este número de peticiones")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"peso de cada operación (por defecto {DEFAULT_MIX})")
+    parser.add_argument("--image-kb", type=int, default=0, help="adjuntar una foto de este tamaño en create_entry")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="fichero JSON del informe (por defecto, salida estándar)")
+    sim = parser.add_argument_group("Signal K simulado (con --spawn)")
+    sim.add_argument("--sk-latency-ms", type=float, default=20)
+    sim.add_argument("--sk-jitter-ms", type=float, default=10)
+    sim.add_argument("--sk-error-rate", type=float, default=0.0)
+    sim.add_argument("--sk-timeout-rate", type=float, default=0.0)
+    sim.add_argument("--sk-timeout-s", type=float, default=30)
+    sim.add_argument("--sk-no-stream", action="store_true",
+                     help="sin stream WebSocket: cada entrada lee Signal K por REST")
+    sim.add_argument("--drain-s", type=float, default=2, help="espera al outbox antes de cerrar")
+    sim.add_argument("--keep", action="store_true", help="no borrar el HOME temporal (datos y log)")
+    sim.add_argument("--metrics", help="guardar aquí el /metrics del cuaderno al terminar")
+    args = parser.parse_args(argv)
+    mix = args.mix if isinstance(args.mix, dict) else parse_mix(args.mix)
+    duration = None if args.requests else args.duration
+    args.duration = duration
+
+    if args.spawn:
+        report = spawn_and_run(args, mix)
+    else:
+        report = run_load(args.url.rstrip("/"), mix, args.concurrency, duration, args.requests,
+                          args.image_kb, args.seed)
+    report["created"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    for name, item in {**report["operations"], "TOTAL": report["total"]}.items():
+        flag = "✅" if not item["errors"] else "⚠️ "
+        _log(f"{flag} {name:<14} {item['ok']:>6} ok {item['errors']:>4} err {item['throughput_rps']:>8.1f} req/s  "
+             f"p50 {item['p50_ms']} ms  p95 {item['p95_ms']} ms  p99 {item['p99_ms']} ms")
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        _log(f"✅ Informe en {args.output}")
+    else:
+        print(text)
+    return 1 if report["total"]["ok"] == 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# bench/run.py
+#
+# Pruebas de rendimiento de los caminos críticos (BD y renderizado) sobre un
+# cuaderno sintético de 10k / 100k / 1M entradas generado en un directorio
+# temporal. Cada tamaño se mide en un proceso aparte (DATA_DIR se fija al
+# importar core) y las peticiones pasan por el cliente de pruebas de Flask.
+#
+# Uso:
+#     python -m bench.run                                  # 10k entradas
+#     python -m bench.run --sizes 10k,100k,1M --output bench/results.json
+#     python -m bench.run --baseline bench/baseline.json   # falla si algo empeora
+#     python -m bench.run --save-baseline bench/baseline.json
+#
+# El resultado (JSON) va a --output o a la salida estándar; el progreso y la
+# comparación con la línea base, a stderr. Con --baseline el código de salida
+# es 1 si alguna mediana empeora más de --tolerance. Las líneas base solo son
+# comparables en la misma máquina (p. ej. la Raspberry Pi de referencia).
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+DEFAULT_SIZES = "10k"
+DEFAULT_REPEAT = 20
+DEFAULT_TOLERANCE = 0.25      # +25 % sobre la mediana de la línea base
+NOISE_FLOOR_MS = 1.0          # diferencias menores no cuentan como regresión
+RESULTS_VERSION = 1
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def parse_size(value):
+    """'10k' -> 10000, '1M' -> 1000000."""
+    value = value.strip()
+    factor = {"k": 1_000, "m": 1_000_000}.get(value[-1:].lower(), 1)
+    number = value[:-1] if factor > 1 else value
+    return int(float(number) * factor)
+
+def _timings(samples):
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "n": len(ms),
+        "min_ms": round(ms[0], 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+def _measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return _timings(samples)
+
+# --- Proceso hijo: un tamaño ---------------------------------------------------
+
+def run_size(size, repeat, images, seed):
+    """Genera el cuaderno en $HOME/.bitacora y devuelve {benchmark: tiempos}."""
+    home = Path(os.environ["HOME"])
+    results = {}
+
+    from core.database import init_db, connection, close_all
+    t0 = time.perf_counter()
+    init_db()
+    results["init_db_empty"] = _timings([time.perf_counter() - t0])
+
+    from bench.synthetic import configure, generate
+    backups = home / "backups"
+    backups.mkdir(exist_ok=True)
+    configure(backups)
+    _log(f"🧪 Generando {size} entradas...")
+    t0 = time.perf_counter()
+    generate(size, images=images, seed=seed)
+    results["generate"] = _timings([time.perf_counter() - t0])
+
+    import app as appmod
+    from core.utils import render_markdown_safe, encode_cursor
+    from core.backup import get_backup_job
+    client = appmod.app.test_client()
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, f"{url}: {response.status_code}"
+        response.get_data()
+
+    with connection() as conn:
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM log_entries ORDER BY id LIMIT 50 OFFSET ?", (size // 2,)
+        )]
+        deep = max(size * 9 // 10 - 1, 0)
+        cursor = dict(conn.execute(
+            "SELECT timestamp_utc, id FROM log_entries ORDER BY timestamp_utc DESC, id DESC LIMIT 1 OFFSET ?",
+            (deep,)
+        ).fetchone())
+        texts = [row[0] for row in conn.execute("SELECT text FROM log_entries LIMIT 200")]
+
+    def init_db_populated():
+        close_all()
+        init_db()
+
+    def view_entry():
+        view_entry.i = (view_entry.i + 1) % len(ids)
+        get(f"/api/entry/{ids[view_entry.i]}/view")
+    view_entry.i = 0
+
+    def render():
+        for text in texts:
+            render_markdown_safe(text)
+
+    def backup():
+        response = client.post("/api/backup")
+        assert response.status_code == 202, response.get_data(as_text=True)
+        job = get_backup_job(response.get_json()["job_id"])
+        job.join()
+        assert job.status == "done", job.error
+        job.zip_path.unlink()
+
+    benchmarks = [
+        ("init_db", init_db_populated, repeat),
+        ("logbook_view", lambda: get("/"), repeat),
+        ("logbook_view_filtered", lambda: get("/?type=weather&source=manual"), repeat),
+        ("api_entries_first_page", lambda: get("/api/entries?before=&limit=20"), repeat),
+        ("api_entries_offset_deep", lambda: get(f"/api/entries?page={deep // 20 + 1}"), repeat),
+        ("api_entries_cursor_deep", lambda: get(f"/api/entries?before={encode_cursor(cursor)}&limit=20"), repeat),
+        ("view_entry", view_entry, repeat),
+        ("render_markdown_safe_x200", render, repeat),
+        ("create_backup", backup, max(3, repeat // 10)),
+    ]
+    for name, fn, n in benchmarks:
+        _log(f"⏱️  {size}: {name}")
+        results[name] = _measure(fn, n, warmup=1 if name != "view_entry" else len(ids))
+
+    with connection() as conn:
+        db_bytes = conn.execute(
+            "SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()"
+        ).fetchone()[0]
+    appmod.stop_background_workers()
+    return {"entries": size, "db_bytes": db_bytes, "benchmarks": results}
+
+# --- Proceso padre -------------------------------------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent.parent, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _run_child(size, args, workdir):
+    home = workdir / f"size_{size}"
+    home.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ, HOME=str(home), PYTHONDONTWRITEBYTECODE="1")
+    cmd = [sys.executable, "-m", "bench.run", "--child", str(size),
+           "--repeat", str(args.repeat), "--images", str(args.images), "--seed", str(args.seed)]
+    proc = subprocess.run(cmd, env=env, cwd=Path(__file__).resolve().parent.parent,
+                          stdout=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"la prueba de {size} entradas ha fallado (código {proc.returncode})")
+    # La última línea es el JSON; lo anterior son avisos de la aplicación
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def compare(results, baseline, tolerance):
+    """Lista de regresiones: medianas que empeoran más de tolerance (y más de NOISE_FLOOR_MS)."""
+    regressions = []
+    for size, current in results["sizes"].items():
+        base = baseline.get("sizes", {}).get(size)
+        if base is None:
+            continue
+        for name, timing in current["benchmarks"].items():
+            before = base["benchmarks"].get(name)
+            if before is None or name == "generate":
+                continue
+            now, then = timing["median_ms"], before["median_ms"]
+            change = (now - then) / then if then else 0.0
+            flag = "❌" if change > tolerance and now - then > NOISE_FLOOR_MS else "✅"
+            _log(f"{flag} {size:>8} {name:<28} {then:>10.2f} → {now:>10.2f} ms ({change:+.0%})")
+            if flag == "❌":
+                regressions.append({"size": size, "benchmark": name, "baseline_ms": then,
+                                    "median_ms": now, "change": round(change, 3)})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pruebas de rendimiento sobre un cuaderno sintético.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="entradas por cuaderno, p. ej. 10k,100k,1M")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="repeticiones por prueba")
+    parser.add_argument("--images", type=int, default=200, help="fotos como máximo por cuaderno")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichero JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--baseline", help="línea base con la que comparar")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="empeoramiento máximo de la mediana (0.25 = 25 %%)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="guardar estos resultados como línea base")
+    parser.add_argument("--workdir", help="directorio de trabajo (por defecto uno temporal que se borra)")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        result = run_size(args.child, args.repeat, args.images, args.seed)
+        print(json.dumps(result))
+        return 0
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bitacora-bench-"))
+    try:
+        results = {
+            "version": RESULTS_VERSION,
+            "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "commit": _git_commit(),
+            "machine": {
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "cpus": os.cpu_count(),
+            },
+            "repeat": args.repeat,
+            "sizes": {str(size): _run_child(size, args, workdir) for size in sizes},
+        }
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+        if results["regressions"]:
+            _log(f"❌ {len(results['regressions'])} regresiones respecto a {args.baseline}")
+            exit_code = 1
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        _log(f"✅ Resultados en {args.output}")
+    else:
+        print(text)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text + "\n", encoding="utf-8")
+        _log(f"✅ Línea base guardada en {args.save_baseline}")
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
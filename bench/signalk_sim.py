@@ -0,0 +1,498 @@
+# bench/signalk_sim.py
+#
+# Servidor Signal K de mentira para pruebas de carga sin barco.
+# Sirve lo que usa el cuaderno:
+#   - /signalk                                   descubrimiento
+#   - /signalk/v1/api/vessels/self[/<path>]      datos del barco (REST)
+#   - /signalk/v1/access/requests                solicitud de acceso y token
+#   - /signalk/v2/api/resources/notes[/<id>]     notas (POST, PUT, GET, DELETE)
+#   - /signalk/v1/stream                         stream de deltas (WebSocket)
+# El barco navega de verdad: la posición avanza con el rumbo y la velocidad,
+# y el viento y el rumbo varían poco a poco. Se puede añadir latencia,
+# errores HTTP y peticiones colgadas, también en caliente con POST /sim/faults.
+# El stream implementa lo justo de Signal K (mensaje hello, suscripción con
+# "period" y deltas) sobre el propio servidor de Werkzeug. Con
+# {"stream_paused": true} deja de enviar deltas sin cerrar la conexión (los
+# valores caducan en la caché del cuaderno), POST /sim/stream/drop corta las
+# conexiones abiertas (el cuaderno debe reconectar) y con {"stream": false}
+# no hay stream y el cuaderno lee solo por REST.
+#
+# Uso:
+#     python -m bench.signalk_sim --port 3000 --latency-ms 80 --jitter-ms 40 --error-rate 0.05
+#     curl http://localhost:3000/sim/stats
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import Flask, abort, jsonify, request
+
+MS_TO_KN = 1.943844
+EARTH_RADIUS_M = 6371000.0
+
+DEFAULT_FAULTS = {
+    "latency_ms": 0,          # retardo base de cada respuesta
+    "jitter_ms": 0,           # + retardo aleatorio uniforme entre 0 y jitter_ms
+    "error_rate": 0.0,        # fracción de peticiones que responden 503
+    "timeout_rate": 0.0,      # fracción de peticiones que se quedan colgadas timeout_s
+    "timeout_s": 30,
+    "approve_after_s": 1,     # las solicitudes de acceso se aprueban tras estos segundos
+    "deny_access": False,
+    "require_auth": True,     # exigir el token en la API y en las notas
+    "stream": True,           # servir /signalk/v1/stream
+    "stream_paused": False,   # mantener el stream abierto pero sin enviar deltas
+}
+
+def _now_iso():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+class Vessel:
+    """Barco simulado: avanza por estima cada vez que se consulta."""
+
+    def __init__(self, lat, lon, speed_kn, seed=None):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.lat = lat
+        self.lon = lon
+        self.sog = speed_kn / MS_TO_KN
+        self.cog = self._rng.uniform(0, 2 * math.pi)
+        self.tws = self._rng.uniform(4, 9)
+        self.twd = self._rng.uniform(0, 2 * math.pi)
+        self.state = "sailing" if speed_kn > 0 else "anchored"
+        self._last = time.monotonic()
+
+    def _advance(self):
+        now = time.monotonic()
+        dt = now - self._last
+        self._last = now
+        if dt <= 0:
+            return
+        distance = self.sog * dt
+        self.lat += math.degrees(distance * math.cos(self.cog) / EARTH_RADIUS_M)
+        self.lon += math.degrees(distance * math.sin(self.cog) / (EARTH_RADIUS_M * math.cos(math.radians(self.lat))))
+        # Paseo aleatorio suave del rumbo y del viento
+        step = math.sqrt(min(dt, 60))
+        self.cog = (self.cog + self._rng.gauss(0, 0.01) * step) % (2 * math.pi)
+        self.twd = (self.twd + self._rng.gauss(0, 0.02) * step) % (2 * math.pi)
+        self.tws = min(max(self.tws + self._rng.gauss(0, 0.05) * step, 0.5), 25)
+
+    def tree(self):
+        """vessels/self con la forma de Signal K (value + timestamp en cada hoja)."""
+        with self._lock:
+            self._advance()
+            stamp = _now_iso()
+            twa = (self.twd - self.cog + math.pi) % (2 * math.pi) - math.pi
+            stw = max(0.0, self.sog * (0.9 + 0.1 * math.sin(abs(twa))))
+
+            def leaf(value):
+                return {"value": value, "timestamp": stamp, "$source": "sim.0"}
+
+            return {
+                "uuid": "urn:mrn:signalk:uuid:00000000-0000-4000-8000-000000000000",
+                "name": "Simulado",
+                "navigation": {
+                    "position": leaf({"latitude": round(self.lat, 7), "longitude": round(self.lon, 7)}),
+                    "state": leaf(self.state),
+                    "speedOverGround": leaf(round(self.sog, 3)),
+                    "speedThroughWater": leaf(round(stw, 3)),
+                    "courseOverGroundTrue": leaf(round(self.cog, 4)),
+                    "headingTrue": leaf(round(self.cog, 4)),
+                },
+                "environment": {
+                    "wind": {
+                        "speedTrue": leaf(round(self.tws, 3)),
+                        "angleTrueWater": leaf(round(twa, 4)),
+                        "directionTrue": leaf(round(self.twd, 4)),
+                    },
+                    "outside": {"pressure": leaf(101325 + round(self._rng.gauss(0, 50)))},
+                    "depth": {"belowTransducer": leaf(round(self._rng.uniform(8, 40), 1))},
+                },
+            }
+
+# --- Stream WebSocket -----------------------------------------------------------
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_WS_TEXT, _WS_CLOSE, _WS_PING, _WS_PONG = 0x1, 0x8, 0x9, 0xA
+DEFAULT_STREAM_PERIOD_MS = 1000
+
+def _ws_frame(opcode, payload=b""):
+    """Trama del servidor (sin máscara, sin fragmentar)."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+def _ws_read_frame(rfile):
+    """(opcode, payload) de la siguiente trama del cliente, o (None, None) si se cerró."""
+    head = rfile.read(2)
+    if len(head) < 2:
+        return None, None
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", rfile.read(8))[0]
+    mask = rfile.read(4) if head[1] & 0x80 else b""
+    payload = rfile.read(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return head[0] & 0x0F, payload
+
+def _tree_value(tree, path):
+    node = tree
+    for part in path.split("."):
+        node = node.get(part) if isinstance(node, dict) else None
+    return node.get("value") if isinstance(node, dict) else None
+
+def _leaf_paths(node, prefix=""):
+    for key, child in node.items():
+        if isinstance(child, dict):
+            path = f"{prefix}{key}"
+            if "value" in child:
+                yield path
+            else:
+                yield from _leaf_paths(child, path + ".")
+
+class DeltaStream:
+    """/signalk/v1/stream: hello, suscripciones de vessels.self y deltas periódicos."""
+
+    def __init__(self, vessel, faults, tokens, stats, lock):
+        self.vessel = vessel
+        self.faults = faults
+        self.tokens = tokens
+        self.stats = stats
+        self.lock = lock
+        self._generation = 0
+
+    def drop(self):
+        """Cierra todas las conexiones abiertas (cada una lo nota en su próximo ciclo)."""
+        with self.lock:
+            self._generation += 1
+
+    def serve(self, handler):
+        """Atiende la conexión del handler de Werkzeug hasta que se cierre."""
+        if not self.faults["stream"]:
+            handler.send_error(404)
+            return
+        header = handler.headers.get("Authorization", "")
+        if self.faults["require_auth"] and (not header.startswith("Bearer ") or header[7:] not in self.tokens):
+            handler.send_error(401)
+            return
+        key = handler.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+        handler.send_response(101)
+        handler.send_header("Upgrade", "websocket")
+        handler.send_header("Connection", "Upgrade")
+        handler.send_header("Sec-WebSocket-Accept", accept)
+        handler.end_headers()
+
+        query = handler.path.partition("?")[2]
+        subscriptions = {}
+        if "subscribe=none" not in query:
+            subscriptions = dict.fromkeys(_leaf_paths(self.vessel.tree()), DEFAULT_STREAM_PERIOD_MS)
+        closed = threading.Event()
+        write_lock = threading.Lock()
+
+        def send(opcode, payload=b""):
+            with write_lock:
+                handler.wfile.write(_ws_frame(opcode, payload))
+                handler.wfile.flush()
+
+        def reader():
+            try:
+                while not closed.is_set():
+                    opcode, payload = _ws_read_frame(handler.rfile)
+                    if opcode is None or opcode == _WS_CLOSE:
+                        if opcode == _WS_CLOSE:
+                            send(_WS_CLOSE, payload[:2])
+                        break
+                    if opcode == _WS_PING:
+                        send(_WS_PONG, payload)
+                    elif opcode == _WS_TEXT:
+                        self._handle_message(payload, subscriptions)
+            except (OSError, ValueError):
+                pass
+            finally:
+                closed.set()
+
+        with self.lock:
+            generation = self._generation
+            self.stats["stream_connections"] += 1
+            self.stats["stream_open"] += 1
+        try:
+            send(_WS_TEXT, json.dumps({
+                "name": "bitacora-sim", "version": "0.1.0", "timestamp": _now_iso(),
+                "self": "vessels.urn:mrn:signalk:uuid:00000000-0000-4000-8000-000000000000",
+                "roles": ["master", "main"],
+            }).encode())
+            threading.Thread(target=reader, name="signalk-sim-ws", daemon=True).start()
+            while not closed.is_set():
+                period = min(subscriptions.values(), default=DEFAULT_STREAM_PERIOD_MS) / 1000
+                if closed.wait(max(period, 0.05)) or self._generation != generation:
+                    break
+                if self.faults["stream_paused"] or not subscriptions:
+                    continue
+                tree = self.vessel.tree()
+                values = [{"path": path, "value": _tree_value(tree, path)} for path in list(subscriptions)]
+                send(_WS_TEXT, json.dumps({"context": "vessels.self", "updates": [{
+                    "source": {"label": "sim"}, "timestamp": _now_iso(),
+                    "values": [v for v in values if v["value"] is not None],
+                }]}).encode())
+                with self.lock:
+                    self.stats["stream_deltas"] += 1
+        except OSError:
+            pass
+        finally:
+            if not closed.is_set():
+                try:
+                    send(_WS_CLOSE, struct.pack("!H", 1001))   # 1001: el servidor se va
+                except OSError:
+                    pass
+            closed.set()
+            try:
+                # Desbloquea al hilo lector, que sigue esperando en rfile
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            with self.lock:
+                self.stats["stream_open"] -= 1
+
+    @staticmethod
+    def _handle_message(payload, subscriptions):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if not isinstance(message, dict) or message.get("context", "vessels.self") != "vessels.self":
+            return
+        for item in message.get("subscribe") or []:
+            if item.get("path"):
+                subscriptions[item["path"]] = item.get("period", DEFAULT_STREAM_PERIOD_MS)
+        for item in message.get("unsubscribe") or []:
+            if item.get("path") == "*":
+                subscriptions.clear()
+            else:
+                subscriptions.pop(item.get("path"), None)
+
+def create_app(vessel, faults=None, token=None):
+    app = Flask(__name__)
+    app.config["faults"] = dict(DEFAULT_FAULTS, **(faults or {}))
+    tokens = {token} if token else set()
+    access_requests = {}
+    notes = {}
+    stats = {"requests": 0, "errors": 0, "timeouts": 0, "by_endpoint": {},
+             "stream_connections": 0, "stream_open": 0, "stream_deltas": 0}
+    state_lock = threading.Lock()
+    rng = random.Random()
+    # El handler de start_simulator desvía aquí las peticiones de WebSocket
+    app.signalk_stream = DeltaStream(vessel, app.config["faults"], tokens, stats, state_lock)
+
+    @app.before_request
+    def inject_faults():
+        if not request.path.startswith("/signalk"):
+            return None
+        f = app.config["faults"]
+        with state_lock:
+            stats["requests"] += 1
+            key = request.url_rule.rule if request.url_rule else request.path
+            stats["by_endpoint"][key] = stats["by_endpoint"].get(key, 0) + 1
+            roll = rng.random()
+            delay = (f["latency_ms"] + rng.uniform(0, f["jitter_ms"])) / 1000
+        if roll < f["timeout_rate"]:
+            with state_lock:
+                stats["timeouts"] += 1
+            time.sleep(f["timeout_s"])
+        elif delay > 0:
+            time.sleep(delay)
+        if f["timeout_rate"] <= roll < f["timeout_rate"] + f["error_rate"]:
+            with state_lock:
+                stats["errors"] += 1
+            return jsonify({"state": "FAILED", "statusCode": 503, "message": "fallo simulado"}), 503
+        return None
+
+    def check_auth():
+        if not app.config["faults"]["require_auth"]:
+            return
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Bearer ") or header[7:] not in tokens:
+            abort(401)
+
+    @app.route("/signalk")
+    def discovery():
+        host = request.host
+        return jsonify({
+            "endpoints": {"v1": {
+                "version": "1.7.0",
+                "signalk-http": f"http://{host}/signalk/v1/api/",
+                "signalk-ws": f"ws://{host}/signalk/v1/stream",
+            }},
+            "server": {"id": "bitacora-sim", "version": "0.1.0"},
+        })
+
+    @app.route("/signalk/v1/api/vessels/self")
+    @app.route("/signalk/v1/api/vessels/self/<path:path>")
+    def vessel_data(path=""):
+        check_auth()
+        node = vessel.tree()
+        for part in filter(None, path.split("/")):
+            if not isinstance(node, dict) or part not in node:
+                abort(404)
+            node = node[part]
+        return jsonify(node)
+
+    @app.route("/signalk/v1/access/requests", methods=["POST"])
+    def access_request():
+        data = request.get_json(silent=True) or {}
+        if not data.get("clientId"):
+            return jsonify({"state": "COMPLETED", "statusCode": 400, "message": "clientId obligatorio"}), 400
+        request_id = uuid.uuid4().hex
+        with state_lock:
+            access_requests[request_id] = {"created": time.monotonic(), "client_id": data["clientId"]}
+        href = f"/signalk/v1/requests/{request_id}"
+        return jsonify({"state": "PENDING", "requestId": request_id, "href": href}), 202
+
+    @app.route("/signalk/v1/requests/<request_id>")
+    def access_request_status(request_id):
+        f = app.config["faults"]
+        with state_lock:
+            item = access_requests.get(request_id)
+            if item is None:
+                abort(404)
+            if time.monotonic() - item["created"] < f["approve_after_s"]:
+                return jsonify({"state": "PENDING", "requestId": request_id})
+            if f["deny_access"]:
+                return jsonify({"state": "COMPLETED", "requestId": request_id, "statusCode": 200,
+                                "accessRequest": {"permission": "DENIED"}})
+            item.setdefault("token", uuid.uuid4().hex)
+            tokens.add(item["token"])
+        return jsonify({"state": "COMPLETED", "requestId": request_id, "statusCode": 200,
+                        "accessRequest": {"permission": "APPROVED", "token": item["token"]}})
+
+    @app.route("/signalk/v2/api/resources/notes", methods=["GET", "POST"])
+    def notes_collection():
+        check_auth()
+        if request.method == "GET":
+            with state_lock:
+                return jsonify(dict(notes))
+        note = request.get_json(silent=True)
+        if not isinstance(note, dict):
+            return jsonify({"state": "FAILED", "statusCode": 400, "message": "JSON no válido"}), 400
+        note_id = str(uuid.uuid4())
+        with state_lock:
+            notes[note_id] = note
+        return jsonify({"state": "COMPLETED", "statusCode": 201, "id": note_id}), 201
+
+    @app.route("/signalk/v2/api/resources/notes/<note_id>", methods=["GET", "PUT", "DELETE"])
+    def note_item(note_id):
+        check_auth()
+        with state_lock:
+            if request.method == "PUT":
+                note = request.get_json(silent=True)
+                if not isinstance(note, dict):
+                    return jsonify({"state": "FAILED", "statusCode": 400, "message": "JSON no válido"}), 400
+                notes[note_id] = note
+                return jsonify({"state": "COMPLETED", "statusCode": 200, "id": note_id})
+            if note_id not in notes:
+                abort(404)
+            if request.method == "DELETE":
+                del notes[note_id]
+                return jsonify({"state": "COMPLETED", "statusCode": 200})
+            return jsonify(notes[note_id])
+
+    @app.route("/sim/stats")
+    def sim_stats():
+        with state_lock:
+            return jsonify(dict(stats, notes=len(notes), faults=app.config["faults"]))
+
+    @app.route("/sim/faults", methods=["POST"])
+    def sim_faults():
+        """Cambia la latencia o los fallos en caliente: {"latency_ms": 200, "error_rate": 0.1}"""
+        changes = request.get_json(silent=True) or {}
+        unknown = set(changes) - set(DEFAULT_FAULTS)
+        if unknown:
+            return jsonify({"error": f"claves desconocidas: {sorted(unknown)}"}), 400
+        app.config["faults"].update(changes)
+        return jsonify(app.config["faults"])
+
+    @app.route("/sim/stream/drop", methods=["POST"])
+    def sim_stream_drop():
+        """Corta las conexiones del stream abiertas (para probar la reconexión)."""
+        app.signalk_stream.drop()
+        return jsonify({"dropped": True})
+
+    return app
+
+def start_simulator(host="127.0.0.1", port=0, vessel=None, faults=None, token=None):
+    """Arranca el simulador en un hilo. Devuelve (servidor, url); server.shutdown() lo para."""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass  # una línea por petición taparía el informe de carga
+
+        def run_wsgi(self):
+            # WSGI no permite WebSocket: el stream se atiende directamente sobre la conexión
+            if (self.path.partition("?")[0] == "/signalk/v1/stream"
+                    and self.headers.get("Upgrade", "").lower() == "websocket"):
+                self.close_connection = True
+                self.server.app.signalk_stream.serve(self)
+                return
+            super().run_wsgi()
+
+    app = create_app(vessel or Vessel(36.1, -5.35, 6.0), faults, token)
+    server = make_server(host, port, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="signalk-sim", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor Signal K simulado para pruebas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--lat", type=float, default=36.1)
+    parser.add_argument("--lon", type=float, default=-5.35)
+    parser.add_argument("--speed-kn", type=float, default=6.0, help="velocidad del barco (0 = fondeado)")
+    parser.add_argument("--token", help="token aceptado sin pasar por la solicitud de acceso")
+    parser.add_argument("--no-auth", action="store_true", help="no exigir token")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-s", type=float, default=30)
+    parser.add_argument("--approve-after", type=float, default=1, help="segundos hasta aprobar el acceso")
+    parser.add_argument("--deny", action="store_true", help="denegar las solicitudes de acceso")
+    parser.add_argument("--no-stream", action="store_true", help="sin stream WebSocket (el cuaderno lee por REST)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    faults = {
+        "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+        "error_rate": args.error_rate, "timeout_rate": args.timeout_rate, "timeout_s": args.timeout_s,
+        "approve_after_s": args.approve_after, "deny_access": args.deny, "require_auth": not args.no_auth,
+        "stream": not args.no_stream,
+    }
+    server, url = start_simulator(args.host, args.port, Vessel(args.lat, args.lon, args.speed_kn, args.seed),
+                                  faults, args.token)
+    print(f"⛵ Signal K simulado en {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# bench/stream_check.py
+#
+# Comprobación del suscriptor del stream de Signal K (core/signalk_stream.py)
+# contra el stream WebSocket de bench.signalk_sim, sin barco:
+#
+#   1. los deltas llegan a la caché (y coinciden con la posición del simulador)
+#   2. con el stream en pausa los valores caducan tras max_age y
+#      get_latest_data() vuelve a pedirlos por REST
+#   3. si el servidor corta la conexión, el suscriptor reconecta y la caché
+#      vuelve a llenarse
+#
+# Usa un HOME temporal, así que no toca la configuración real.
+#     python -m bench.stream_check [--max-age 2]
+# Sale con código 0 si todo va bien.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from bench.load import _write_config
+
+PATHS = ["navigation.position", "navigation.speedOverGround"]
+WAIT_TIMEOUT = 15
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def _wait_for(condition, timeout=WAIT_TIMEOUT, interval=0.1):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return False
+
+def run_checks(max_age):
+    """Devuelve [(nombre, ok, detalle), ...]."""
+    # Importar aquí: core.config_manager fija DATA_DIR a partir de HOME al importarse
+    from bench.signalk_sim import Vessel, start_simulator
+    from core import signalk_stream
+    from core.signalk_stream import cache, get_latest_data, start_subscriber, stop_subscriber
+
+    token = "stream-check"
+    sim, sk_url = start_simulator(vessel=Vessel(36.1, -5.35, 6.0, 1), token=token)
+    _write_config(Path(os.environ["HOME"]), 0, sk_url, token, PATHS)
+    # Reconexión rápida para no esperar al backoff por defecto
+    signalk_stream.RECONNECT_MIN = 0.2
+
+    def sim_stats():
+        return requests.get(f"{sk_url}/sim/stats", timeout=5).json()
+
+    def fresh(age=max_age):
+        return all(cache.get(path, age) is not None for path in PATHS)
+
+    results = []
+    subscriber = start_subscriber()
+    if subscriber is None:
+        sim.shutdown()
+        return [("websocket-client instalado", False, "pip install websocket-client")]
+    try:
+        ok = _wait_for(fresh)
+        detail = "sin deltas"
+        if ok:
+            lat, lon = cache.get("navigation.position")["value"].values()
+            rest = requests.get(f"{sk_url}/signalk/v1/api/vessels/self/navigation/position",
+                                headers={"Authorization": f"Bearer {token}"}, timeout=5).json()["value"]
+            ok = abs(lat - rest["latitude"]) < 0.01 and abs(lon - rest["longitude"]) < 0.01
+            detail = f"posición {lat:.5f}, {lon:.5f}; {sim_stats()['stream_deltas']} deltas"
+        results.append(("deltas en la caché", ok, detail))
+
+        requests.post(f"{sk_url}/sim/faults", json={"stream_paused": True}, timeout=5)
+        started = time.monotonic()
+        ok = _wait_for(lambda: not fresh(), timeout=max_age + 5)
+        elapsed = time.monotonic() - started
+        results.append(("caducan tras max_age", ok and elapsed >= max_age - 1.5, f"caducados a los {elapsed:.1f} s"))
+
+        before = sim_stats()["requests"]
+        data = get_latest_data(PATHS, max_age=max_age)
+        rest_calls = sim_stats()["requests"] - before
+        ok = rest_calls > 0 and isinstance(data.get("navigation.position"), list)
+        results.append(("caducados → REST", ok, f"{rest_calls} peticiones REST"))
+
+        requests.post(f"{sk_url}/sim/faults", json={"stream_paused": False}, timeout=5)
+        connections = sim_stats()["stream_connections"]
+        cache.clear()
+        requests.post(f"{sk_url}/sim/stream/drop", timeout=5)
+        ok = _wait_for(lambda: sim_stats()["stream_connections"] > connections and fresh())
+        results.append(("reconexión tras corte", ok, f"{sim_stats()['stream_connections']} conexiones"))
+    finally:
+        stop_subscriber()
+        sim.shutdown()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comprueba el suscriptor del stream de Signal K contra el simulador.")
+    parser.add_argument("--max-age", type=float, default=2, help="segundos de validez de la caché en la prueba")
+    args = parser.parse_args(argv)
+
+    home = tempfile.mkdtemp(prefix="bitacora-stream-")
+    os.environ["HOME"] = home
+    try:
+        results = run_checks(args.max_age)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    for name, ok, detail in results:
+        _log(f"{'✅' if ok else '❌'} {name}: {detail}")
+    print(json.dumps([{"check": n, "ok": ok, "detail": d} for n, ok, d in results], ensure_ascii=False, indent=2))
+    return 0 if all(ok for _, ok, _ in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# bench/synthetic.py
+#
+# Genera un ~/.bitacora sintético para las pruebas de rendimiento: entradas
+# con texto Markdown, metadatos de Signal K, posiciones a lo largo de una
+# derrota, estados de navegación e imágenes. Todo es determinista a partir
+# de la semilla, para que dos ejecuciones midan lo mismo.
+#
+# Importar este módulo solo después de apuntar HOME al directorio temporal
+# (core.config_manager fija DATA_DIR al importarse).
+
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from core.config_manager import DATA_DIR, load_config, save_config, ensure_data_dir
+from core.database import transaction
+from core.rendering import rendered_columns
+from core.utils import VALID_ENTRY_TYPES
+
+try:
+    from PIL import Image
+except ImportError:  # dependencia opcional
+    Image = None
+
+INSERT_CHUNK = 5000        # filas por transacción al generar
+DISTINCT_TEXTS = 2000      # textos distintos (se renderizan una vez cada uno)
+IMAGE_EVERY = 50           # una de cada N entradas lleva foto
+IMAGE_SIZE = (1600, 1200)
+
+_WORDS = (
+    "viento rolando al oeste mar de fondo rizada marejadilla foque mayor rizo "
+    "fondeo cadena 30 metros arena buen agarre motor revisado aceite filtro "
+    "gasoil tanque lleno guardia sin novedad tráfico mercante por babor "
+    "barómetro bajando chubascos visibilidad reducida canal 16 capitanía "
+    "amarre pantalán víveres agua fruta pan llegada salida virada trasluchada"
+).split()
+
+_STATES = ("sailing", "motoring", "anchored", "moored", "hove-to")
+
+def _markdown_text(rng):
+    """Texto de entrada con la mezcla habitual: párrafos, negritas, listas y algún enlace."""
+    def sentence(n):
+        words = rng.choices(_WORDS, k=n)
+        return " ".join(words).capitalize() + "."
+    parts = [sentence(rng.randint(6, 18))]
+    if rng.random() < 0.4:
+        parts.append(f"**{sentence(3)}** {sentence(rng.randint(4, 10))}")
+    if rng.random() < 0.3:
+        parts.append("\n".join(f"- {sentence(rng.randint(2, 6))}" for _ in range(rng.randint(2, 5))))
+    if rng.random() < 0.1:
+        parts.append(f"Parte: [AEMET](https://www.aemet.es/) — *{sentence(4)}*")
+    return "\n\n".join(parts)
+
+def _metadata(rng, t):
+    """Valores de Signal K como los guarda quick-note (SI, con o sin timestamp)."""
+    stamp = t.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    tws = rng.uniform(1, 16)
+    twa = rng.uniform(-math.pi, math.pi)
+    return json.dumps({
+        "environment.wind.angleTrueWater": {"value": round(twa, 4), "timestamp": stamp},
+        "environment.wind.speedTrue": {"value": round(tws, 2), "timestamp": stamp},
+        "navigation.speedThroughWater": round(max(0.0, tws * 0.45 * math.sin(abs(twa) / 1.3)), 2),
+        "navigation.courseOverGroundTrue": round(rng.uniform(0, 2 * math.pi), 4),
+        "environment.outside.pressure": round(rng.gauss(101300, 600)),
+        "sea_state": rng.choice(("calm", "slight", "moderate", "rough")),
+    })
+
+def _write_images(count, rng):
+    """Fotos JPEG de tamaño realista (ruido, que no se comprime) en uploads/."""
+    uploads = DATA_DIR / "uploads"
+    paths = []
+    for i in range(count):
+        name = f"bench_{i:05d}.jpg"
+        target = uploads / name
+        if Image is not None:
+            noise = Image.frombytes("L", IMAGE_SIZE, rng.randbytes(IMAGE_SIZE[0] * IMAGE_SIZE[1]))
+            noise.convert("RGB").save(target, "JPEG", quality=85)
+        else:
+            target.write_bytes(b"\xff\xd8\xff\xe0" + rng.randbytes(400 * 1024) + b"\xff\xd9")
+        paths.append(f"uploads/{name}")
+    return paths
+
+def configure(backup_path):
+    """Configuración mínima: setup hecho, sin Signal K, backup habilitado hacia backup_path."""
+    ensure_data_dir()
+    config = load_config()
+    config.setdefault("signalk", {})["enabled"] = False
+    config.update({
+        "setup_completed": True,
+        "backup_enabled": True,
+        "backup_path": str(backup_path),
+    })
+    save_config(config)
+
+def generate(size, images=200, seed=42):
+    """Inserta size entradas (y sus fotos) en la BD de DATA_DIR."""
+    rng = random.Random(seed)
+    texts = [_markdown_text(rng) for _ in range(DISTINCT_TEXTS)]
+    rendered = [rendered_columns(text) for text in texts]
+    media = _write_images(min(images, size // IMAGE_EVERY + 1), rng)
+
+    # Una entrada cada ~20 min hacia atrás desde ahora, navegando por el Mediterráneo
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(minutes=20 * size)
+    lat, lon = 36.0, -5.4
+    state = "moored"
+    types = sorted(VALID_ENTRY_TYPES)
+    rows = []
+
+    def flush():
+        with transaction() as conn:
+            conn.executemany("""
+                INSERT INTO log_entries (
+                    timestamp_utc, latitude, longitude, navigation_state, text,
+                    media_path, source, entry_type, signalK_resource_id, metadata,
+                    text_html, text_html_version
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?, ?)
+            """, rows)
+        rows.clear()
+
+    for i in range(size):
+        t = start + timedelta(minutes=20 * i, seconds=rng.randint(0, 600))
+        lat = min(max(lat + rng.uniform(-0.02, 0.03), 30.0), 44.0)
+        lon = min(max(lon + rng.uniform(-0.01, 0.04), -6.0), 36.0)
+        if rng.random() < 0.05:
+            state = rng.choice(_STATES)
+        k = rng.randrange(DISTINCT_TEXTS)
+        html, version = rendered[k]
+        has_position = rng.random() < 0.9
+        rows.append((
+            t.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            round(lat, 6) if has_position else None,
+            round(lon, 6) if has_position else None,
+            state if rng.random() < 0.3 else None,
+            texts[k],
+            media[i // IMAGE_EVERY] if i % IMAGE_EVERY == 0 and i // IMAGE_EVERY < len(media) else None,
+            rng.choice(("manual", "manual", "quick-note", "node-red", "auto")),
+            rng.choice(types),
+            _metadata(rng, t) if rng.random() < 0.8 else None,
+            html,
+            version,
+        ))
+        if len(rows) >= INSERT_CHUNK:
+            flush()
+    if rows:
+        flush()
@@ -0,0 +1,87 @@
+# bench/track_check.py
+#
+# Comprobación del volcado del grabador de track (core/track_recorder.py):
+# si la transacción falla (p. ej. "database is locked"), los puntos y el
+# resumen horario no se pierden y los escribe el siguiente volcado.
+#
+# Usa un HOME temporal, así que no toca la base de datos real.
+#     python -m bench.track_check
+# Sale con código 0 si todo va bien.
+
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+
+SETTINGS = {
+    "min_interval_s": 10,
+    "min_distance_m": 25,
+    "straight_interval_s": 60,
+    "max_interval_s": 900,
+    "heading_change_deg": 20,
+    "summary_min_distance_nm": 0.1,
+}
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def run_checks():
+    """Devuelve [(nombre, ok, detalle), ...]."""
+    # Importar aquí: core.config_manager fija DATA_DIR a partir de HOME al importarse
+    from core import track_recorder
+    from core.database import connection, init_db
+
+    init_db()
+    recorder = track_recorder.TrackRecorder()
+    start = 1_700_000_000
+    for i in range(10):
+        # Un punto por minuto hacia el norte, ~0,1 mn entre puntos
+        recorder.add_fix((start + 60 * i, 36.0 + 0.0017 * i, -5.35, 3.0, 0.0), SETTINGS)
+
+    def counts():
+        with connection() as conn:
+            points = conn.execute("SELECT COUNT(*) FROM track_points").fetchone()[0]
+            summaries = conn.execute("SELECT COUNT(*) FROM log_entries WHERE source = 'auto'").fetchone()[0]
+        return points, summaries
+
+    @contextmanager
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+        yield
+
+    results = []
+    real_transaction = track_recorder.transaction
+    track_recorder.transaction = locked
+    try:
+        written = recorder.flush(SETTINGS)
+    finally:
+        track_recorder.transaction = real_transaction
+    pending = (len(recorder._buffer), len(recorder._pending_summaries))
+    results.append(("fallo → pendientes", not written and pending == (10, 1) and counts() == (0, 0),
+                    f"{pending[0]} puntos y {pending[1]} resúmenes pendientes"))
+
+    recorder.add_fix((start + 600, 36.0 + 0.0017 * 10, -5.35, 3.0, 0.0), SETTINGS)
+    written = recorder.flush()
+    points, summaries = counts()
+    results.append(("siguiente volcado", written and (points, summaries) == (11, 1) and not recorder._buffer,
+                    f"{points} puntos y {summaries} resúmenes en la BD"))
+    return results
+
+def main(argv=None):
+    home = tempfile.mkdtemp(prefix="bitacora-track-")
+    os.environ["HOME"] = home
+    try:
+        results = run_checks()
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    for name, ok, detail in results:
+        _log(f"{'✅' if ok else '❌'} {name}: {detail}")
+    print(json.dumps([{"check": n, "ok": ok, "detail": d} for n, ok, d in results], ensure_ascii=False, indent=2))
+    return 0 if all(ok for _, ok, _ in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# core/backup.py
+#
+# Copias de seguridad en segundo plano.
+# La base de datos se copia con la API de backup de SQLite (por páginas, sin
+# bloquear a los escritores), así la copia es consistente aunque se esté
+# escribiendo. Las imágenes ya van comprimidas (JPEG/PNG/WebP) y se guardan
+# en el zip sin recomprimir. Cada copia es un "job" con id y progreso.
+
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+from .config_manager import DATA_DIR
+from .database import connection
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PAGES_PER_STEP = 256      # páginas copiadas por paso de sqlite3.backup
+BACKUP_STEP_SLEEP = 0.005        # pausa entre pasos para dejar paso a los escritores
+MAX_JOBS_KEPT = 20               # historial de jobs en memoria
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+class BackupJob(threading.Thread):
+    """Un backup completo: instantánea de la BD + config + imágenes en un zip."""
+
+    def __init__(self, backup_path):
+        super().__init__(name="backup", daemon=True)
+        self.job_id = secrets.token_hex(6)
+        self.backup_path = backup_path
+        self.zip_path = backup_path / f"logbook_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        self.status = "pending"
+        self.phase = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.bytes_total = 0
+        self.bytes_done = 0
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "phase": self.phase,
+            "progress": round(self.bytes_done / self.bytes_total, 3) if self.bytes_total else 0.0,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "file": str(self.zip_path) if self.status == "done" else None,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def run(self):
+        self.status = "running"
+        snapshot = self.backup_path / f".{self.job_id}.db.tmp"
+        partial = self.zip_path.with_name(self.zip_path.name + ".part")
+        try:
+            files = self._collect_files()
+            with connection() as conn:
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            db_bytes = page_size * page_count
+            # Instantánea + su copia al zip + resto de ficheros
+            self.bytes_total = 2 * db_bytes + sum(size for _, _, size, _ in files)
+
+            self.phase = "database"
+            self._snapshot_db(snapshot, page_size)
+
+            self.phase = "archive"
+            snapshot_size = snapshot.stat().st_size
+            self.bytes_total += snapshot_size - db_bytes
+            files.insert(0, (snapshot, "logbook.db", snapshot_size, zipfile.ZIP_DEFLATED))
+            with zipfile.ZipFile(partial, "w") as zf:
+                for path, arcname, size, compress_type in files:
+                    zf.write(path, arcname, compress_type=compress_type)
+                    self.bytes_done += size
+            # El zip solo aparece con su nombre final cuando está completo
+            os.replace(partial, self.zip_path)
+            self.status = "done"
+            logger.info("💾 Backup creado: %s", self.zip_path)
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.exception("❌ Error al crear backup")
+            partial.unlink(missing_ok=True)
+        finally:
+            snapshot.unlink(missing_ok=True)
+            self.phase = None
+            self.finished_at = time.time()
+
+    def _collect_files(self):
+        """(ruta, nombre en el zip, tamaño, compresión) de config e imágenes activas."""
+        files = []
+        config_file = DATA_DIR / "config.json"
+        if config_file.exists():
+            files.append((config_file, "config.json", config_file.stat().st_size, zipfile.ZIP_DEFLATED))
+        # Solo uploads/, no deleted/
+        uploads_dir = DATA_DIR / "uploads"
+        if uploads_dir.exists():
+            for img in sorted(uploads_dir.iterdir()):
+                if img.is_file():
+                    files.append((img, f"uploads/{img.name}", img.stat().st_size, zipfile.ZIP_STORED))
+        return files
+
+    def _snapshot_db(self, target, page_size):
+        base = self.bytes_done
+
+        def progress(status, remaining, total):
+            self.bytes_done = base + (total - remaining) * page_size
+
+        dest = sqlite3.connect(str(target))
+        try:
+            with connection() as conn:
+                conn.backup(dest, pages=BACKUP_PAGES_PER_STEP, progress=progress, sleep=BACKUP_STEP_SLEEP)
+        finally:
+            dest.close()
+
+def start_backup(backup_path):
+    """Lanza un backup en segundo plano. Si ya hay uno en marcha, devuelve ese."""
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.status in ("pending", "running"):
+                return job
+        job = BackupJob(backup_path)
+        _jobs[job.job_id] = job
+        # Olvidar los jobs terminados más antiguos
+        while len(_jobs) > MAX_JOBS_KEPT:
+            del _jobs[next(iter(_jobs))]
+        job.start()
+        return job
+
+def get_backup_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
@@ -0,0 +1,199 @@
+# core/bulk_import.py
+#
+# Importación masiva de entradas históricas (cuadernos en papel, hojas de cálculo).
+# Las filas llegan en streaming (NDJSON o CSV), se validan una a una y se
+# insertan con executemany en transacciones de BULK_CHUNK_SIZE filas.
+# Las entradas importadas no se publican en Signal K y su HTML se genera al
+# leerlas por primera vez (o con "python -m core.rendering").
+#
+# Columnas reconocidas: timestamp_utc (obligatoria), text (obligatoria),
+# entry_type, latitude, longitude, navigation_state, source, metadata (objeto
+# JSON). En CSV, cualquier otra columna con valor se guarda en metadata
+# (como número si lo parece).
+#
+# Las filas sin "source" reciben el origen del lote ("import" por defecto).
+# Solo "manual" y "quick-note" cuentan como entradas manuales (?source=manual),
+# así que un cuaderno en papel transcrito debería importarse con source=manual.
+
+import csv
+import json
+import re
+from datetime import datetime, timezone
+
+from .database import transaction
+from .utils import VALID_ENTRY_TYPES
+
+BULK_CHUNK_SIZE = 1000      # filas por transacción
+MAX_REPORTED_ERRORS = 500   # errores detallados en la respuesta (el total se cuenta siempre)
+DEFAULT_SOURCE = "import"
+
+IMPORT_COLUMNS = {
+    "timestamp_utc", "text", "entry_type", "latitude", "longitude",
+    "navigation_state", "source", "metadata",
+}
+
+_INSERT_SQL = """
+    INSERT INTO log_entries (
+        timestamp_utc, latitude, longitude, navigation_state, text,
+        media_path, source, entry_type, signalK_resource_id, metadata
+    ) VALUES (?, ?, ?, ?, ?, NULL, ?, ?, NULL, ?)
+"""
+
+def iter_ndjson(lines):
+    """(número de línea, objeto) por cada línea no vacía."""
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, ValueError(f"JSON no válido: {e}")
+
+_NUMBER_RE = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?")
+
+def _csv_value(value):
+    """Las celdas con aspecto numérico se guardan como número (y así entran en entry_metrics)."""
+    if _NUMBER_RE.fullmatch(value):
+        return float(value) if "." in value else int(value)
+    return value
+
+def iter_csv(lines):
+    """(número de línea, dict) por cada fila; la primera fila es la cabecera."""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        extra = {
+            k: _csv_value(v.strip()) for k, v in row.items()
+            if k not in IMPORT_COLUMNS and k is not None and v not in (None, "")
+        }
+        record = {k: v for k, v in row.items() if k in IMPORT_COLUMNS and v not in (None, "")}
+        if extra:
+            metadata = record.get("metadata") or "{}"
+            record["metadata"] = (metadata, extra)
+        yield reader.line_num, record
+
+def _timestamp(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("timestamp_utc obligatorio")
+    try:
+        dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"timestamp_utc no válido: {value!r}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # sin zona: se asume UTC
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _coordinate(value, name, limit):
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} no válida: {value!r}")
+    if not -limit <= number <= limit:
+        raise ValueError(f"{name} fuera de rango: {number}")
+    return number
+
+def _metadata(value):
+    extra = {}
+    if isinstance(value, tuple):  # CSV: (columna metadata, columnas extra)
+        value, extra = value
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value.strip() else {}
+        except ValueError:
+            raise ValueError("metadata no es JSON válido")
+    if value is None:
+        value = {}
+    if not isinstance(value, dict):
+        raise ValueError("metadata debe ser un objeto JSON")
+    value = {**value, **extra}
+    return json.dumps(value, ensure_ascii=False) if value else None
+
+def validate_row(record, default_source=DEFAULT_SOURCE):
+    """Convierte una fila importada en la tupla de _INSERT_SQL. Lanza ValueError si no es válida."""
+    if not isinstance(record, dict):
+        raise ValueError("cada fila debe ser un objeto")
+    text = record.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("text obligatorio")
+    entry_type = record.get("entry_type") or "log"
+    if entry_type not in VALID_ENTRY_TYPES:
+        raise ValueError(f"entry_type no válido: {entry_type!r}")
+    latitude = _coordinate(record.get("latitude"), "latitud", 90)
+    longitude = _coordinate(record.get("longitude"), "longitud", 180)
+    if (latitude is None) != (longitude is None):
+        raise ValueError("latitude y longitude van juntas")
+    navigation_state = record.get("navigation_state")
+    if navigation_state is not None and not isinstance(navigation_state, str):
+        raise ValueError("navigation_state debe ser texto")
+    source = record.get("source") or default_source
+    if not isinstance(source, str) or len(source) > 32:
+        raise ValueError("source no válido")
+    return (
+        _timestamp(record.get("timestamp_utc")),
+        latitude,
+        longitude,
+        navigation_state or None,
+        text.strip(),
+        source,
+        entry_type,
+        _metadata(record.get("metadata")),
+    )
+
+def import_entries(records, dry_run=False, chunk_size=BULK_CHUNK_SIZE, source=DEFAULT_SOURCE):
+    """Valida e inserta (line_no, record) por lotes. Devuelve el resumen con los errores por fila.
+
+    Si el fichero deja de ser UTF-8 a mitad, la lectura se detiene ahí: los lotes
+    ya confirmados se quedan y el error aparece en la línea siguiente a la última leída.
+    """
+    errors = []
+    error_count = received = inserted = 0
+    last_line = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        if batch and not dry_run:
+            with transaction() as conn:
+                conn.executemany(_INSERT_SQL, batch)
+            inserted += len(batch)
+        batch.clear()
+
+    def add_error(line_no, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line_no, "error": message})
+
+    records = iter(records)
+    while True:
+        try:
+            line_no, record = next(records)
+        except StopIteration:
+            break
+        except UnicodeDecodeError:
+            received += 1
+            add_error(last_line + 1, "El fichero debe estar en UTF-8; importación detenida en esta línea")
+            break
+        last_line = line_no
+        received += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append(validate_row(record, source))
+        except ValueError as e:
+            add_error(line_no, str(e))
+            continue
+        if len(batch) >= chunk_size:
+            flush()
+    flush()
+
+    return {
+        "dry_run": dry_run,
+        "received": received,
+        "valid": received - error_count,
+        "inserted": inserted,
+        "error_count": error_count,
+        "errors": errors,
+    }
@@ -1,39 +1,102 @@
 # core/config_manager.py (actualizado)
 
 import os
+import copy
 import json
+import logging
+import tempfile
+import threading
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 DATA_DIR = Path.home() / ".bitacora"
 CONFIG_PATH = DATA_DIR / "config.json"
 DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "config" / "default_config.json"
 
+# Caché en memoria de config.json, validada por (mtime, tamaño, inodo).
+# save_config() escribe con rename atómico, así que otro proceso que guarde
+# cambia el inodo y la caché de este proceso se invalida sola en el siguiente stat.
+_cache_lock = threading.RLock()
+_cached_config = None
+_cached_stamp = None
+_data_dir_ready = False
+
 def ensure_data_dir():
+    global _data_dir_ready
     DATA_DIR.mkdir(exist_ok=True)
     (DATA_DIR / "uploads").mkdir(exist_ok=True)
+    _data_dir_ready = True
+
+def _config_stamp():
+    """Huella barata del fichero de configuración (None si no existe)."""
+    try:
+        st = os.stat(CONFIG_PATH)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _write_atomic(path, data):
+    """Escribe JSON en un temporal del mismo directorio y lo renombra encima del destino."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
 def load_config():
-    ensure_data_dir()
-    if not CONFIG_PATH.exists():
-        with open(DEFAULT_CONFIG_PATH, "r", encoding="utf-8") as f:
-            default = json.load(f)
-        default["setup_completed"] = False  # clave para redirección
-        with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-            json.dump(default, f, indent=2, ensure_ascii=False)
-        print(f"✅ Configuración inicial creada: {CONFIG_PATH}")
-        return default
-    else:
+    """Devuelve una copia de la configuración, releyendo el disco solo si el fichero cambió."""
+    global _cached_config, _cached_stamp
+    if not _data_dir_ready:
+        ensure_data_dir()
+
+    stamp = _config_stamp()
+    with _cache_lock:
+        if stamp is not None and stamp == _cached_stamp and _cached_config is not None:
+            return copy.deepcopy(_cached_config)
+
+        if stamp is None:
+            ensure_data_dir()
+            with open(DEFAULT_CONFIG_PATH, "r", encoding="utf-8") as f:
+                default = json.load(f)
+            default["setup_completed"] = False  # clave para redirección
+            save_config(default)
+            logger.info("✅ Configuración inicial creada: %s", CONFIG_PATH)
+            return copy.deepcopy(default)
+
         with open(CONFIG_PATH, "r", encoding="utf-8") as f:
             config = json.load(f)
-            # Asegurar campo por compatibilidad
-            if "setup_completed" not in config:
-                config["setup_completed"] = False
-                save_config(config)
-            return config
+        # Asegurar campo por compatibilidad
+        if "setup_completed" not in config:
+            config["setup_completed"] = False
+            save_config(config)
+        else:
+            _cached_config = config
+            _cached_stamp = stamp
+        return copy.deepcopy(config)
 
 def save_config(config):
-    with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    """Guarda la configuración de forma atómica y actualiza la caché."""
+    global _cached_config, _cached_stamp
+    with _cache_lock:
+        _write_atomic(CONFIG_PATH, config)
+        _cached_config = copy.deepcopy(config)
+        _cached_stamp = _config_stamp()
+
+def invalidate_config_cache():
+    """Fuerza a que la próxima llamada a load_config() relea el disco."""
+    global _cached_config, _cached_stamp
+    with _cache_lock:
+        _cached_config = None
+        _cached_stamp = None
 
 def get_signalk_config():
     config = load_config()
@@ -43,5 +106,6 @@ def get_signalk_config():
         "url": sk.get("url", "").rstrip("/"),
         "token": sk.get("token", ""),
         "client_id": sk.get("client_id", ""),
-        "request_href": sk.get("request_href", "")
+        "request_href": sk.get("request_href", ""),
+        "selected_paths": sk.get("selected_paths") or ["navigation.position", "navigation.state"]
     }
@@ -1,17 +1,183 @@
 # core/database.py
 
 from pathlib import Path
+from contextlib import contextmanager
+import logging
+import os
+import queue
 import sqlite3
+import threading
+from time import perf_counter
 
 from .config_manager import DATA_DIR
+from .metrics import observe_sql
+
+logger = logging.getLogger(__name__)
 
 DB_PATH = DATA_DIR / "logbook.db"
 
-def init_db():
-    DATA_DIR.mkdir(exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
+# Ajustes de conexión (pensados para una Raspberry Pi con tarjeta SD)
+BUSY_TIMEOUT_MS = 5000            # esperar a otro escritor en vez de "database is locked"
+CACHE_SIZE_KIB = 8192             # caché de páginas por conexión (~8 MB)
+MMAP_SIZE = 64 * 1024 * 1024      # lecturas vía mmap hasta 64 MB
+POOL_SIZE = 8                     # conexiones ociosas que se conservan
+
+def _configure_connection(conn):
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA foreign_keys=ON")
+
+class TimedConnection(sqlite3.Connection):
+    """Conexión que mide cada sentencia para /metrics (ver core/metrics.py)."""
+
+    def execute(self, sql, parameters=()):
+        start = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_sql(sql, perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_sql(sql, perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            observe_sql(sql_script, perf_counter() - start)
+
+    def commit(self):
+        start = perf_counter()
+        try:
+            super().commit()
+        finally:
+            observe_sql("COMMIT", perf_counter() - start)
+
+    def rollback(self):
+        start = perf_counter()
+        try:
+            super().rollback()
+        finally:
+            observe_sql("ROLLBACK", perf_counter() - start)
+
+def open_connection(path=None):
+    """Abre una conexión nueva ya configurada (modo autocommit; las escrituras van en transaction())."""
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        factory=TimedConnection
+    )
+    _configure_connection(conn)
+    return conn
+
+class ConnectionPool:
+    """Pool sencillo de conexiones SQLite.
+
+    Cada hilo toma una conexión en exclusiva mientras la usa; si el mismo hilo
+    vuelve a pedir una (llamadas anidadas), recibe la que ya tiene.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _reset_after_fork(self):
+        # Las conexiones no se pueden compartir entre procesos
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _checkout(self):
+        if os.getpid() != self._pid:
+            self._reset_after_fork()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return open_connection(self.path)
+
+    def _checkin(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._checkin(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # Transacción anidada: la confirma la exterior
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool = ConnectionPool(DB_PATH)
+
+def connection():
+    """Context manager con una conexión del pool (lecturas)."""
+    return _pool.connection()
+
+def transaction():
+    """Context manager que abre BEGIN IMMEDIATE y hace commit/rollback al salir."""
+    return _pool.transaction()
+
+def close_all():
+    _pool.close_all()
+
+# --- Migraciones de esquema ---
+# Cada paso lleva la BD de la versión N-1 a la N; la versión aplicada se guarda
+# en PRAGMA user_version. Los pasos nuevos se añaden siempre al final de MIGRATIONS.
+
+# Versión mínima de SQLite para el esquema: columnas generadas (3.31) y
+# ALTER TABLE ... DROP COLUMN (3.35), ambas en la migración 11
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+def _migration_create_log_entries(conn):
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS log_entries (
             id INTEGER PRIMARY KEY,
             timestamp_utc TEXT NOT NULL,
@@ -26,5 +192,328 @@ def init_db():
             metadata TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+
+def _migration_is_manual(conn):
+    # Columna indexable equivalente a source IN ('manual', 'quick-note'),
+    # mantenida por triggers para que cualquier ruta de escritura la respete.
+    conn.execute("ALTER TABLE log_entries ADD COLUMN is_manual INTEGER")
+    conn.execute("UPDATE log_entries SET is_manual = (source IN ('manual', 'quick-note'))")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS log_entries_is_manual_ai
+        AFTER INSERT ON log_entries
+        BEGIN
+            UPDATE log_entries SET is_manual = (NEW.source IN ('manual', 'quick-note'))
+            WHERE id = NEW.id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS log_entries_is_manual_au
+        AFTER UPDATE OF source ON log_entries
+        BEGIN
+            UPDATE log_entries SET is_manual = (NEW.source IN ('manual', 'quick-note'))
+            WHERE id = NEW.id;
+        END
+    """)
+
+def _migration_indexes(conn):
+    # El rowid va implícito al final de cada índice, así que (…, timestamp_utc)
+    # también sirve para ordenar por (timestamp_utc, id).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_ts ON log_entries (timestamp_utc)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_type_ts ON log_entries (entry_type, timestamp_utc)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_source_ts ON log_entries (source, timestamp_utc)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_manual_ts ON log_entries (is_manual, timestamp_utc)")
+
+def _migration_text_html(conn):
+    # HTML de Markdown precalculado (ver core/rendering.py); se rellena de forma perezosa
+    conn.execute("ALTER TABLE log_entries ADD COLUMN text_html TEXT")
+    conn.execute("ALTER TABLE log_entries ADD COLUMN text_html_version TEXT")
+
+def _migration_signalk_outbox(conn):
+    # Cola persistente de sincronización con Signal K (ver core/signalk_outbox.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS signalk_outbox (
+            id INTEGER PRIMARY KEY,
+            action TEXT NOT NULL,
+            entry_id INTEGER,
+            resource_id TEXT,
+            version INTEGER NOT NULL DEFAULT 1,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL
+        )
+    """)
+    # Deduplicación: una sincronización pendiente por entrada y un borrado por nota
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_sync ON signalk_outbox (entry_id) WHERE action = 'sync'")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_delete ON signalk_outbox (resource_id) WHERE action = 'delete'")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON signalk_outbox (next_attempt_at)")
+
+def _migration_track_points(conn):
+    # Track automático compacto (ver core/track_recorder.py): época entera como
+    # clave (alias del rowid) y coordenadas en enteros escalados ×1e7.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS track_points (
+            t INTEGER PRIMARY KEY,
+            lat_e7 INTEGER NOT NULL,
+            lon_e7 INTEGER NOT NULL,
+            sog_cms INTEGER,
+            cog_cdeg INTEGER
+        )
+    """)
+
+# Texto buscable de metadata: todos los valores de tipo cadena del JSON
+_FTS_META_SQL = """(
+    SELECT group_concat(value, ' ')
+    FROM json_tree(CASE WHEN json_valid({col}) THEN {col} ELSE '{{}}' END)
+    WHERE type = 'text'
+)"""
+
+def _migration_fts(conn):
+    # Índice de texto completo sobre text + valores de metadata, mantenido por triggers
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS log_entries_fts USING fts5(
+            text, meta,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    # El texto pesa más que los metadatos en el ranking bm25
+    conn.execute("INSERT INTO log_entries_fts (log_entries_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0)')")
+    new_meta = _FTS_META_SQL.format(col="NEW.metadata")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS log_entries_fts_ai AFTER INSERT ON log_entries
+        BEGIN
+            INSERT INTO log_entries_fts (rowid, text, meta) VALUES (NEW.id, NEW.text, {new_meta});
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS log_entries_fts_ad AFTER DELETE ON log_entries
+        BEGIN
+            DELETE FROM log_entries_fts WHERE rowid = OLD.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS log_entries_fts_au AFTER UPDATE OF text, metadata ON log_entries
+        BEGIN
+            DELETE FROM log_entries_fts WHERE rowid = OLD.id;
+            INSERT INTO log_entries_fts (rowid, text, meta) VALUES (NEW.id, NEW.text, {new_meta});
+        END
+    """)
+    # Carga inicial de las entradas existentes
+    conn.execute(f"""
+        INSERT INTO log_entries_fts (rowid, text, meta)
+        SELECT id, text, {_FTS_META_SQL.format(col="metadata")} FROM log_entries
+    """)
+
+def _migration_rtree(conn):
+    # Índice espacial de las posiciones de las entradas (cajas degeneradas: un punto)
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS log_entries_rtree USING rtree(
+            id, min_lat, max_lat, min_lon, max_lon
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS log_entries_rtree_ai AFTER INSERT ON log_entries
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO log_entries_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS log_entries_rtree_ad AFTER DELETE ON log_entries
+        BEGIN
+            DELETE FROM log_entries_rtree WHERE id = OLD.id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS log_entries_rtree_au AFTER UPDATE OF latitude, longitude ON log_entries
+        BEGIN
+            DELETE FROM log_entries_rtree WHERE id = OLD.id;
+            INSERT INTO log_entries_rtree
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+    """)
+    conn.execute("""
+        INSERT INTO log_entries_rtree
+        SELECT id, latitude, latitude, longitude, longitude FROM log_entries
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    """)
+
+# Valores numéricos de metadata: números de primer nivel ("cloud_cover": 3) y
+# valores de Signal K guardados como {"value": 5.2, "timestamp": "..."}
+_METRICS_SELECT_SQL = """
+    SELECT {id}, key,
+           CASE WHEN type IN ('integer', 'real') THEN value ELSE json_extract(value, '$.value') END,
+           COALESCE(CASE WHEN type = 'object' THEN json_extract(value, '$.timestamp') END, {ts})
+    FROM {tables}json_each(CASE WHEN json_valid({col}) AND json_type({col}) = 'object' THEN {col} ELSE '{{}}' END)
+    WHERE type IN ('integer', 'real')
+       OR (type = 'object' AND json_type(value, '$.value') IN ('integer', 'real'))
+"""
+
+def _migration_entry_metrics(conn):
+    # Tabla tipada con los valores numéricos de metadata, indexada por (path, valor)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS entry_metrics (
+            entry_id INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            value_real REAL NOT NULL,
+            ts TEXT,
+            PRIMARY KEY (entry_id, path)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entry_metrics_path_value ON entry_metrics (path, value_real)")
+    new_select = _METRICS_SELECT_SQL.format(id="NEW.id", ts="NEW.timestamp_utc", col="NEW.metadata", tables="")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS entry_metrics_ai AFTER INSERT ON log_entries
+        BEGIN
+            INSERT OR REPLACE INTO entry_metrics (entry_id, path, value_real, ts) {new_select};
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS entry_metrics_ad AFTER DELETE ON log_entries
+        BEGIN
+            DELETE FROM entry_metrics WHERE entry_id = OLD.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS entry_metrics_au AFTER UPDATE OF metadata, timestamp_utc ON log_entries
+        BEGIN
+            DELETE FROM entry_metrics WHERE entry_id = OLD.id;
+            INSERT OR REPLACE INTO entry_metrics (entry_id, path, value_real, ts) {new_select};
+        END
+    """)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO entry_metrics (entry_id, path, value_real, ts)
+        {_METRICS_SELECT_SQL.format(id="e.id", ts="e.timestamp_utc", col="e.metadata", tables="log_entries e, ")}
+    """)
+
+def _migration_daily_rollups(conn):
+    # Resúmenes diarios (ver core/stats.py). Los triggers solo marcan como
+    # "sucios" los días afectados por cada cambio; se recalculan al consultarlos.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            day TEXT PRIMARY KEY,
+            distance_nm REAL NOT NULL DEFAULT 0,
+            track_points INTEGER NOT NULL DEFAULT 0,
+            entries INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_entry_types (
+            day TEXT NOT NULL,
+            entry_type TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (day, entry_type)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_nav_states (
+            day TEXT NOT NULL,
+            state TEXT NOT NULL,
+            seconds REAL NOT NULL,
+            PRIMARY KEY (day, state)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS stats_dirty_days (day TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    # Una entrada afecta a su día y a los contiguos: el estado de navegación
+    # dura hasta la siguiente entrada y la distancia se cuenta desde la anterior.
+    mark_entry = """
+        INSERT OR IGNORE INTO stats_dirty_days (day)
+        SELECT date({ts}, d) FROM (SELECT '-1 day' AS d UNION ALL SELECT '+0 days' UNION ALL SELECT '+1 day')
+        WHERE date({ts}, d) IS NOT NULL;
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS daily_rollups_entry_ai AFTER INSERT ON log_entries
+        BEGIN {mark_entry.format(ts="NEW.timestamp_utc")} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS daily_rollups_entry_ad AFTER DELETE ON log_entries
+        BEGIN {mark_entry.format(ts="OLD.timestamp_utc")} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS daily_rollups_entry_au
+        AFTER UPDATE OF timestamp_utc, entry_type, navigation_state, latitude, longitude ON log_entries
+        BEGIN {mark_entry.format(ts="OLD.timestamp_utc")} {mark_entry.format(ts="NEW.timestamp_utc")} END
+    """)
+    # Un punto de track cuenta en su día y, como origen del siguiente tramo, puede afectar al día siguiente
+    mark_point = """
+        INSERT OR IGNORE INTO stats_dirty_days (day)
+        VALUES (date({t}, 'unixepoch')), (date({t} + 3600, 'unixepoch'));
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS daily_rollups_track_ai AFTER INSERT ON track_points
+        BEGIN {mark_point.format(t="NEW.t")} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS daily_rollups_track_ad AFTER DELETE ON track_points
+        BEGIN {mark_point.format(t="OLD.t")} END
+    """)
+    # Los datos existentes se calculan en la primera consulta (o con python -m core.stats)
+    conn.execute("""
+        INSERT OR IGNORE INTO stats_dirty_days (day)
+        SELECT DISTINCT date(timestamp_utc) FROM log_entries WHERE date(timestamp_utc) IS NOT NULL
+        UNION SELECT DISTINCT date(t, 'unixepoch') FROM track_points
+    """)
+
+def _migration_is_manual_generated(conn):
+    # is_manual pasa de columna mantenida por triggers (migración 2), que
+    # reescribían cada fila insertada, a columna generada VIRTUAL: no ocupa
+    # espacio en la fila ni cuesta escrituras extra; solo el índice la guarda.
+    conn.execute("DROP TRIGGER IF EXISTS log_entries_is_manual_ai")
+    conn.execute("DROP TRIGGER IF EXISTS log_entries_is_manual_au")
+    conn.execute("DROP INDEX IF EXISTS idx_log_entries_manual_ts")
+    conn.execute("ALTER TABLE log_entries DROP COLUMN is_manual")
+    conn.execute("""
+        ALTER TABLE log_entries ADD COLUMN
+        is_manual INTEGER GENERATED ALWAYS AS (source IN ('manual', 'quick-note')) VIRTUAL
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_manual_ts ON log_entries (is_manual, timestamp_utc)")
+
+MIGRATIONS = [
+    _migration_create_log_entries,   # 1
+    _migration_is_manual,            # 2
+    _migration_indexes,              # 3
+    _migration_text_html,            # 4
+    _migration_signalk_outbox,       # 5
+    _migration_track_points,         # 6
+    _migration_fts,                  # 7
+    _migration_rtree,                # 8
+    _migration_entry_metrics,        # 9
+    _migration_daily_rollups,        # 10
+    _migration_is_manual_generated,  # 11
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def check_sqlite_version():
+    """Falla con un mensaje claro si la SQLite enlazada con Python es demasiado antigua."""
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        required = ".".join(map(str, MIN_SQLITE_VERSION))
+        raise RuntimeError(
+            f"SQLite {sqlite3.sqlite_version} es demasiado antigua: el esquema necesita SQLite {required} o posterior"
+        )
+
+def migrate():
+    """Aplica las migraciones pendientes. Devuelve la versión final del esquema."""
+    with transaction() as conn:
+        # Releer dentro de BEGIN IMMEDIATE: si otro proceso migró antes, no hay nada que hacer
+        current = get_schema_version(conn)
+        if current < SCHEMA_VERSION:
+            # Antes de tocar nada, para no dejar una migración a medias
+            check_sqlite_version()
+        for version in range(current + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[version - 1](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            logger.info("🗄️  Migración de esquema aplicada: v%s", version)
+    if current < SCHEMA_VERSION:
+        with connection() as conn:
+            conn.execute("PRAGMA optimize")
+    return max(current, SCHEMA_VERSION)
+
+def init_db():
+    """Crea el directorio de datos y deja el esquema al día. Se llama una vez al arrancar."""
+    DATA_DIR.mkdir(exist_ok=True)
+    migrate()
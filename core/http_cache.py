@@ -0,0 +1,73 @@
+# core/http_cache.py
+#
+# Cabeceras de caché HTTP para ficheros que no cambian.
+# Las subidas tienen nombre único (timestamp_aleatorio.ext) y nunca se
+# sobrescriben, así que el navegador puede guardarlas un año sin volver a
+# preguntar. Los estáticos se versionan con ?v=<hash del contenido> al generar
+# la URL con url_for(), de modo que un cambio en el fichero cambia la URL.
+# send_file ya responde 304 a If-None-Match y atiende peticiones Range.
+
+import hashlib
+import os
+import threading
+
+from flask import current_app, request
+from werkzeug.security import safe_join
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Endpoints de ficheros: sin consultar la configuración en check_setup
+FILE_ENDPOINTS = {"static", "uploaded_file", "derived_file"}
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+def static_version(filename):
+    """Hash corto del contenido de un estático, recalculado solo si cambian mtime o tamaño."""
+    path = safe_join(current_app.static_folder, filename)
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            key = (st.st_mtime_ns, st.st_size)
+            with _versions_lock:
+                cached = _versions.get(path)
+            if cached and cached[0] == key:
+                return cached[1]
+            version = hashlib.sha1(f.read()).hexdigest()[:10]
+    except OSError:
+        return None
+    with _versions_lock:
+        _versions[path] = (key, version)
+    return version
+
+def add_static_version(endpoint, values):
+    """url_defaults: añade ?v= a las URLs de estáticos generadas con url_for()."""
+    if endpoint == "static" and "filename" in values and "v" not in values:
+        version = static_version(values["filename"])
+        if version:
+            values["v"] = version
+
+def set_immutable(response):
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    response.cache_control.no_cache = None
+    return response
+
+def apply_cache_headers(response):
+    """after_request: caché larga para subidas y estáticos versionados (también en 304 y 206)."""
+    if response.status_code not in (200, 206, 304):
+        return response
+    endpoint = request.endpoint
+    if endpoint in ("uploaded_file", "derived_file"):
+        set_immutable(response)
+    elif endpoint == "static":
+        version = request.args.get("v")
+        if version and version == static_version(request.view_args.get("filename", "")):
+            set_immutable(response)
+        else:
+            # Sin versión (p. ej. sw.js): revalidar siempre con el ETag
+            response.cache_control.no_cache = True
+    return response
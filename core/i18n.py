@@ -1,16 +1,62 @@
 # core/i18n.py
 
+import os
 import json
+import threading
 from pathlib import Path
+from types import MappingProxyType
 
 SUPPORTED_LANGUAGES = {"es", "en", "fr", "zh", "ru", "ja"}
+DEFAULT_LANGUAGE = "es"
+LOCALES_DIR = Path(__file__).parent.parent / "locales"
 
-def get_translation(lang="es"):
-    """Carga el archivo de traducción para el idioma dado."""
-    if lang not in SUPPORTED_LANGUAGES:
-        lang = "es"  # fallback seguro
-    locale_file = Path(__file__).parent.parent / "locales" / f"{lang}.json"
+# Recarga en caliente de los catálogos (solo para desarrollo): BITACORA_I18N_RELOAD=1
+RELOAD_ON_CHANGE = os.environ.get("BITACORA_I18N_RELOAD", "").lower() in ("1", "true", "yes")
+
+_catalogs = {}
+_stamps = {}
+_lock = threading.Lock()
+
+def _locale_stamps():
+    stamps = {}
+    for lang in SUPPORTED_LANGUAGES:
+        try:
+            stamps[lang] = (LOCALES_DIR / f"{lang}.json").stat().st_mtime_ns
+        except FileNotFoundError:
+            stamps[lang] = None
+    return stamps
+
+def _read_locale(lang):
+    locale_file = LOCALES_DIR / f"{lang}.json"
     if not locale_file.exists():
-        locale_file = Path(__file__).parent.parent / "locales" / "es.json"
+        return {}
     with open(locale_file, "r", encoding="utf-8") as f:
         return json.load(f)
+
+def load_catalogs():
+    """Carga todos los catálogos en memoria, con las claves que falten resueltas desde es.json."""
+    global _catalogs, _stamps
+    stamps = _locale_stamps()
+    base = _read_locale(DEFAULT_LANGUAGE)
+    catalogs = {}
+    for lang in SUPPORTED_LANGUAGES:
+        merged = dict(base)
+        if lang != DEFAULT_LANGUAGE:
+            merged.update(_read_locale(lang))
+        catalogs[lang] = MappingProxyType(merged)
+    with _lock:
+        _catalogs = catalogs
+        _stamps = stamps
+    return catalogs
+
+def get_translation(lang="es"):
+    """Devuelve el catálogo (de solo lectura) para el idioma dado."""
+    if lang not in SUPPORTED_LANGUAGES:
+        lang = DEFAULT_LANGUAGE  # fallback seguro
+    catalogs = _catalogs
+    if not catalogs or (RELOAD_ON_CHANGE and _locale_stamps() != _stamps):
+        catalogs = load_catalogs()
+    return catalogs[lang]
+
+# Precarga al importar: las páginas no tocan el disco para traducir
+load_catalogs()
@@ -0,0 +1,223 @@
+# core/media.py
+#
+# Derivados de las imágenes subidas.
+# El móvil sube fotos de varios MB; en la lista del cuaderno basta con una
+# miniatura y en la vista de la entrada con un tamaño de pantalla. Tras cada
+# subida se generan en un pool de procesos (sin bloquear la petición) en
+# uploads/derived/, ya girados según EXIF, en JPEG y, si se puede, en WebP.
+# Mientras no existan, las plantillas siguen usando el original.
+#
+# Los derivados disponibles se guardan en un índice en memoria: se anotan al
+# generarse y el directorio solo se vuelve a listar si cambia su mtime (por
+# ejemplo, tras "python -m core.media" en otro proceso). Así pintar el
+# cuaderno no cuesta un stat() por imagen.
+#
+# Pillow es opcional: sin él no se generan derivados y todo funciona igual.
+#
+# Uso (regenerar los derivados de las imágenes existentes):
+#     python -m core.media [--force] [--workers N]
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # dependencia opcional
+    Image = None
+
+from .config_manager import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_DIR = DATA_DIR / "uploads"
+DERIVED_DIR = UPLOADS_DIR / "derived"
+DELETED_DIR = UPLOADS_DIR / "deleted"
+
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png"}
+DERIVATIVE_WIDTHS = (320, 1280)     # miniatura para la lista, tamaño pantalla para la vista
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+MEDIA_WORKERS = 2                   # procesos para los derivados de las subidas
+
+# WebP solo si el Pillow instalado lo soporta
+WEBP_ENABLED = Image is not None and features.check("webp")
+
+def _derivative_names(filename):
+    """Nombres de los derivados de un fichero: [(ancho, formato, nombre), ...]."""
+    stem = filename.rsplit(".", 1)[0]
+    formats = ("jpg", "webp") if WEBP_ENABLED else ("jpg",)
+    return [(width, fmt, f"{stem}_{width}.{fmt}") for width in DERIVATIVE_WIDTHS for fmt in formats]
+
+def _save_atomic(image, path, **options):
+    tmp = path.with_name(f".{path.name}.tmp")
+    image.save(tmp, **options)
+    os.replace(tmp, path)
+
+def _build_derivatives(src, force=False):
+    """Genera los derivados de src (se ejecuta en el pool de procesos). Devuelve los nombres escritos."""
+    names = _derivative_names(src.name)
+    if not force and all((DERIVED_DIR / name).exists() for _, _, name in names):
+        return []
+    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+    with Image.open(src) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "L"):
+            # PNG con transparencia: fondo blanco, JPEG no tiene canal alfa
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        written = []
+        for width in DERIVATIVE_WIDTHS:
+            resized = image.copy()
+            resized.thumbnail((width, width), Image.LANCZOS)
+            for _, fmt, name in (n for n in names if n[0] == width):
+                if fmt == "webp":
+                    _save_atomic(resized, DERIVED_DIR / name, format="WEBP", quality=WEBP_QUALITY, method=4)
+                else:
+                    _save_atomic(resized, DERIVED_DIR / name, format="JPEG",
+                                 quality=JPEG_QUALITY, optimize=True, progressive=True)
+                written.append(name)
+    return written
+
+# --- Índice de derivados -------------------------------------------------------
+
+_derived = set()
+_derived_mtime = None
+_derived_lock = threading.Lock()
+
+def _available_derivatives():
+    """Nombres de los derivados que existen; solo relista DERIVED_DIR si ha cambiado."""
+    global _derived, _derived_mtime
+    try:
+        mtime = DERIVED_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        return frozenset()
+    with _derived_lock:
+        if mtime != _derived_mtime:
+            _derived = {entry.name for entry in os.scandir(DERIVED_DIR)}
+            _derived_mtime = mtime
+        return frozenset(_derived)
+
+def _remember(names):
+    with _derived_lock:
+        _derived.update(names)
+
+def _forget(names):
+    with _derived_lock:
+        _derived.difference_update(names)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Nada de fork() desde un servidor con hilos: los hijos heredarían locks tomados
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=context)
+        return _pool
+
+def _report(future, media_path):
+    error = future.exception()
+    if error is not None:
+        logger.warning("⚠️  No se pudieron generar los derivados de %s: %s", media_path, error)
+    else:
+        _remember(future.result())
+
+def generate_derivatives(media_path):
+    """Encola la generación de derivados de una subida ("uploads/xxx.jpg"). No espera al resultado."""
+    if Image is None or not media_path:
+        return None
+    future = _get_pool().submit(_build_derivatives, DATA_DIR / media_path)
+    future.add_done_callback(lambda f: _report(f, media_path))
+    return future
+
+def media_variants(media_path, available=None):
+    """URLs del original y de los derivados que ya existen, para src/srcset en plantillas y API."""
+    if not media_path:
+        return None
+    if available is None:
+        available = _available_derivatives()
+    filename = media_path.rsplit("/", 1)[-1]
+    original = f"/{media_path}"
+    srcset = {"jpg": [], "webp": []}
+    smallest = {}
+    largest = None
+    for width, fmt, name in _derivative_names(filename):
+        if name in available:
+            srcset[fmt].append(f"/uploads/derived/{name} {width}w")
+            smallest.setdefault(fmt, f"/uploads/derived/{name}")
+            if fmt == "jpg":
+                largest = f"/uploads/derived/{name}"
+    return {
+        "original": original,
+        "thumb": smallest.get("jpg", original),
+        "thumb_webp": smallest.get("webp"),
+        "src": largest or original,
+        "srcset": ", ".join(srcset["jpg"]) or None,
+        "webp_srcset": ", ".join(srcset["webp"]) or None,
+    }
+
+def attach_media(entries):
+    """Añade entry["media"] (ver media_variants) a cada entrada."""
+    available = _available_derivatives()
+    for entry in entries:
+        entry["media"] = media_variants(entry.get("media_path"), available)
+    return entries
+
+def move_to_deleted(media_path):
+    """Mueve la imagen y sus derivados a uploads/deleted/."""
+    if not media_path:
+        return
+    src = DATA_DIR / media_path  # media_path es relativo: "uploads/imagen.jpg"
+    DELETED_DIR.mkdir(parents=True, exist_ok=True)
+    names = [name for _, _, name in _derivative_names(src.name)]
+    _forget(names)
+    paths = [src] + [DERIVED_DIR / name for name in names]
+    for path in paths:
+        if path.exists():
+            path.rename(DELETED_DIR / path.name)
+    logger.info("🖼️  Imagen movida a %s", DELETED_DIR / src.name)
+
+def backfill(force=False, workers=None):
+    """Genera los derivados que falten para todas las imágenes de uploads/. Devuelve cuántas procesó."""
+    if Image is None:
+        raise RuntimeError("Pillow no está instalado")
+    sources = [
+        path for path in sorted(UPLOADS_DIR.iterdir())
+        if path.is_file() and path.suffix.lstrip(".").lower() in IMAGE_EXTENSIONS
+    ] if UPLOADS_DIR.exists() else []
+    processed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_build_derivatives, path, force): path for path in sources}
+        for future, path in futures.items():
+            try:
+                if future.result():
+                    processed += 1
+            except Exception as e:
+                logger.warning("⚠️  %s: %s", path.name, e)
+    return processed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera miniaturas y tamaños de pantalla de las imágenes subidas.")
+    parser.add_argument("--force", action="store_true", help="regenerar también los derivados que ya existen")
+    parser.add_argument("--workers", type=int, default=None, help="procesos en paralelo (por defecto, uno por CPU)")
+    args = parser.parse_args(argv)
+
+    if Image is None:
+        print("❌ Pillow no está instalado (pip install Pillow)")
+        return 1
+    processed = backfill(force=args.force, workers=args.workers)
+    print(f"✅ Derivados generados para {processed} imágenes en {DERIVED_DIR}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# core/metrics.py
+#
+# Métricas internas en formato de texto de Prometheus (GET /metrics).
+# Contadores e histogramas propios, sin dependencias: cada observación es un
+# bisect y unas sumas bajo un lock, así que instrumentar cada petición y cada
+# sentencia SQL apenas cuesta unos microsegundos.
+#
+# Las etiquetas se pasan por posición, en el orden declarado:
+#     HTTP_REQUESTS.inc("logbook_view", "GET", "200")
+#     SQL_SECONDS.observe(0.0004, "select")
+
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+
+_registry = []
+_START_TIME = time.time()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, total in items:
+            lines.append(f"{self.name}{_label_text(self.labels, values)} {_number(total)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}    # etiquetas -> [conteos por cubeta (no acumulados) + [+Inf], suma]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((values, (list(counts), total)) for values, (counts, total) in self._series.items())
+        for values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, values)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, values)} {cumulative}")
+        return lines
+
+class Gauge:
+    """Valor calculado en el momento de servir /metrics (fn() devuelve un número o None)."""
+
+    def __init__(self, name, help_text, fn):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        _registry.append(self)
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            value = None
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_number(value)}"]
+
+def render_metrics():
+    """Todas las métricas registradas, en formato de texto de Prometheus 0.0.4."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# --- Métricas del cuaderno -----------------------------------------------------
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "bitacora_http_request_duration_seconds", "Tiempo de respuesta por endpoint.",
+    ("endpoint", "method"), HTTP_BUCKETS)
+HTTP_REQUESTS = Counter(
+    "bitacora_http_requests_total", "Peticiones HTTP por endpoint y código de estado.",
+    ("endpoint", "method", "status"))
+SQL_SECONDS = Histogram(
+    "bitacora_sql_duration_seconds", "Duración de execute() por tipo de sentencia (en SELECT, hasta la primera fila).",
+    ("statement",), SQL_BUCKETS)
+SIGNALK_REQUEST_SECONDS = Histogram(
+    "bitacora_signalk_request_duration_seconds", "Latencia de las llamadas a Signal K por path.",
+    ("path",), HTTP_BUCKETS)
+SIGNALK_ERRORS = Counter(
+    "bitacora_signalk_errors_total", "Llamadas a Signal K fallidas por path y motivo.",
+    ("path", "reason"))
+SIGNALK_PUBLISH = Counter(
+    "bitacora_signalk_publish_total", "Notas enviadas a Signal K por acción y resultado.",
+    ("action", "result"))
+UPLOADS = Counter("bitacora_uploads_total", "Ficheros recibidos por tipo.", ("kind",))
+UPLOAD_BYTES = Counter("bitacora_upload_bytes_total", "Bytes recibidos en subidas por tipo.", ("kind",))
+Gauge("bitacora_process_start_time_seconds", "Arranque del proceso (época Unix).", lambda: _START_TIME)
+
+# --- Ayudas para instrumentar --------------------------------------------------
+
+_SQL_STATEMENTS = {"select", "insert", "update", "delete", "replace", "with", "begin", "commit",
+                   "rollback", "pragma", "create", "drop", "alter"}
+
+_STATEMENT_RE = re.compile(r"\s*(\w+)")
+
+def observe_sql(sql, seconds):
+    match = _STATEMENT_RE.match(sql)
+    statement = match.group(1).lower() if match else "other"
+    SQL_SECONDS.observe(seconds, statement if statement in _SQL_STATEMENTS else "other")
+
+def record_upload(kind, size):
+    UPLOADS.inc(kind)
+    UPLOAD_BYTES.inc(kind, amount=size or 0)
+
+_REQUEST_START_KEY = "bitacora.metrics.start"
+
+def start_request_timer():
+    """before_request: marca el inicio de la petición."""
+    request.environ[_REQUEST_START_KEY] = time.perf_counter()
+
+def observe_request(response):
+    """after_request: latencia y código de estado por endpoint (las respuestas en streaming, hasta la cabecera)."""
+    start = request.environ.get(_REQUEST_START_KEY)
+    if start is not None:
+        endpoint = request.endpoint or "unmatched"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, request.method)
+        HTTP_REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    return response
@@ -0,0 +1,145 @@
+# core/polar.py
+#
+# Polar de rendimiento a partir de los valores de Signal K guardados con cada
+# entrada (tabla entry_metrics). Los valores se cargan por columnas en arrays
+# de NumPy y se agrupan por ángulo y velocidad del viento real sin bucles por
+# fila: para cada celda, número de muestras y percentiles de la velocidad
+# del barco. El resultado se guarda en memoria mientras no cambien los datos.
+#
+# NumPy es opcional: sin él, el análisis no está disponible.
+
+import math
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # dependencia opcional
+    np = None
+
+from .database import connection
+
+MS_TO_KN = 1.943844
+
+# Paths de Signal K (unidades SI: radianes y m/s)
+DEFAULT_POLAR_PATHS = {
+    "twa": "environment.wind.angleTrueWater",
+    "tws": "environment.wind.speedTrue",
+    "stw": "navigation.speedThroughWater",
+}
+DEFAULT_TWA_STEP = 10                                    # grados
+DEFAULT_TWS_BINS = (0, 4, 6, 8, 10, 12, 14, 16, 20, 25, 30, 40)  # nudos
+DEFAULT_PERCENTILES = (50, 90)
+MIN_SAMPLES = 3                                          # celdas con menos muestras no se devuelven
+
+_cache = {}
+_cache_lock = threading.Lock()
+CACHE_SIZE = 16
+
+def numpy_available():
+    return np is not None
+
+def _data_version(conn, paths):
+    """Clave de caché: última entrada, y número y suma de los valores de esos paths (cambian al editar o borrar)."""
+    latest = conn.execute("SELECT MAX(id) FROM log_entries").fetchone()[0]
+    placeholders = ",".join("?" * len(paths))
+    count, total = conn.execute(
+        f"SELECT COUNT(*), TOTAL(value_real) FROM entry_metrics WHERE path IN ({placeholders})", paths
+    ).fetchone()
+    return latest, count, total
+
+def _load_columns(conn, paths):
+    """Devuelve (twa, tws, stw) como arrays float64, solo de las entradas que tienen los tres valores."""
+    rows = conn.execute("""
+        SELECT MAX(CASE WHEN path = ? THEN value_real END),
+               MAX(CASE WHEN path = ? THEN value_real END),
+               MAX(CASE WHEN path = ? THEN value_real END)
+        FROM entry_metrics
+        WHERE path IN (?, ?, ?)
+        GROUP BY entry_id
+        HAVING COUNT(*) = 3
+    """, (*paths, *paths)).fetchall()
+    data = np.array(rows, dtype=np.float64).reshape(-1, 3)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+def _group_percentiles(cells, values, percentiles):
+    """Percentiles de values por celda (interpolación lineal), vectorizado: ordena una vez y calcula posiciones."""
+    order = np.lexsort((values, cells))
+    cells, values = cells[order], values[order]
+    unique, starts, counts = np.unique(cells, return_index=True, return_counts=True)
+    result = {}
+    for p in percentiles:
+        pos = starts + (counts - 1) * (p / 100.0)
+        lower = np.floor(pos).astype(np.int64)
+        upper = np.minimum(lower + 1, starts + counts - 1)
+        frac = pos - lower
+        result[p] = values[lower] * (1 - frac) + values[upper] * frac
+    result["max"] = values[starts + counts - 1]
+    return unique, counts, result
+
+def compute_polar(twa_rad, tws_ms, stw_ms, twa_step=DEFAULT_TWA_STEP, tws_bins=DEFAULT_TWS_BINS,
+                  percentiles=DEFAULT_PERCENTILES, min_samples=MIN_SAMPLES):
+    """Tabla polar a partir de arrays de TWA (rad), TWS (m/s) y velocidad del barco (m/s)."""
+    twa = np.abs(np.degrees(np.arctan2(np.sin(twa_rad), np.cos(twa_rad))))  # 0..180, babor = estribor
+    tws = tws_ms * MS_TO_KN
+    stw = stw_ms * MS_TO_KN
+    valid = np.isfinite(twa) & np.isfinite(tws) & np.isfinite(stw) & (stw >= 0)
+    twa, tws, stw = twa[valid], tws[valid], stw[valid]
+
+    edges = np.asarray(tws_bins, dtype=np.float64)
+    twa_bins = math.ceil(180 / twa_step)
+    twa_idx = np.minimum((twa // twa_step).astype(np.int64), twa_bins - 1)
+    tws_idx = np.searchsorted(edges, tws, side="right") - 1
+    inside = (tws_idx >= 0) & (tws_idx < len(edges) - 1)
+    cells = twa_idx[inside] * (len(edges) - 1) + tws_idx[inside]
+    cell_ids, counts, stats = _group_percentiles(cells, stw[inside], percentiles)
+
+    table = []
+    for i, (cell, count) in enumerate(zip(cell_ids.tolist(), counts.tolist())):
+        if count < min_samples:
+            continue
+        a, w = divmod(cell, len(edges) - 1)
+        row = {
+            "twa_from": a * twa_step,
+            "twa_to": min((a + 1) * twa_step, 180),
+            "tws_from_kn": float(edges[w]),
+            "tws_to_kn": float(edges[w + 1]),
+            "samples": count,
+            "stw_max_kn": round(float(stats["max"][i]), 2),
+        }
+        for p in percentiles:
+            row[f"stw_p{p:g}_kn"] = round(float(stats[p][i]), 2)
+        table.append(row)
+
+    return {
+        "samples": int(valid.sum()),
+        "binned": int(inside.sum()),
+        "twa_step": twa_step,
+        "tws_bins_kn": [float(e) for e in edges],
+        "percentiles": list(percentiles),
+        "cells": table,
+    }
+
+def get_polar(paths=None, twa_step=DEFAULT_TWA_STEP, tws_bins=DEFAULT_TWS_BINS,
+              percentiles=DEFAULT_PERCENTILES, min_samples=MIN_SAMPLES):
+    """Polar del cuaderno, cacheada por versión de los datos (última entrada) y parámetros."""
+    if np is None:
+        raise RuntimeError("NumPy no está instalado")
+    paths = dict(DEFAULT_POLAR_PATHS, **(paths or {}))
+    path_list = (paths["twa"], paths["tws"], paths["stw"])
+    params = (path_list, twa_step, tuple(tws_bins), tuple(percentiles), min_samples)
+
+    with connection() as conn:
+        key = (_data_version(conn, path_list), params)
+        with _cache_lock:
+            cached = _cache.get(key)
+        if cached is not None:
+            return cached
+        twa, tws, stw = _load_columns(conn, path_list)
+
+    result = compute_polar(twa, tws, stw, twa_step, tws_bins, percentiles, min_samples)
+    result["paths"] = paths
+    with _cache_lock:
+        if len(_cache) >= CACHE_SIZE:
+            _cache.pop(next(iter(_cache)))
+        _cache[key] = result
+    return result
@@ -0,0 +1,258 @@
+# core/profiling.py
+#
+# Perfilado opcional de peticiones, para ver en qué se va el tiempo cuando la
+# Raspberry va lenta. Desactivado por defecto; se enciende en config.json
+# ("profiling") o en caliente con PUT /api/profiling.
+#
+#   - sample_rate: fracción de peticiones que se perfilan con cProfile (.pstats)
+#   - slow_ms: un muestreador de pilas sigue a todas las peticiones y guarda las
+#     que superan este tiempo como pilas plegadas (.collapsed, el formato de
+#     flamegraph.pl y speedscope). Coste bajo: una muestra cada sample_interval_ms.
+#
+# Los ficheros van a ~/.bitacora/profiles y solo se conservan los últimos
+# max_profiles perfiles. cProfile perfila de uno en uno (en Python 3.12+ el
+# perfilador es global al proceso); si ya hay uno en marcha, la petición solo
+# se muestrea.
+
+import cProfile
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from .config_manager import DATA_DIR, load_config, save_config
+
+logger = logging.getLogger(__name__)
+
+PROFILES_DIR = DATA_DIR / "profiles"
+PROFILE_SUFFIXES = (".pstats", ".collapsed")
+
+DEFAULT_PROFILING_CONFIG = {
+    "enabled": False,
+    "sample_rate": 0.0,           # 0.01 = una de cada cien peticiones con cProfile
+    "slow_ms": 2000,              # 0 = no guardar peticiones lentas
+    "sample_interval_ms": 5,      # periodo del muestreador de pilas
+    "max_profiles": 50,           # perfiles conservados (los más antiguos se borran)
+}
+
+# Rutas que nunca se perfilan: ficheros, métricas y la propia API de perfiles
+SKIPPED_PREFIXES = ("/static/", "/uploads/", "/metrics", "/api/profiling")
+
+_settings = None
+_settings_lock = threading.Lock()
+_cprofile_lock = threading.Lock()
+
+def get_profiling_config():
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                settings = dict(DEFAULT_PROFILING_CONFIG)
+                settings.update(load_config().get("profiling", {}))
+                _settings = settings
+    return dict(_settings)
+
+def update_profiling_config(changes):
+    """Aplica cambios en caliente y los guarda en config.json. Lanza ValueError si no son válidos."""
+    global _settings
+    unknown = set(changes) - set(DEFAULT_PROFILING_CONFIG)
+    if unknown:
+        raise ValueError(f"claves desconocidas: {', '.join(sorted(unknown))}")
+    settings = get_profiling_config()
+    try:
+        if "enabled" in changes:
+            settings["enabled"] = bool(changes["enabled"])
+        if "sample_rate" in changes:
+            settings["sample_rate"] = float(changes["sample_rate"])
+        for key in ("slow_ms", "sample_interval_ms", "max_profiles"):
+            if key in changes:
+                settings[key] = int(changes[key])
+    except (TypeError, ValueError):
+        raise ValueError("sample_rate debe ser un número y slow_ms, sample_interval_ms y max_profiles enteros")
+    if not 0 <= settings["sample_rate"] <= 1:
+        raise ValueError("sample_rate debe estar entre 0 y 1")
+    if settings["slow_ms"] < 0 or settings["sample_interval_ms"] < 1 or settings["max_profiles"] < 1:
+        raise ValueError("slow_ms >= 0, sample_interval_ms >= 1 y max_profiles >= 1")
+
+    with _settings_lock:
+        _settings = settings
+    config = load_config()
+    config["profiling"] = settings
+    save_config(config)
+    return dict(settings)
+
+# --- Muestreador de pilas ------------------------------------------------------
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}"
+
+class StackSampler(threading.Thread):
+    """Hilo que cada interval segundos anota la pila de los hilos registrados."""
+
+    def __init__(self, interval):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.interval = interval
+        self._threads = {}        # ident -> Counter de pilas plegadas
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+
+    def watch(self, ident):
+        with self._lock:
+            self._threads[ident] = Counter()
+            if not self._running:
+                self._running = True
+                self.start()
+        self._wake.set()
+
+    def release(self, ident):
+        """Deja de seguir al hilo y devuelve sus muestras."""
+        with self._lock:
+            return self._threads.pop(ident, Counter())
+
+    def run(self):
+        while True:
+            with self._lock:
+                idle = not self._threads
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._threads.items():
+                    frame = frames.get(ident)
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if labels:
+                        stacks[";".join(reversed(labels))] += 1
+            del frames
+            time.sleep(self.interval)
+
+_sampler = StackSampler(DEFAULT_PROFILING_CONFIG["sample_interval_ms"] / 1000)
+
+# --- Ficheros ------------------------------------------------------------------
+
+_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+def _profile_stem(environ, elapsed_ms, trigger):
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    path = _NAME_RE.sub("_", environ.get("PATH_INFO", "/").strip("/")) or "root"
+    return f"{stamp}_{trigger}_{environ.get('REQUEST_METHOD', 'GET')}_{path[:60]}_{int(elapsed_ms)}ms"
+
+def _prune(max_profiles):
+    stems = sorted({p.stem for p in PROFILES_DIR.iterdir() if p.suffix in PROFILE_SUFFIXES})
+    for stem in stems[:-max_profiles] if len(stems) > max_profiles else []:
+        for suffix in PROFILE_SUFFIXES:
+            (PROFILES_DIR / f"{stem}{suffix}").unlink(missing_ok=True)
+
+def _save(environ, elapsed_ms, trigger, profiler, stacks, max_profiles):
+    try:
+        PROFILES_DIR.mkdir(exist_ok=True)
+        stem = _profile_stem(environ, elapsed_ms, trigger)
+        if profiler is not None:
+            profiler.dump_stats(PROFILES_DIR / f"{stem}.pstats")
+        if stacks:
+            with open(PROFILES_DIR / f"{stem}.collapsed", "w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        _prune(max_profiles)
+    except OSError as e:
+        logger.warning("⚠️  No se pudo guardar el perfil: %s", e)
+
+def list_profiles():
+    """Perfiles guardados, del más reciente al más antiguo."""
+    if not PROFILES_DIR.exists():
+        return []
+    profiles = {}
+    for path in PROFILES_DIR.iterdir():
+        if path.suffix not in PROFILE_SUFFIXES:
+            continue
+        item = profiles.setdefault(path.stem, {"name": path.stem, "files": [], "bytes": 0})
+        item["files"].append(path.name)
+        item["bytes"] += path.stat().st_size
+    return [dict(item, files=sorted(item["files"])) for _, item in sorted(profiles.items(), reverse=True)]
+
+def clear_profiles():
+    removed = 0
+    for item in list_profiles():
+        for name in item["files"]:
+            (PROFILES_DIR / name).unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+# --- Middleware ----------------------------------------------------------------
+
+class _ProfiledResponse:
+    """Iterable de respuesta que termina el perfil al cerrarse (incluye el envío en streaming)."""
+
+    def __init__(self, iterable, finish):
+        self._iterable = iterable
+        self._finish = finish
+
+    def __iter__(self):
+        try:
+            yield from self._iterable
+        finally:
+            self._finish()
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, "close"):
+                self._iterable.close()
+        finally:
+            self._finish()
+
+class ProfilingMiddleware:
+    """Middleware WSGI: app.wsgi_app = ProfilingMiddleware(app.wsgi_app)."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        settings = get_profiling_config()
+        if not settings["enabled"] or environ.get("PATH_INFO", "").startswith(SKIPPED_PREFIXES):
+            return self.wsgi_app(environ, start_response)
+
+        profiler = None
+        if random.random() < settings["sample_rate"] and _cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        watching = bool(settings["slow_ms"])
+        ident = threading.get_ident()
+        if watching:
+            _sampler.interval = settings["sample_interval_ms"] / 1000
+            _sampler.watch(ident)
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            if profiler is not None:
+                profiler.disable()
+                _cprofile_lock.release()
+            stacks = _sampler.release(ident) if watching else None
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            slow = watching and elapsed_ms >= settings["slow_ms"]
+            if profiler is not None or slow:
+                _save(environ, elapsed_ms, "slow" if slow else "sample", profiler,
+                      stacks if stacks else None, settings["max_profiles"])
+
+        try:
+            return _ProfiledResponse(self.wsgi_app(environ, start_response), finish)
+        except BaseException:
+            finish()
+            raise
@@ -0,0 +1,127 @@
+# core/rendering.py
+#
+# HTML de las entradas precalculado: se renderiza al escribir y se guarda en
+# log_entries.text_html junto con la versión del renderizador. Las filas
+# antiguas (o renderizadas con otra configuración) se regeneran al leerlas.
+#
+# Re-render masivo:  python -m core.rendering [--all] [--workers N]
+
+import sys
+import hashlib
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import markdown
+import bleach
+
+from .utils import render_markdown_safe, MARKDOWN_EXTENSIONS, ALLOWED_TAGS, ALLOWED_ATTRS
+
+logger = logging.getLogger(__name__)
+
+def _renderer_version():
+    signature = repr((
+        MARKDOWN_EXTENSIONS,
+        sorted(ALLOWED_TAGS),
+        sorted(ALLOWED_ATTRS.items()),
+        markdown.__version__,
+        bleach.__version__,
+    ))
+    return hashlib.sha1(signature.encode("utf-8")).hexdigest()[:12]
+
+RENDERER_VERSION = _renderer_version()
+
+# LRU acotada para textos sin HTML guardado, indexada por hash del texto
+RENDER_CACHE_SIZE = 512
+_render_cache = OrderedDict()
+_render_lock = threading.Lock()
+
+def render_markdown_cached(text):
+    """render_markdown_safe() con memoria de los últimos textos renderizados."""
+    if not text:
+        return ""
+    key = hashlib.sha1(text.encode("utf-8")).digest()
+    with _render_lock:
+        html = _render_cache.get(key)
+        if html is not None:
+            _render_cache.move_to_end(key)
+            return html
+    html = render_markdown_safe(text)
+    with _render_lock:
+        _render_cache[key] = html
+        if len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return html
+
+def rendered_columns(text):
+    """Valores de (text_html, text_html_version) para INSERT/UPDATE."""
+    return render_markdown_safe(text), RENDERER_VERSION
+
+def attach_text_html(entries):
+    """Rellena entry["text_html"] usando el HTML guardado cuando está al día.
+
+    Las entradas sin HTML o con una versión anterior se renderizan (vía LRU) y
+    se guardan en la BD para que la próxima lectura ya no tenga que hacerlo.
+    """
+    stale = []
+    for entry in entries:
+        if entry.get("text_html_version") == RENDERER_VERSION and entry.get("text_html") is not None:
+            continue
+        entry["text_html"] = render_markdown_cached(entry.get("text"))
+        entry["text_html_version"] = RENDERER_VERSION
+        if entry.get("id") is not None:
+            stale.append((entry["text_html"], RENDERER_VERSION, entry["id"]))
+
+    if stale:
+        from .database import transaction
+        try:
+            with transaction() as conn:
+                conn.executemany(
+                    "UPDATE log_entries SET text_html = ?, text_html_version = ? WHERE id = ?",
+                    stale
+                )
+        except Exception as e:
+            # No es grave: se volverá a intentar en la siguiente lectura
+            logger.warning("⚠️  No se pudo guardar el HTML renderizado: %s", e)
+    return entries
+
+def _render_batch(rows):
+    return [(render_markdown_safe(text), RENDERER_VERSION, entry_id) for entry_id, text in rows]
+
+def rerender_all(force=False, workers=None, batch_size=500):
+    """Regenera el HTML guardado usando un pool de procesos. Devuelve cuántas filas se actualizaron."""
+    from .database import connection, transaction
+
+    where = "" if force else "WHERE text_html_version IS NOT ? OR text_html IS NULL"
+    params = () if force else (RENDERER_VERSION,)
+    with connection() as conn:
+        rows = [(r["id"], r["text"]) for r in conn.execute(f"SELECT id, text FROM log_entries {where}", params)]
+
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+    updated = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(_render_batch, batches):
+            with transaction() as conn:
+                conn.executemany(
+                    "UPDATE log_entries SET text_html = ?, text_html_version = ? WHERE id = ?",
+                    result
+                )
+            updated += len(result)
+    return updated
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenera el HTML guardado de las entradas del cuaderno.")
+    parser.add_argument("--all", action="store_true", help="regenerar también las entradas que ya están al día")
+    parser.add_argument("--workers", type=int, default=None, help="procesos en paralelo (por defecto, uno por CPU)")
+    args = parser.parse_args(argv)
+
+    from .database import init_db
+    init_db()
+    updated = rerender_all(force=args.all, workers=args.workers)
+    print(f"✅ {updated} entradas renderizadas (versión {RENDERER_VERSION})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# core/server.py
+#
+# Servidor de producción.
+# El servidor de desarrollo de Flask (con recargador y depurador) solo se usa
+# con --dev. En producción se sirve con waitress: WSGI en Python puro y con
+# varios hilos, para que varios móviles y Node-RED puedan hacer peticiones a
+# la vez. Al recibir SIGTERM (systemd, docker stop) deja de aceptar
+# conexiones, termina las peticiones en curso y cierra los hilos de fondo.
+# Solo se usa la API pública de waitress: create_server(), run() y close().
+#
+# Sin waitress instalado se usa el servidor con hilos de Werkzeug (sin
+# depurador ni recargador), más limitado pero suficiente.
+
+import logging
+import signal
+import threading
+
+try:
+    from waitress import create_server
+except ImportError:  # dependencia opcional
+    create_server = None
+
+from .config_manager import load_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER_CONFIG = {
+    "host": "0.0.0.0",
+    "threads": 8,                 # peticiones atendidas en paralelo
+    "backlog": 64,                # conexiones en espera de accept()
+    "connection_limit": 100,      # conexiones abiertas como máximo
+    "channel_timeout": 120,       # segundos de inactividad antes de cerrar una conexión
+    "cleanup_interval": 30,       # cada cuánto se buscan conexiones inactivas
+    "max_request_body_size": 64 * 1024 * 1024,   # subidas de fotos e importaciones
+}
+
+def get_server_config():
+    config = load_config()
+    server = dict(DEFAULT_SERVER_CONFIG)
+    server.update(config.get("server", {}))
+    server["port"] = config.get("port", 8384)
+    return server
+
+def _install_stop_handlers(stop):
+    """SIGTERM/SIGINT llaman a stop() (una sola vez)."""
+    stopping = False
+
+    def handler(signum, frame):
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        logger.info("🛑 Señal %s: deteniendo el servidor...", signal.Signals(signum).name)
+        stop()
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+def _stop_waitress():
+    # run() atiende SystemExit como un Ctrl-C: sale del bucle y espera a que los
+    # hilos terminen las peticiones en curso. Llamar a close() desde aquí cerraría
+    # el canal con el que esos hilos avisan al bucle de que su respuesta está lista.
+    raise SystemExit(0)
+
+def _serve_waitress(app, settings):
+    server = create_server(
+        app,
+        host=settings["host"],
+        port=settings["port"],
+        threads=settings["threads"],
+        backlog=settings["backlog"],
+        connection_limit=settings["connection_limit"],
+        channel_timeout=settings["channel_timeout"],
+        cleanup_interval=settings["cleanup_interval"],
+        max_request_body_size=settings["max_request_body_size"],
+        ident="bitacora",
+    )
+    logger.info("⛵ Cuaderno de Bitácora en http://%s:%s (waitress, %s hilos)",
+                settings["host"], settings["port"], settings["threads"])
+    _install_stop_handlers(_stop_waitress)
+    try:
+        server.run()
+    finally:
+        server.close()
+
+def _serve_werkzeug(app, settings):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class RequestHandler(WSGIRequestHandler):
+        # Timeout del socket de cada conexión (threads/backlog/connection_limit solo con waitress)
+        timeout = settings["channel_timeout"]
+
+    server = make_server(settings["host"], settings["port"], app, threaded=True, request_handler=RequestHandler)
+    logger.info("⛵ Cuaderno de Bitácora en http://%s:%s (waitress no instalado: servidor con hilos de Werkzeug)",
+                settings["host"], settings["port"])
+
+    # shutdown() no puede llamarse desde el hilo que ejecuta serve_forever()
+    _install_stop_handlers(lambda: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+def serve(app, on_shutdown=None):
+    """Sirve la aplicación hasta recibir SIGTERM/SIGINT; después llama a on_shutdown()."""
+    settings = get_server_config()
+    try:
+        if create_server is not None:
+            _serve_waitress(app, settings)
+        else:
+            _serve_werkzeug(app, settings)
+    finally:
+        if on_shutdown is not None:
+            on_shutdown()
+        logger.info("👋 Servidor detenido")
@@ -2,8 +2,14 @@
 
 import requests
 import json
+import logging
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 from .config_manager import get_signalk_config, save_config, load_config
+from .metrics import SIGNALK_REQUEST_SECONDS, SIGNALK_ERRORS, SIGNALK_PUBLISH
+
+logger = logging.getLogger(__name__)
 
 def is_signalk_enabled():
     sk = get_signalk_config()
@@ -78,69 +84,145 @@ def test_signalk_connection(url, token):
     
 # core/signalk_client.py — actualiza esta función
 
-def get_signalk_data(paths):
+# Sesión HTTP compartida (keep-alive) y pool de hilos para pedir los paths en paralelo
+SIGNALK_DEADLINE = 5            # segundos en total para get_signalk_data()
+SUBTREE_FETCH_THRESHOLD = 6     # a partir de cuántos paths se pide vessels/self de una vez
+MAX_PARALLEL_FETCHES = 8
+
+_session = requests.Session()
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=MAX_PARALLEL_FETCHES))
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=MAX_PARALLEL_FETCHES))
+_fetch_pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL_FETCHES, thread_name_prefix="signalk-fetch")
+
+def get_session():
+    """Sesión HTTP compartida con Signal K (reutiliza conexiones)."""
+    return _session
+
+def _parse_path_value(path, raw):
+    if path == "navigation.position":
+        # Extraer desde raw["value"] si existe
+        lat, lon = None, None
+        if isinstance(raw, dict):
+            value = raw.get("value")
+            if isinstance(value, dict):
+                try:
+                    lat = float(value.get("latitude"))
+                    lon = float(value.get("longitude"))
+                except (TypeError, ValueError):
+                    pass
+        if lat is not None and lon is not None:
+            return [lat, lon]
+        return None
+
+    elif path == "navigation.state":
+        # Para navigation.state, también puede tener "value"
+        if isinstance(raw, dict) and "value" in raw:
+            return raw["value"]
+        return raw  # en caso de que sea string directo
+
+    # Otros paths: devolver tal cual
+    return raw
+
+def _timed_request(metric_path, method, url, **kwargs):
+    """Petición a Signal K con latencia y errores en /metrics (etiqueta metric_path)."""
+    start = time.perf_counter()
+    try:
+        response = _session.request(method, url, **kwargs)
+    except requests.Timeout:
+        SIGNALK_ERRORS.inc(metric_path, "timeout")
+        raise
+    except requests.RequestException:
+        SIGNALK_ERRORS.inc(metric_path, "connection")
+        raise
+    finally:
+        SIGNALK_REQUEST_SECONDS.observe(time.perf_counter() - start, metric_path)
+    if response.status_code >= 400:
+        SIGNALK_ERRORS.inc(metric_path, f"http_{response.status_code}")
+    return response
+
+def _fetch_path(base_url, headers, path, deadline):
+    timeout = max(deadline - time.monotonic(), 0.1)
+    url_path = path.replace(".", "/")
+    response = _timed_request(path, "GET", f"{base_url}/signalk/v1/api/vessels/self/{url_path}",
+                              headers=headers, timeout=timeout)
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+def _extract_from_tree(tree, path):
+    node = tree
+    for part in path.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+def get_signalk_data(paths, deadline=SIGNALK_DEADLINE, subtree=None):
+    """Lee los paths indicados de vessels/self.
+
+    Los paths se piden en paralelo con un único plazo total; los que no
+    respondan a tiempo (o fallen) se omiten del resultado. Con muchos paths
+    (o subtree=True) se descarga vessels/self una sola vez y se extraen localmente.
+    """
     if not is_signalk_enabled():
         return {}
 
     sk = get_signalk_config()
     headers = {"Authorization": f"Bearer {sk['token']}"} if sk["token"] else {}
+    paths = list(dict.fromkeys(paths))
+    if subtree is None:
+        subtree = len(paths) >= SUBTREE_FETCH_THRESHOLD
+    end_at = time.monotonic() + deadline
     result = {}
 
-    try:
-        for path in paths:
-            url_path = path.replace(".", "/")
-            url = f"{sk['url']}/signalk/v1/api/vessels/self/{url_path}"
-            response = requests.get(url, headers=headers, timeout=5)
+    if subtree:
+        try:
+            response = _timed_request("vessels.self", "GET", f"{sk['url']}/signalk/v1/api/vessels/self",
+                                      headers=headers, timeout=deadline)
             if response.status_code == 200:
-                raw = response.json()
-
-                if path == "navigation.position":
-                    # Extraer desde raw["value"] si existe
-                    lat, lon = None, None
-                    if isinstance(raw, dict):
-                        value = raw.get("value")
-                        if isinstance(value, dict):
-                            try:
-                                lat = float(value.get("latitude"))
-                                lon = float(value.get("longitude"))
-                            except (TypeError, ValueError):
-                                pass
-                    if lat is not None and lon is not None:
-                        result[path] = [lat, lon]
-                    else:
-                        result[path] = None
-
-                elif path == "navigation.state":
-                    # Para navigation.state, también puede tener "value"
-                    if isinstance(raw, dict) and "value" in raw:
-                        result[path] = raw["value"]
-                    else:
-                        result[path] = raw  # en caso de que sea string directo
+                tree = response.json()
+                for path in paths:
+                    raw = _extract_from_tree(tree, path)
+                    if raw is not None:
+                        result[path] = _parse_path_value(path, raw)
+                return result
+        except Exception as e:
+            logger.warning("⚠️  Error al consultar vessels/self en Signal K: %s", e)
+            return {}
 
-                else:
-                    # Otros paths: devolver tal cual
-                    result[path] = raw
+    futures = {_fetch_pool.submit(_fetch_path, sk["url"], headers, path, end_at): path for path in paths}
+    done, not_done = wait(futures, timeout=max(end_at - time.monotonic(), 0))
+    for future in not_done:
+        future.cancel()
+        SIGNALK_ERRORS.inc(futures[future], "deadline")
+        logger.warning("⚠️  Signal K no respondió a tiempo: %s", futures[future])
 
-    except Exception as e:
-        print(f"⚠️  Error al consultar Signal K: {e}")
-        return {}
+    for future in done:
+        path = futures[future]
+        try:
+            raw = future.result()
+        except Exception as e:
+            logger.warning("⚠️  Error al consultar Signal K (%s): %s", path, e)
+            continue
+        if raw is not None:
+            result[path] = _parse_path_value(path, raw)
 
     return result
 
-def publish_note_to_resources(note_data):
-    sk = get_signalk_config()
-    if not sk.get("enabled") or not sk.get("url") or not sk.get("token"):
-        return None
+class SignalKError(Exception):
+    """Error al sincronizar con Signal K (el outbox lo reintentará)."""
 
+class NoteNotFound(SignalKError):
+    """La nota que se quería actualizar ya no existe en Signal K (PUT → 404)."""
+
+def _notes_url(sk, resource_id=None):
     url = f"{sk['url'].rstrip('/')}/signalk/v2/api/resources/notes"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {sk['token']}"
-    }
+    return f"{url}/{resource_id}" if resource_id else url
 
+def _note_resource(note_data):
     # ✅ Sin "type": "note" → ya está en la URL
     resource = {
-        "description": note_data.get("text", "")[:200],
+        "description": (note_data.get("text") or "")[:200],
         "timestamp": note_data["timestamp_utc"],
         "origin": "logbook"
     }
@@ -155,28 +237,84 @@ def publish_note_to_resources(note_data):
     # Añadir navigationState si existe
     if note_data.get("navigation_state"):
         resource["navigationState"] = note_data["navigation_state"]
-    
-    #Debug
-    print(f"📤 Publicando nota en: {url}")
-    print(f"   Cuerpo: {json.dumps(resource, indent=2)}")
-    print(f"   Cabeceras: Authorization: Bearer {'*' * len(sk['token'])}")
-    
+    return resource
+
+def send_note_resource(note_data, resource_id=None):
+    """Crea (POST) o actualiza (PUT) la nota en Signal K y devuelve su id.
+
+    Lanza SignalKError si Signal K no está configurado o responde con error, y
+    NoteNotFound si al actualizar la nota ya no existe.
+    """
+    sk = get_signalk_config()
+    if not sk.get("enabled") or not sk.get("url") or not sk.get("token"):
+        raise SignalKError("Signal K no configurado")
+
+    url = _notes_url(sk, resource_id)
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {sk['token']}"
+    }
+    resource = _note_resource(note_data)
+
+    body = json.dumps(resource, ensure_ascii=False)
+    action = "update" if resource_id else "create"
+    logger.debug("📤 %s nota en %s: %s", "Actualizando" if resource_id else "Publicando", url, body)
+
     try:
-        response = requests.post(
+        response = _timed_request(
+            "resources.notes",
+            "PUT" if resource_id else "POST",
             url,
-            data=json.dumps(resource, ensure_ascii=False),
+            data=body.encode("utf-8"),
             headers=headers,
             timeout=10
         )
-        #Debug
-        print(f"   Respuesta: {response.status_code} {response.text}")
-        
-        if response.status_code in (200, 201):
-            result = response.json()
-            return result.get("id")
-        else:
-            print(f"❌ Signal K error {response.status_code}: {response.text}")
-            return None
-    except Exception as e:
-        print(f"⚠️  Excepción en publish_note_to_resources: {e}")
+    except requests.RequestException as e:
+        SIGNALK_PUBLISH.inc(action, "error")
+        raise SignalKError(str(e)) from e
+
+    logger.debug("   Respuesta: %s %s", response.status_code, response.text)
+
+    if response.status_code not in (200, 201):
+        SIGNALK_PUBLISH.inc(action, "error")
+        if resource_id and response.status_code == 404:
+            raise NoteNotFound(f"La nota {resource_id} no existe en Signal K")
+        raise SignalKError(f"HTTP {response.status_code}: {response.text}")
+    if resource_id:
+        SIGNALK_PUBLISH.inc(action, "ok")
+        return resource_id
+    try:
+        new_id = response.json().get("id")
+    except ValueError:
+        new_id = None
+    if not new_id:
+        SIGNALK_PUBLISH.inc(action, "error")
+        raise SignalKError("Signal K no devolvió el id de la nota")
+    SIGNALK_PUBLISH.inc(action, "ok")
+    return new_id
+
+def delete_note_resource(resource_id):
+    """Borra la nota en Signal K. Un 404 se da por bueno (ya no existe)."""
+    sk = get_signalk_config()
+    if not sk.get("enabled") or not sk.get("url"):
+        raise SignalKError("Signal K no configurado")
+    headers = {"Authorization": f"Bearer {sk['token']}"}
+    try:
+        response = _timed_request("resources.notes", "DELETE", _notes_url(sk, resource_id), headers=headers, timeout=10)
+    except requests.RequestException as e:
+        SIGNALK_PUBLISH.inc("delete", "error")
+        raise SignalKError(str(e)) from e
+    if response.status_code not in (200, 202, 204, 404):
+        SIGNALK_PUBLISH.inc("delete", "error")
+        raise SignalKError(f"HTTP {response.status_code}: {response.text}")
+    SIGNALK_PUBLISH.inc("delete", "ok")
+
+def publish_note_to_resources(note_data):
+    try:
+        return send_note_resource(note_data)
+    except SignalKError as e:
+        logger.warning("❌ Signal K error: %s", e)
+        return None
+    except Exception:
+        logger.exception("⚠️  Excepción en publish_note_to_resources")
         return None
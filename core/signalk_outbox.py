@@ -0,0 +1,213 @@
+# core/signalk_outbox.py
+#
+# Outbox persistente para sincronizar las notas con Signal K.
+# Las peticiones HTTP ya no se hacen dentro de la petición del usuario: el
+# alta/edición/borrado de una entrada deja una fila en signalk_outbox en la
+# misma transacción, y un hilo en segundo plano la procesa con reintentos.
+# Tras el commit, quien encola llama a wake_worker() para no esperar al sondeo.
+#
+#   action = 'sync'   → crea (POST) o actualiza (PUT) la nota de entry_id
+#   action = 'delete' → borra la nota resource_id
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .database import connection, transaction
+from .signalk_client import NoteNotFound, is_signalk_enabled, send_note_resource, delete_note_resource
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_CONCURRENCY = 2        # peticiones simultáneas a Signal K
+BACKOFF_BASE = 5              # segundos tras el primer fallo
+BACKOFF_MAX = 3600            # como mucho, un reintento por hora
+IDLE_POLL_INTERVAL = 30       # revisión periódica aunque nadie avise
+
+def _backoff(attempts):
+    delay = min(BACKOFF_BASE * (2 ** max(attempts - 1, 0)), BACKOFF_MAX)
+    return delay + random.uniform(0, delay / 4)
+
+def enqueue_sync(conn, entry_id):
+    """Pide publicar/actualizar la nota de una entrada (una sola fila pendiente por entrada)."""
+    now = time.time()
+    conn.execute("""
+        INSERT INTO signalk_outbox (action, entry_id, next_attempt_at, created_at)
+        VALUES ('sync', ?, ?, ?)
+        ON CONFLICT(entry_id) WHERE action = 'sync' DO UPDATE SET
+            version = version + 1,
+            attempts = 0,
+            next_attempt_at = excluded.next_attempt_at
+    """, (entry_id, now, now))
+
+def enqueue_delete(conn, entry_id, resource_id):
+    """Descarta la sincronización pendiente de la entrada y, si ya estaba publicada, pide borrar la nota."""
+    conn.execute("DELETE FROM signalk_outbox WHERE action = 'sync' AND entry_id = ?", (entry_id,))
+    if resource_id:
+        now = time.time()
+        conn.execute("""
+            INSERT INTO signalk_outbox (action, entry_id, resource_id, next_attempt_at, created_at)
+            VALUES ('delete', ?, ?, ?, ?)
+            ON CONFLICT(resource_id) WHERE action = 'delete' DO NOTHING
+        """, (entry_id, resource_id, now, now))
+
+def outbox_status():
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT action, COUNT(*) AS n, SUM(attempts > 0) AS failing, MIN(created_at) AS oldest
+            FROM signalk_outbox GROUP BY action
+        """).fetchall()
+        last = conn.execute("""
+            SELECT last_error FROM signalk_outbox
+            WHERE last_error IS NOT NULL ORDER BY next_attempt_at DESC LIMIT 1
+        """).fetchone()
+    by_action = {row["action"]: row["n"] for row in rows}
+    oldest = min((row["oldest"] for row in rows), default=None)
+    return {
+        "pending": sum(by_action.values()),
+        "failing": sum(row["failing"] or 0 for row in rows),
+        "by_action": by_action,
+        "oldest_age_s": round(time.time() - oldest, 1) if oldest else None,
+        "last_error": last["last_error"] if last else None,
+        "worker_running": _worker is not None and _worker.is_alive(),
+    }
+
+class OutboxWorker(threading.Thread):
+    """Despacha las filas vencidas del outbox a un pool con concurrencia limitada."""
+
+    def __init__(self, concurrency=OUTBOX_CONCURRENCY):
+        super().__init__(name="signalk-outbox", daemon=True)
+        self.concurrency = concurrency
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="signalk-outbox")
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            timeout = IDLE_POLL_INTERVAL
+            try:
+                if is_signalk_enabled():
+                    timeout = self._dispatch()
+            except Exception:
+                logger.exception("⚠️  Error en el outbox de Signal K")
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _dispatch(self):
+        """Lanza las filas vencidas. Devuelve cuánto esperar hasta la próxima."""
+        with self._lock:
+            busy = set(self._in_flight)
+        free = self.concurrency - len(busy)
+        now = time.time()
+        skip_busy = f"AND id NOT IN ({','.join('?' * len(busy))})" if busy else ""
+        with connection() as conn:
+            rows = conn.execute(f"""
+                SELECT id, action, entry_id, resource_id, version, attempts
+                FROM signalk_outbox
+                WHERE next_attempt_at <= ? {skip_busy}
+                ORDER BY next_attempt_at LIMIT ?
+            """, (now, *busy, max(free, 0))).fetchall()
+            # Próxima fila que no esté ya en marcha (las que terminan despiertan al hilo)
+            in_flight = busy | {row["id"] for row in rows}
+            skip_in_flight = f"WHERE id NOT IN ({','.join('?' * len(in_flight))})" if in_flight else ""
+            upcoming = conn.execute(
+                f"SELECT MIN(next_attempt_at) FROM signalk_outbox {skip_in_flight}", tuple(in_flight)
+            ).fetchone()[0]
+
+        for row in rows:
+            with self._lock:
+                self._in_flight.add(row["id"])
+            self._pool.submit(self._process, dict(row))
+
+        if upcoming is None or upcoming <= now:
+            # Nada pendiente, o filas vencidas esperando un hueco: _process avisa al terminar
+            return IDLE_POLL_INTERVAL
+        return min(upcoming - now, IDLE_POLL_INTERVAL)
+
+    def _process(self, item):
+        try:
+            if item["action"] == "sync":
+                self._process_sync(item)
+            else:
+                delete_note_resource(item["resource_id"])
+                with transaction() as conn:
+                    conn.execute("DELETE FROM signalk_outbox WHERE id = ?", (item["id"],))
+        except Exception as e:
+            attempts = item["attempts"] + 1
+            logger.warning("⚠️  Signal K (%s #%s) falló, intento %s: %s", item["action"], item["entry_id"], attempts, e)
+            with transaction() as conn:
+                conn.execute("""
+                    UPDATE signalk_outbox SET attempts = ?, next_attempt_at = ?, last_error = ?
+                    WHERE id = ?
+                """, (attempts, time.time() + _backoff(attempts), str(e)[:500], item["id"]))
+        finally:
+            with self._lock:
+                self._in_flight.discard(item["id"])
+            self._wake.set()
+
+    def _process_sync(self, item):
+        with connection() as conn:
+            entry = conn.execute("""
+                SELECT id, timestamp_utc, text, latitude, longitude, navigation_state, signalK_resource_id
+                FROM log_entries WHERE id = ?
+            """, (item["entry_id"],)).fetchone()
+        if entry is None:
+            # La entrada se borró; enqueue_delete ya se ocupa de la nota si existía
+            with transaction() as conn:
+                conn.execute("DELETE FROM signalk_outbox WHERE id = ? AND version = ?", (item["id"], item["version"]))
+            return
+
+        published_id = entry["signalK_resource_id"]
+        try:
+            resource_id = send_note_resource(dict(entry), published_id)
+        except NoteNotFound:
+            # Alguien borró la nota en el servidor: se vuelve a crear con un id nuevo
+            logger.warning("⚠️  La nota de la entrada #%s ya no existe en Signal K; se publica de nuevo", entry["id"])
+            resource_id = send_note_resource(dict(entry))
+
+        with transaction() as conn:
+            if resource_id != published_id:
+                c = conn.execute(
+                    "UPDATE log_entries SET signalK_resource_id = ? WHERE id = ? AND signalK_resource_id IS ?",
+                    (resource_id, entry["id"], published_id)
+                )
+                if c.rowcount == 0:
+                    # Se borró (o se publicó por otro lado) mientras enviábamos: no dejar la nota huérfana
+                    enqueue_delete(conn, None, resource_id)
+            # Si la entrada se editó durante el envío, la versión cambió y la fila se queda para otra vuelta
+            conn.execute("DELETE FROM signalk_outbox WHERE id = ? AND version = ?", (item["id"], item["version"]))
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_outbox_worker():
+    """Arranca el hilo del outbox (una sola vez por proceso)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = OutboxWorker()
+            _worker.start()
+        return _worker
+
+def stop_outbox_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            _worker.stop()
+            _worker = None
+
+def wake_worker():
+    worker = _worker
+    if worker is not None:
+        worker.wake()
@@ -0,0 +1,204 @@
+# core/signalk_stream.py
+#
+# Suscriptor en segundo plano al stream de deltas de Signal K
+# (/signalk/v1/stream). Mantiene en memoria el último valor de cada path
+# seleccionado para que crear una entrada no tenga que esperar a la red.
+# Si el stream no está disponible o los valores son viejos, se usa REST.
+
+import json
+import logging
+import random
+import threading
+import time
+
+try:
+    import websocket  # paquete websocket-client
+except ImportError:  # dependencia opcional: sin ella se usa solo REST
+    websocket = None
+
+from .config_manager import get_signalk_config
+from .signalk_client import get_signalk_data, _parse_path_value
+
+logger = logging.getLogger(__name__)
+
+STREAM_PERIOD_MS = 1000        # política "fixed": Signal K reenvía el último valor cada segundo
+MAX_AGE = 10                   # segundos; más viejo que esto se considera caducado
+RECONNECT_MIN = 1
+RECONNECT_MAX = 60
+CONFIG_CHECK_INTERVAL = 5      # cada cuánto se revisa si cambió la configuración
+
+class LatestValueCache:
+    """Último valor recibido por path, con la hora (monotónica) de recepción."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def update(self, path, value, timestamp=None):
+        with self._lock:
+            self._values[path] = ({"value": value, "timestamp": timestamp}, time.monotonic())
+
+    def get(self, path, max_age=MAX_AGE):
+        """Devuelve el valor en bruto ({"value": ..., "timestamp": ...}) o None si falta o está caducado."""
+        with self._lock:
+            item = self._values.get(path)
+        if item is None:
+            return None
+        raw, received = item
+        if time.monotonic() - received > max_age:
+            return None
+        return raw
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._values)
+
+# Paths que otros componentes (p. ej. el grabador de track) necesitan además de selected_paths
+_extra_paths = set()
+_extra_lock = threading.Lock()
+
+def register_paths(paths):
+    """Añade paths a la suscripción; el suscriptor se reconecta solo para incluirlos."""
+    with _extra_lock:
+        _extra_paths.update(paths)
+
+def _stream_settings():
+    sk = get_signalk_config()
+    url = sk["url"]
+    if not sk["enabled"] or not url:
+        return None
+    paths = list(sk["selected_paths"])
+    with _extra_lock:
+        paths += sorted(_extra_paths - set(paths))
+    return (url, sk["token"], tuple(paths))
+
+def _stream_url(http_url):
+    if http_url.startswith("https://"):
+        ws_url = "wss://" + http_url[len("https://"):]
+    elif http_url.startswith("http://"):
+        ws_url = "ws://" + http_url[len("http://"):]
+    else:
+        ws_url = http_url
+    return f"{ws_url}/signalk/v1/stream?subscribe=none"
+
+class SignalKSubscriber(threading.Thread):
+    """Hilo que mantiene la suscripción y reconecta con backoff exponencial."""
+
+    def __init__(self, cache):
+        super().__init__(name="signalk-stream", daemon=True)
+        self.cache = cache
+        self._stop_event = threading.Event()
+        self.connected = False
+        self.last_error = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = RECONNECT_MIN
+        while not self._stop_event.is_set():
+            settings = _stream_settings()
+            if settings is None:
+                # Signal K desactivado: esperar por si se activa desde /setup
+                self._stop_event.wait(CONFIG_CHECK_INTERVAL)
+                continue
+            try:
+                self._consume(settings)
+                backoff = RECONNECT_MIN
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("⚠️  Stream de Signal K desconectado: %s", e)
+            self.connected = False
+            if self._stop_event.is_set():
+                break
+            # Backoff exponencial con algo de aleatoriedad
+            self._stop_event.wait(backoff + random.uniform(0, backoff / 2))
+            backoff = min(backoff * 2, RECONNECT_MAX)
+
+    def _consume(self, settings):
+        url, token, paths = settings
+        headers = [f"Authorization: Bearer {token}"] if token else []
+        ws = websocket.create_connection(_stream_url(url), header=headers, timeout=CONFIG_CHECK_INTERVAL)
+        try:
+            ws.send(json.dumps({
+                "context": "vessels.self",
+                "subscribe": [
+                    {"path": path, "policy": "fixed", "period": STREAM_PERIOD_MS}
+                    for path in paths
+                ]
+            }))
+            self.connected = True
+            self.last_error = None
+            wanted = set(paths)
+            last_check = time.monotonic()
+            while not self._stop_event.is_set():
+                try:
+                    message = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    message = None
+                if message:
+                    self._handle_message(message, wanted)
+                if time.monotonic() - last_check >= CONFIG_CHECK_INTERVAL:
+                    last_check = time.monotonic()
+                    if _stream_settings() != settings:
+                        # URL, token o paths cambiados: reconectar con la nueva configuración
+                        self.cache.clear()
+                        return
+        finally:
+            ws.close()
+
+    def _handle_message(self, message, wanted):
+        try:
+            delta = json.loads(message)
+        except ValueError:
+            return
+        for update in delta.get("updates", []) if isinstance(delta, dict) else []:
+            timestamp = update.get("timestamp")
+            for item in update.get("values", []):
+                path = item.get("path")
+                if path in wanted:
+                    self.cache.update(path, item.get("value"), timestamp)
+
+cache = LatestValueCache()
+_subscriber = None
+_subscriber_lock = threading.Lock()
+
+def start_subscriber():
+    """Arranca el suscriptor (una sola vez por proceso). Devuelve el hilo o None si no hay websocket-client."""
+    global _subscriber
+    if websocket is None:
+        logger.info("ℹ️  websocket-client no instalado: Signal K se consultará solo por REST")
+        return None
+    with _subscriber_lock:
+        if _subscriber is None or not _subscriber.is_alive():
+            _subscriber = SignalKSubscriber(cache)
+            _subscriber.start()
+        return _subscriber
+
+def stop_subscriber():
+    global _subscriber
+    with _subscriber_lock:
+        if _subscriber is not None:
+            _subscriber.stop()
+            _subscriber = None
+
+def get_latest_data(paths, max_age=MAX_AGE):
+    """Como get_signalk_data(), pero sirviendo desde la caché del stream.
+
+    Solo los paths ausentes o caducados se piden por REST.
+    """
+    result = {}
+    missing = []
+    for path in dict.fromkeys(paths):
+        raw = cache.get(path, max_age)
+        if raw is None:
+            missing.append(path)
+        else:
+            result[path] = _parse_path_value(path, raw)
+    if missing:
+        result.update(get_signalk_data(missing))
+    return result
@@ -0,0 +1,243 @@
+# core/stats.py
+#
+# Estadísticas de travesía a partir de resúmenes diarios.
+# Cada día guarda la distancia recorrida (haversine entre posiciones
+# consecutivas), el tiempo en cada navigation_state y el número de entradas
+# por tipo. Los triggers de la BD marcan en stats_dirty_days los días que
+# cambian; aquí solo se recalculan esos días, nunca el cuaderno entero.
+#
+# Uso (recalcular todo, p. ej. tras restaurar una copia):
+#     python -m core.stats --rebuild
+
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from .database import connection, transaction
+from .utils import haversine_nm
+
+TRACK_SEGMENT_MAX_GAP_S = 3600         # más separación entre puntos de track: no se suma el tramo
+ENTRY_SEGMENT_MAX_GAP_S = 24 * 3600    # entre entradas con posición (cuadernos sin track)
+STATE_MAX_DURATION_S = 24 * 3600       # un estado dura hasta la siguiente entrada, como mucho 24 h
+REFRESH_BATCH_DAYS = 30                # días recalculados por transacción
+TODAY_REFRESH_S = 60                   # las horas por estado de hoy se actualizan como mucho cada minuto
+
+_today_refreshed_at = float("-inf")
+
+def _parse_ts(value):
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _distance(points, start, max_gap):
+    """Suma los tramos entre puntos (t, lat, lon) consecutivos que terminan a partir de start."""
+    total = 0.0
+    for (t1, lat1, lon1), (t2, lat2, lon2) in zip(points, points[1:]):
+        if t2 >= start and t2 - t1 <= max_gap:
+            total += haversine_nm(lat1, lon1, lat2, lon2)
+    return total
+
+def _compute_day(conn, day, now):
+    start = datetime.fromisoformat(day).replace(tzinfo=timezone.utc).timestamp()
+    end = start + 86400
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+    types = conn.execute("""
+        SELECT entry_type, COUNT(*) FROM log_entries
+        WHERE timestamp_utc >= ? AND timestamp_utc < ?
+        GROUP BY entry_type
+    """, (day, next_day)).fetchall()
+
+    # Distancia: del track si lo hay; si no (cuadernos antiguos o importados), de las entradas con posición
+    points = [
+        (t, lat_e7 / 1e7, lon_e7 / 1e7) for t, lat_e7, lon_e7 in conn.execute(
+            "SELECT t, lat_e7, lon_e7 FROM track_points WHERE t >= ? AND t < ? ORDER BY t",
+            (int(start) - TRACK_SEGMENT_MAX_GAP_S, int(end))
+        )
+    ]
+    track_points = sum(1 for p in points if p[0] >= start)
+    if track_points:
+        distance = _distance(points, start, TRACK_SEGMENT_MAX_GAP_S)
+    else:
+        rows = conn.execute("""
+            SELECT timestamp_utc, latitude, longitude FROM log_entries
+            WHERE timestamp_utc >= ? AND timestamp_utc < ?
+              AND latitude IS NOT NULL AND longitude IS NOT NULL
+            ORDER BY timestamp_utc, id
+        """, (_iso(start - ENTRY_SEGMENT_MAX_GAP_S), next_day)).fetchall()
+        positions = [(_parse_ts(ts), lat, lon) for ts, lat, lon in rows]
+        distance = _distance([p for p in positions if p[0] is not None], start, ENTRY_SEGMENT_MAX_GAP_S)
+
+    # Tiempo por estado: cada estado dura hasta la siguiente entrada con estado (o 24 h, o ahora)
+    rows = conn.execute("""
+        SELECT timestamp_utc, navigation_state FROM log_entries
+        WHERE timestamp_utc >= ? AND timestamp_utc < ?
+          AND navigation_state IS NOT NULL AND navigation_state != ''
+        ORDER BY timestamp_utc, id
+    """, (_iso(start - STATE_MAX_DURATION_S), _iso(end + STATE_MAX_DURATION_S))).fetchall()
+    changes = [(t, state) for t, state in ((_parse_ts(ts), state) for ts, state in rows) if t is not None]
+    states = {}
+    for i, (t, state) in enumerate(changes):
+        until = min(t + STATE_MAX_DURATION_S, now)
+        if i + 1 < len(changes):
+            until = min(until, changes[i + 1][0])
+        seconds = min(until, end) - max(t, start)
+        if seconds > 0:
+            states[state] = states.get(state, 0.0) + seconds
+
+    conn.execute("DELETE FROM daily_entry_types WHERE day = ?", (day,))
+    conn.execute("DELETE FROM daily_nav_states WHERE day = ?", (day,))
+    entries = sum(n for _, n in types)
+    if not (entries or track_points or states):
+        conn.execute("DELETE FROM daily_rollups WHERE day = ?", (day,))
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO daily_rollups (day, distance_nm, track_points, entries) VALUES (?, ?, ?, ?)",
+        (day, round(distance, 3), track_points, entries)
+    )
+    conn.executemany(
+        "INSERT INTO daily_entry_types (day, entry_type, n) VALUES (?, ?, ?)",
+        [(day, entry_type or "", n) for entry_type, n in types]
+    )
+    conn.executemany(
+        "INSERT INTO daily_nav_states (day, state, seconds) VALUES (?, ?, ?)",
+        [(day, state, round(seconds, 1)) for state, seconds in states.items()]
+    )
+
+def _refresh_batch(days, now):
+    """Recalcula days en una transacción corta y los quita de stats_dirty_days."""
+    with transaction() as conn:
+        for day in days:
+            _compute_day(conn, day, now)
+        # Solo los recalculados: un día marcado mientras tanto se queda para la siguiente vez
+        conn.executemany("DELETE FROM stats_dirty_days WHERE day = ?", [(day,) for day in days])
+
+def refresh_rollups():
+    """Recalcula los días marcados como sucios (y hoy, cuyo último estado sigue abierto). Devuelve cuántos.
+
+    La comprobación es una lectura: sin días pendientes no se toma el bloqueo de
+    escritura. Los pendientes se procesan en lotes de REFRESH_BATCH_DAYS días,
+    cada uno en su transacción, para no bloquear las escrituras mucho rato.
+    """
+    global _today_refreshed_at
+    now = datetime.now(timezone.utc)
+    today = now.date().isoformat()
+    refreshed = 0
+    while True:
+        with connection() as conn:
+            days = [row[0] for row in conn.execute(
+                "SELECT day FROM stats_dirty_days ORDER BY day LIMIT ?", (REFRESH_BATCH_DAYS,)
+            )]
+        if not days:
+            break
+        _refresh_batch(days, now.timestamp())
+        refreshed += len(days)
+        if today in days:
+            _today_refreshed_at = time.monotonic()
+        if len(days) < REFRESH_BATCH_DAYS:
+            break
+
+    # Hoy cambia con el reloj si el último estado sigue abierto; basta con actualizarlo de vez en cuando
+    if time.monotonic() - _today_refreshed_at >= TODAY_REFRESH_S:
+        with connection() as conn:
+            open_state = conn.execute("SELECT 1 FROM daily_nav_states WHERE day = ?", (today,)).fetchone()
+        if open_state:
+            _refresh_batch([today], now.timestamp())
+            refreshed += 1
+        _today_refreshed_at = time.monotonic()
+    return refreshed
+
+def rebuild_rollups():
+    """Marca todos los días con datos como sucios y los recalcula."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM daily_rollups")
+        conn.execute("DELETE FROM daily_entry_types")
+        conn.execute("DELETE FROM daily_nav_states")
+        conn.execute("""
+            INSERT OR IGNORE INTO stats_dirty_days (day)
+            SELECT DISTINCT date(timestamp_utc, d) FROM log_entries,
+                (SELECT '+0 days' AS d UNION ALL SELECT '+1 day')
+            WHERE date(timestamp_utc) IS NOT NULL
+            UNION SELECT DISTINCT date(t, 'unixepoch') FROM track_points
+            UNION SELECT DISTINCT date(t + 3600, 'unixepoch') FROM track_points
+        """)
+    return refresh_rollups()
+
+def _period(day, group):
+    if group == "month":
+        return day[:7]
+    if group == "week":
+        year, week, _ = date.fromisoformat(day).isocalendar()
+        return f"{year}-W{week:02d}"
+    return day
+
+def get_stats(date_from, date_to, group="day"):
+    """Resumen por día, semana ISO o mes entre dos fechas (YYYY-MM-DD, ambas incluidas)."""
+    refresh_rollups()
+    with connection() as conn:
+        rollups = conn.execute(
+            "SELECT day, distance_nm, track_points, entries FROM daily_rollups WHERE day BETWEEN ? AND ? ORDER BY day",
+            (date_from, date_to)
+        ).fetchall()
+        types = conn.execute(
+            "SELECT day, entry_type, n FROM daily_entry_types WHERE day BETWEEN ? AND ?", (date_from, date_to)
+        ).fetchall()
+        states = conn.execute(
+            "SELECT day, state, seconds FROM daily_nav_states WHERE day BETWEEN ? AND ?", (date_from, date_to)
+        ).fetchall()
+
+    periods = {}
+    def bucket(day):
+        key = _period(day, group)
+        if key not in periods:
+            periods[key] = {"period": key, "distance_nm": 0.0, "entries": 0, "track_points": 0,
+                            "entry_types": {}, "nav_state_hours": {}}
+        return periods[key]
+
+    for day, distance, points, entries in rollups:
+        item = bucket(day)
+        item["distance_nm"] += distance
+        item["track_points"] += points
+        item["entries"] += entries
+    for day, entry_type, n in types:
+        counts = bucket(day)["entry_types"]
+        counts[entry_type] = counts.get(entry_type, 0) + n
+    for day, state, seconds in states:
+        hours = bucket(day)["nav_state_hours"]
+        hours[state] = hours.get(state, 0.0) + seconds / 3600
+
+    result = sorted(periods.values(), key=lambda p: p["period"])
+    totals = {"distance_nm": 0.0, "entries": 0, "entry_types": {}, "nav_state_hours": {}}
+    for item in result:
+        item["distance_nm"] = round(item["distance_nm"], 2)
+        item["nav_state_hours"] = {k: round(v, 2) for k, v in item["nav_state_hours"].items()}
+        totals["distance_nm"] += item["distance_nm"]
+        totals["entries"] += item["entries"]
+        for k, v in item["entry_types"].items():
+            totals["entry_types"][k] = totals["entry_types"].get(k, 0) + v
+        for k, v in item["nav_state_hours"].items():
+            totals["nav_state_hours"][k] = round(totals["nav_state_hours"].get(k, 0.0) + v, 2)
+    totals["distance_nm"] = round(totals["distance_nm"], 2)
+    return {"from": date_from, "to": date_to, "group": group, "periods": result, "totals": totals}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recalcula los resúmenes diarios del cuaderno.")
+    parser.add_argument("--rebuild", action="store_true", help="recalcular todos los días, no solo los pendientes")
+    args = parser.parse_args(argv)
+
+    from .database import init_db
+    init_db()
+    days = rebuild_rollups() if args.rebuild else refresh_rollups()
+    print(f"✅ {days} días recalculados")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+# core/track_recorder.py
+#
+# Grabador automático de track a partir de Signal K.
+# Muestrea posición, velocidad y rumbo, descarta los puntos redundantes
+# (distancia mínima, intervalo de tiempo y cambio de rumbo) y los guarda por
+# lotes en track_points para no escribir en la SD con cada fix. Cada cierto
+# tiempo añade a log_entries una entrada "auto" con el resumen del tramo.
+
+import json
+import logging
+import math
+import atexit
+import threading
+import time
+from datetime import datetime, timezone
+
+from .config_manager import load_config
+from .database import transaction
+from .i18n import get_translation
+from .rendering import rendered_columns
+from .signalk_client import is_signalk_enabled
+from .signalk_stream import get_latest_data, register_paths
+from .utils import haversine_nm
+
+POSITION_PATH = "navigation.position"
+SOG_PATH = "navigation.speedOverGround"         # m/s
+COG_PATH = "navigation.courseOverGroundTrue"    # radianes
+STATE_PATH = "navigation.state"                 # solo para los resúmenes
+TRACK_PATHS = [POSITION_PATH, SOG_PATH, COG_PATH]
+
+MS_TO_KN = 1.943844
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACK_CONFIG = {
+    "enabled": True,
+    "sample_interval_s": 5,          # cada cuánto se lee Signal K
+    "min_interval_s": 10,            # nunca dos puntos más cerca que esto en el tiempo
+    "min_distance_m": 25,            # distancia mínima para guardar un punto
+    "straight_interval_s": 60,       # en línea recta, como mucho un punto por minuto
+    "max_interval_s": 900,           # aunque no se mueva, un punto cada 15 min
+    "heading_change_deg": 20,        # un giro así se guarda aunque la distancia sea corta
+    "flush_points": 60,              # escribir en la BD al juntar estos puntos...
+    "flush_interval_s": 300,         # ...o tras este tiempo
+    "summary_interval_s": 3600,      # resumen "auto" en el cuaderno cada hora
+    "summary_min_distance_nm": 0.1,  # sin movimiento no se añade resumen
+}
+
+def get_track_config():
+    config = load_config()
+    track = dict(DEFAULT_TRACK_CONFIG)
+    track.update(config.get("track", {}))
+    return track
+
+def _value(raw):
+    if isinstance(raw, dict):
+        raw = raw.get("value")
+    try:
+        return float(raw) if raw is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _angle_diff_deg(a, b):
+    diff = abs(a - b) % 360
+    return 360 - diff if diff > 180 else diff
+
+def should_keep(last, fix, settings):
+    """Decide si un fix (t, lat, lon, sog_ms, cog_deg) merece guardarse tras el último guardado."""
+    if last is None:
+        return True
+    dt = fix[0] - last[0]
+    if dt < settings["min_interval_s"]:
+        return False
+    if dt >= settings["max_interval_s"]:
+        return True
+    # Cambio de rumbo estando en movimiento (las bordadas no se pierden)
+    turned = (
+        last[4] is not None and fix[4] is not None and (fix[3] or 0) >= 0.5
+        and _angle_diff_deg(last[4], fix[4]) >= settings["heading_change_deg"]
+    )
+    if turned:
+        return True
+    dist_m = haversine_nm(last[1], last[2], fix[1], fix[2]) * 1852
+    if dist_m < settings["min_distance_m"]:
+        return False
+    # Rumbo sostenido: basta un punto cada straight_interval_s
+    return dt >= settings["straight_interval_s"]
+
+class TrackRecorder(threading.Thread):
+
+    def __init__(self):
+        super().__init__(name="track-recorder", daemon=True)
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._pending_summaries = []   # resúmenes que no se pudieron escribir
+        self._last_kept = None
+        self._last_flush = time.monotonic()
+        self._reset_summary()
+
+    def _reset_summary(self):
+        self._summary_start = None
+        self._summary_latest = None
+        self._summary_distance_nm = 0.0
+        self._summary_sog = []
+        self._summary_last = None
+
+    def stop(self):
+        self._stop_event.set()
+        self.flush()
+
+    def run(self):
+        register_paths(TRACK_PATHS + [STATE_PATH])
+        while not self._stop_event.is_set():
+            settings = get_track_config()
+            if settings["enabled"] and is_signalk_enabled():
+                try:
+                    self.sample(settings)
+                    self.maybe_flush(settings)
+                except Exception:
+                    logger.exception("⚠️  Error en el grabador de track")
+            self._stop_event.wait(settings["sample_interval_s"])
+
+    def sample(self, settings):
+        data = get_latest_data(TRACK_PATHS)
+        pos = data.get(POSITION_PATH)
+        if not (isinstance(pos, list) and len(pos) == 2):
+            return
+        sog = _value(data.get(SOG_PATH))
+        cog = _value(data.get(COG_PATH))
+        if cog is not None:
+            cog = math.degrees(cog) % 360
+        self.add_fix((int(time.time()), pos[0], pos[1], sog, cog), settings)
+
+    def add_fix(self, fix, settings):
+        """Aplica el aclarado y acumula el punto para el próximo volcado."""
+        with self._lock:
+            if self._summary_start is None:
+                self._summary_start = fix[0]
+            self._summary_latest = fix[0]
+            if fix[3] is not None:
+                self._summary_sog.append(fix[3])
+            if not should_keep(self._last_kept, fix, settings):
+                return False
+            if self._last_kept is not None:
+                self._summary_distance_nm += haversine_nm(self._last_kept[1], self._last_kept[2], fix[1], fix[2])
+            self._last_kept = fix
+            self._summary_last = fix
+            self._buffer.append((
+                fix[0],
+                round(fix[1] * 1e7),
+                round(fix[2] * 1e7),
+                round(fix[3] * 100) if fix[3] is not None else None,
+                round(fix[4] * 100) if fix[4] is not None else None,
+            ))
+            return True
+
+    def maybe_flush(self, settings):
+        now = time.monotonic()
+        summary_due = (
+            self._summary_start is not None
+            and self._summary_latest - self._summary_start >= settings["summary_interval_s"]
+        )
+        if (len(self._buffer) >= settings["flush_points"]
+                or now - self._last_flush >= settings["flush_interval_s"]
+                or summary_due):
+            self.flush(settings if summary_due else None)
+
+    def flush(self, summary_settings=None):
+        """Escribe los puntos pendientes (y el resumen, si toca) en una sola transacción.
+
+        Si la escritura falla (p. ej. "database is locked" tras el busy_timeout),
+        los puntos y resúmenes vuelven a quedar pendientes para el siguiente volcado.
+        """
+        with self._lock:
+            points, self._buffer = self._buffer, []
+            summaries, self._pending_summaries = self._pending_summaries, []
+            summary = self._take_summary(summary_settings) if summary_settings else None
+            if summary:
+                summaries.append(summary)
+            self._last_flush = time.monotonic()
+        if not points and not summaries:
+            return True
+        try:
+            # El estado se lee antes de BEGIN IMMEDIATE: si no está en la caché del
+            # stream, la consulta REST puede tardar segundos y no debe bloquear escrituras
+            state = get_latest_data([STATE_PATH]).get(STATE_PATH) if summary else None
+            with transaction() as conn:
+                if points:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO track_points (t, lat_e7, lon_e7, sog_cms, cog_cdeg) VALUES (?, ?, ?, ?, ?)",
+                        points
+                    )
+                for pending in summaries:
+                    self._insert_summary(conn, pending, state if pending is summary else None)
+        except Exception as e:
+            with self._lock:
+                self._buffer[:0] = points
+                self._pending_summaries[:0] = summaries
+            logger.warning("⚠️  No se pudo guardar el track (%s puntos, %s resúmenes); se reintentará: %s",
+                           len(points), len(summaries), e)
+            return False
+        return True
+
+    def _take_summary(self, settings):
+        start, last = self._summary_start, self._summary_last
+        distance_nm = self._summary_distance_nm
+        sogs = self._summary_sog
+        self._reset_summary()
+        if last is None or distance_nm < settings["summary_min_distance_nm"]:
+            return None
+        return {
+            "from": datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "to": datetime.fromtimestamp(last[0], timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "minutes": max(int((last[0] - start) / 60), 1),
+            "distance_nm": round(distance_nm, 2),
+            "avg_sog_kn": round(sum(sogs) / len(sogs) * MS_TO_KN, 1) if sogs else 0.0,
+            "latitude": last[1],
+            "longitude": last[2],
+        }
+
+    def _insert_summary(self, conn, summary, state):
+        config = load_config()
+        t = get_translation(config.get("language", "es"))
+        text = t["auto_track_summary"].format(**summary)
+        text_html, text_html_version = rendered_columns(text)
+        conn.execute("""
+            INSERT INTO log_entries (
+                timestamp_utc, latitude, longitude, navigation_state, text,
+                media_path, source, entry_type, signalK_resource_id, metadata,
+                text_html, text_html_version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            summary["to"],
+            summary["latitude"],
+            summary["longitude"],
+            state if isinstance(state, str) else None,
+            text,
+            None,
+            "auto",
+            "navigation",
+            None,
+            json.dumps({"track_summary": summary}, ensure_ascii=False),
+            text_html,
+            text_html_version
+        ))
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+def start_track_recorder():
+    """Arranca el grabador (una sola vez por proceso)."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None or not _recorder.is_alive():
+            _recorder = TrackRecorder()
+            _recorder.start()
+        return _recorder
+
+def stop_track_recorder():
+    """Detiene el grabador volcando antes los puntos pendientes."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is not None:
+            _recorder.stop()
+            _recorder = None
+
+atexit.register(stop_track_recorder)
@@ -1,13 +1,47 @@
 # core/utils.py
+import math
+
 import markdown
 import bleach
 
+# Configuración del renderizado; cualquier cambio aquí cambia RENDERER_VERSION
+# (core/rendering.py) y provoca que el HTML guardado se regenere.
+MARKDOWN_EXTENSIONS = ['nl2br']
+ALLOWED_TAGS = ['p', 'br', 'strong', 'em', 'ul', 'ol', 'li', 'blockquote', 'code', 'pre', 'h1', 'h2', 'h3']
+ALLOWED_ATTRS = {}
+
+VALID_ENTRY_TYPES = {"log", "maintenance", "weather", "navigation", "fuel", "radio", "provision", "other", "experience"}
+
 def render_markdown_safe(text):
     """Convierte Markdown a HTML seguro."""
     if not text:
         return ""
-    html = markdown.markdown(text, extensions=['nl2br'])  # <-- ¡NUEVO!
-    allowed_tags = ['p', 'br', 'strong', 'em', 'ul', 'ol', 'li', 'blockquote', 'code', 'pre', 'h1', 'h2', 'h3']
-    allowed_attrs = {}
-    clean_html = bleach.clean(html, tags=allowed_tags, attributes=allowed_attrs, strip=True)
+    html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)  # <-- ¡NUEVO!
+    clean_html = bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, strip=True)
     return clean_html
+
+def encode_cursor(entry):
+    """Cursor de paginación para una entrada: "<timestamp_utc>,<id>"."""
+    return f"{entry['timestamp_utc']},{entry['id']}"
+
+def decode_cursor(cursor):
+    """Devuelve (timestamp_utc, id) o None si el cursor está vacío o mal formado."""
+    if not cursor:
+        return None
+    timestamp_utc, sep, entry_id = cursor.rpartition(",")
+    if not sep or not timestamp_utc:
+        return None
+    try:
+        return timestamp_utc, int(entry_id)
+    except ValueError:
+        return None
+
+EARTH_RADIUS_NM = 3440.065
+
+def haversine_nm(lat1, lon1, lat2, lon2):
+    """Distancia ortodrómica en millas náuticas entre dos posiciones (grados)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_NM * math.asin(min(1.0, math.sqrt(a)))
@@ -111,9 +111,13 @@ Type=simple
 User=$USER
 WorkingDirectory=$APP_DIR
 Environment=PATH=$VENV_DIR/bin
+# Servidor de producción (waitress); el modo desarrollo solo con "python app.py --dev"
 ExecStart=$VENV_DIR/bin/python app.py
 Restart=always
 RestartSec=10
+# SIGTERM: deja de aceptar conexiones, termina las peticiones y vuelca el track
+KillSignal=SIGTERM
+TimeoutStopSec=30
 
 [Install]
 WantedBy=multi-user.target
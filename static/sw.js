@@ -1,4 +1,4 @@
-const CACHE_NAME = 'logbook-v1';
+const CACHE_NAME = 'logbook-v2';
 const urlsToCache = [
   '/',
   '/static/css/pico.min.css',
@@ -13,6 +13,15 @@ self.addEventListener('install', (event) => {
   );
 });
 
+self.addEventListener('activate', (event) => {
+  // Borrar las cachés de versiones anteriores del service worker
+  event.waitUntil(
+    caches.keys().then((names) => Promise.all(
+      names.filter((name) => name !== CACHE_NAME).map((name) => caches.delete(name))
+    ))
+  );
+});
+
 self.addEventListener('fetch', (event) => {
   // No cachear ni interceptar peticiones a /uploads o /api (excepto GET estáticos)
   if (event.request.url.includes('/uploads/') || 
@@ -22,6 +31,24 @@ self.addEventListener('fetch', (event) => {
 
   if (event.request.method !== 'GET') return;
 
+  // Los estáticos llevan ?v=<hash> (url_for): se guardan al pedirlos y, sin
+  // red, vale cualquier versión guardada del mismo fichero
+  if (new URL(event.request.url).pathname.startsWith('/static/')) {
+    event.respondWith(
+      caches.match(event.request).then((cached) => cached || fetch(event.request)
+        .then((response) => {
+          if (response.ok) {
+            const copy = response.clone();
+            caches.open(CACHE_NAME).then((cache) => cache.put(event.request, copy));
+          }
+          return response;
+        })
+        .catch(() => caches.match(event.request, { ignoreSearch: true })
+          .then((fallback) => fallback || Response.error())))
+    );
+    return;
+  }
+
   event.respondWith(
     caches.match(event.request)
       .then(response => response || fetch(event.request))